@@ -1,19 +1,99 @@
 import json
 from decimal import Decimal
+import base64
+import bisect
+import gzip
+import hashlib
 import os
 import re
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from datetime import date, time as dtime
 from zoneinfo import ZoneInfo
-from typing import Iterable
+from typing import Iterable, Iterator
 from typing import Any, Dict, List, Optional, Tuple
-from boto3.dynamodb.conditions import Key
-import boto3
-import traceback
-
-DDB = boto3.resource("dynamodb")
-TABLE = DDB.Table(os.environ.get("TABLE_NAME", ""))
+from urllib.parse import parse_qsl, urlsplit
+
+import batchscan
+import profiling
+import storage
+from observability import LOG, METRICS, RequestMetrics, request_id_for, route_name
+from resilience import StorageUnavailable
+
+try:  # brotli is optional; gzip is always available
+    import brotli
+except ImportError:  # pragma: no cover - depends on the Lambda layer
+    brotli = None
+
+# Where everything is persisted: STORAGE_BACKEND=dynamodb (default), sqlite or memory
+REPO = storage.from_env()
+
+# Bodies smaller than this are sent as-is; compressing them costs more CPU than it saves.
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+
+# /batch limits: sub-requests per call, and threads used for runs of independent reads
+BATCH_MAX_OPS = int(os.environ.get("BATCH_MAX_OPS", "20"))
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "8"))
+
+# Longest event POST/PUT /events accept
+MAX_EVENT_DURATION = timedelta(hours=12)
+
+# /extension/check: ranges per call, and how far before a day span to look for
+# events that started earlier but still overlap (no event is longer than MAX_EVENT_DURATION)
+EXTENSION_MAX_RANGES = int(os.environ.get("EXTENSION_MAX_RANGES", "100"))
+EXTENSION_LOOKBACK = MAX_EVENT_DURATION
+
+# Bodies read from the time index (GSI1, eventually consistent) get no ETag for this long
+# after the user's last write; updatedAt has whole seconds, so the window is 2-3 s
+INDEX_SETTLE_SECONDS = int(os.environ.get("INDEX_SETTLE_SECONDS", "3"))
+
+# Change-feed entries (and delete tombstones) expire via the table's `ttl` attribute
+CHANGE_TTL_DAYS = int(os.environ.get("CHANGE_TTL_DAYS", "30"))
+CHANGES_PAGE_SIZE = int(os.environ.get("CHANGES_PAGE_SIZE", "500"))
+# The version bump and the change-log put are two writes. A seq missing from the log for
+# longer than this was never written (the put failed); a younger one may still be in
+# flight. Comfortably above the Lambda timeout.
+CHANGE_HOLE_GRACE_SECONDS = int(os.environ.get("CHANGE_HOLE_GRACE_SECONDS", "30"))
+
+# The calendar availability windows are read in
+DEFAULT_TIMEZONE = "Asia/Jerusalem"
+# Per-day aggregates (DAYSTAT#<date>): which calendar the dates are in. Defaults to the
+# availability calendar so month-view days start where the suggestions' days do;
+# /summary/month reports it and the month grid keys its cells by it.
+DAYSTAT_TZ = os.environ.get("DAYSTAT_TZ", DEFAULT_TIMEZONE)
+SUMMARY_MAX_DAYS = 62
+
+# Idempotency-Key records: how long a completed response is replayed, and after how
+# long a "pending" record left by a crashed invocation may be taken over
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "30"))
+
+# Per-user rate limits as "<tokens per second>/<burst>" for each route class.
+# RATE_LIMIT_SHARED=false keeps enforcement per container (no DynamoDB counter).
+RATE_LIMITS = {
+    "expensive": os.environ.get("RATE_LIMIT_EXPENSIVE", "1/10"),
+    "default": os.environ.get("RATE_LIMIT_DEFAULT", "10/40"),
+}
+RATE_LIMIT_SHARED = os.environ.get("RATE_LIMIT_SHARED", "true").lower() == "true"
+RATE_LIMIT_LEASE = int(os.environ.get("RATE_LIMIT_LEASE", "5"))
+
+# /export: items per DynamoDB page, and lines per buffered (Lambda) response
+EXPORT_QUERY_PAGE = int(os.environ.get("EXPORT_QUERY_PAGE", "500"))
+EXPORT_MAX_ITEMS = int(os.environ.get("EXPORT_MAX_ITEMS", "5000"))
+
+# Scheduled maintenance (a batchscan job): scan segments, items evaluated per user listing
+# page (one checkpoint), threads per page, read budget (RCU/s, 0 = unpaced), users counted
+# as active, and days of free/busy precomputed from today (UTC)
+MAINTENANCE_SEGMENTS = int(os.environ.get("MAINTENANCE_SEGMENTS", str(batchscan.SCAN_SEGMENTS)))
+MAINTENANCE_PAGE = int(os.environ.get("MAINTENANCE_PAGE", "500"))
+MAINTENANCE_WORKERS = int(os.environ.get("MAINTENANCE_WORKERS", str(BATCH_MAX_WORKERS)))
+MAINTENANCE_RCU_BUDGET = float(os.environ.get("MAINTENANCE_RCU_BUDGET", str(batchscan.SCAN_RCU_BUDGET)))
+MAINTENANCE_ACTIVE_DAYS = int(os.environ.get("MAINTENANCE_ACTIVE_DAYS", "30"))
+FREEBUSY_SNAPSHOT_DAYS = int(os.environ.get("FREEBUSY_SNAPSHOT_DAYS", "8"))
 
 # ---- Helpers -----------------------------------------------------------------
 class DecimalJSONEncoder(json.JSONEncoder):
@@ -24,21 +104,89 @@ class DecimalJSONEncoder(json.JSONEncoder):
         return super().default(o)
     
 def resp(status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+    with METRICS.span("serialize"):
+        payload = json.dumps(body, cls=DecimalJSONEncoder)
+    return text_resp(status, payload, "application/json", headers)
+
+def text_resp(status: int, text: str, content_type: str, headers: Optional[Dict[str, str]] = None):
     base = {
-        "Content-Type": "application/json",
+        "Content-Type": content_type,
         "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Headers": "Authorization,Content-Type,X-Debug-User,X-Request-Id",
+        "Access-Control-Allow-Headers": "Authorization,Content-Type,X-Debug-User,X-Request-Id,If-None-Match,X-Profile,Idempotency-Key",
         "Access-Control-Allow-Methods": "GET,POST,PUT,PATCH,DELETE,OPTIONS",
+        "Access-Control-Expose-Headers": "ETag,X-Request-Id,Server-Timing,X-Profile-Id,X-Export-Cursor,Idempotent-Replayed,Retry-After,Warning",
+        "Timing-Allow-Origin": "*",
     }
     if headers:
         base.update(headers)
     return {
     "statusCode": status,
     "headers": base,
-    "body": json.dumps(body, cls=DecimalJSONEncoder)
+    "body": text
 }
 
 
+def accepted_encodings(event: Dict[str, Any]) -> List[str]:
+    """Content codings the client accepts, best first (q=0 entries are dropped).
+
+    `*` stands for the codings we can produce that are not named explicitly, so
+    `gzip;q=0, *` still refuses gzip.
+    """
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    raw = headers.get("accept-encoding") or ""
+    prefs = []
+    named = set()
+    for i, part in enumerate(raw.split(",")):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        named.add(name)
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            prefs.append((-q, i, name))
+    prefs.sort()
+    out = []
+    for _, _, name in prefs:
+        if name == "*":
+            out.extend(enc for enc in ("gzip", "br") if enc not in named and enc not in out)
+        elif name not in out:
+            out.append(name)
+    return out
+
+def compress_body(body: bytes, encodings: List[str]) -> Tuple[Optional[str], bytes]:
+    """Compress with the best coding we support out of `encodings`; (None, body) if none."""
+    for enc in encodings:
+        if enc == "br" and brotli is not None:
+            return "br", brotli.compress(body, quality=BROTLI_QUALITY)
+        if enc == "gzip":
+            return "gzip", gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return None, body
+
+def maybe_compress(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    """Compress a proxy response in place when the client allows it and the body is large enough."""
+    body = response.get("body")
+    if response.get("isBase64Encoded") or not isinstance(body, str) or response.get("statusCode") in (204, 304):
+        return response
+    raw = body.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    encoding, packed = compress_body(raw, accepted_encodings(event))
+    if encoding is None or len(packed) >= len(raw):
+        return response
+    headers = response.setdefault("headers", {})
+    headers["Content-Encoding"] = encoding
+    headers["Vary"] = "Accept-Encoding"
+    response["body"] = base64.b64encode(packed).decode("ascii")
+    response["isBase64Encoded"] = True
+    return response
+
 def parse_json(body: Optional[str]) -> Dict[str, Any]:
     if not body:
         return {}
@@ -90,60 +238,201 @@ class BadRequest(Exception):
     pass
 
 def error_to_response(e: Exception):
-    print("ERROR:", repr(e))
-    print(traceback.format_exc())  # <-- captures full stack trace
+    LOG.bind(errorClass=type(e).__name__)
     if isinstance(e, BadRequest):
+        LOG.warning("bad request", exc=e)
         return resp(400, {"error": "BadRequest", "message": str(e)})
+    if isinstance(e, StorageUnavailable):
+        LOG.warning("storage unavailable", exc=e)
+        return resp(503, {"error": "ServiceUnavailable", "message": "Storage is temporarily unavailable"},
+                    {"Retry-After": str(max(1, int(-(-e.retry_after // 1))))})
+    # Stack trace is rendered inside the logger, and only if its budget allows
+    LOG.error("unhandled error", exc=e)
     return resp(500, {"error": "InternalError", "message": "Unexpected error"})
 
 # ---- Persistence helpers ------------------------------------------------------
 
+def bump_version(user_pk: str) -> int:
+    """Atomically advance the user's data version; every write path calls this."""
+    return REPO.bump_version(user_pk)
+
+def get_version(user_pk: str) -> int:
+    # Strongly consistent: a stale read here would answer 304 for data that just changed
+    return REPO.get_version(user_pk)
+
+def get_version_info(user_pk: str) -> Tuple[int, Optional[int]]:
+    """(version, updatedAt); updatedAt only where index reads can lag behind the version."""
+    return REPO.version_info(user_pk)
+
+# Public fields of each model (stored under the same attribute names) and their defaults
+EVENT_FIELDS = ("eventId", "title", "startISO", "endISO", "immutable", "source")
+TASK_FIELDS = ("taskId", "title", "durationMin", "category", "notes", "createdAt")
+FIELD_DEFAULTS = {"immutable": True, "source": "app", "category": "", "notes": ""}
+
+def parse_fields(event: Dict[str, Any], allowed: Tuple[str, ...]) -> Optional[List[str]]:
+    """`?fields=a,b` as a list (id field always first), or None when not given."""
+    raw = (event.get("queryStringParameters") or {}).get("fields")
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    ensure(not unknown, f"unknown fields: {','.join(unknown)} (allowed: {','.join(allowed)})")
+    return list(dict.fromkeys([allowed[0]] + fields))
+
+def pick_fields(it: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    return {f: it.get(f, FIELD_DEFAULTS.get(f)) for f in fields}
+
+def event_view(it: Dict[str, Any], fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    # Clean API model of a stored EVENT item
+    if fields is not None:
+        return pick_fields(it, fields)
+    return {
+        "eventId": it["eventId"],
+        "title": it["title"],
+        "startISO": it["startISO"],
+        "endISO": it["endISO"],
+        "immutable": it.get("immutable", True),
+        "source": it.get("source","app")
+    }
+
+def task_view(it: Dict[str, Any], fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    # Clean API model of a stored TASK item
+    if fields is not None:
+        return pick_fields(it, fields)
+    return {
+        "taskId": it["taskId"],
+        "title": it["title"],
+        "durationMin": it["durationMin"],
+        "category": it.get("category",""),
+        "notes": it.get("notes",""),
+        "createdAt": it["createdAt"],
+    }
+
+def record_change(user_pk: str, entity: str, entity_id: str, op: str, data: Optional[Dict[str, Any]] = None,
+                  writes: Iterable[Tuple[Any, ...]] = ()) -> int:
+    """Bump the data version, then apply `writes` (REPO.write_all ops) and the
+    change-log entry for them all or nothing.
+
+    The new version doubles as the change's sequence number. A delete is a
+    tombstone entry (op="delete", no data); entries expire after CHANGE_TTL_DAYS.
+    The version goes first: if the rest fails, cached bodies are refetched
+    instead of staying "current", and the unused seq is a hole that /changes
+    skips after CHANGE_HOLE_GRACE_SECONDS.
+    """
+    seq = bump_version(user_pk)
+    now = int(time.time())
+    item = {
+        "seq": seq,
+        "entity": entity,
+        "id": entity_id,
+        "op": op,
+        "at": now,
+        "ttl": now + CHANGE_TTL_DAYS * 86400,
+    }
+    if data is not None:
+        item["data"] = data
+    REPO.write_all(user_pk, [*writes, ("put_change", item)])
+    return seq
+
+def get_changes(user_pk: str, since: int, limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """Change-log entries with seq > since, oldest first, plus whether more remain."""
+    return REPO.changes_after(user_pk, since, limit)
+
+def day_stat_deltas(start_iso: str, end_iso: str, sign: int = 1) -> Dict[str, Tuple[int, int]]:
+    """{date: (events, busy minutes)} an event contributes to the DAYSTAT counters.
+
+    The event counts on the day it starts; its minutes are split over every
+    day it covers (days in DAYSTAT_TZ).
+    """
+    tz = ZoneInfo(DAYSTAT_TZ)
+    s = parse_iso(start_iso).astimezone(tz)
+    e = parse_iso(end_iso).astimezone(tz)
+    out: Dict[str, Tuple[int, int]] = {s.date().isoformat(): (sign, 0)}
+    cur = s
+    while cur < e:
+        next_midnight = datetime.combine(cur.date() + timedelta(days=1), datetime.min.time(), tz)
+        seg_end = min(e, next_midnight)
+        day = cur.date().isoformat()
+        n, m = out.get(day, (0, 0))
+        out[day] = (n, m + sign * int((seg_end - cur).total_seconds() // 60))
+        cur = seg_end
+    return out
+
+def day_stat_ops(*deltas: Dict[str, Tuple[int, int]]) -> List[Tuple[Any, ...]]:
+    """Net the given deltas per day: write_all ops that ADD them to the DAYSTAT items (one per touched day)."""
+    net: Dict[str, List[int]] = {}
+    for d in deltas:
+        for day, (n, m) in d.items():
+            acc = net.setdefault(day, [0, 0])
+            acc[0] += n
+            acc[1] += m
+    return [("add_day_stats", day, n, m) for day, (n, m) in sorted(net.items()) if n or m]
+
+def get_day_stats(user_pk: str, first_day: str, last_day: str) -> List[Dict[str, Any]]:
+    """[{date, events, busyMin}] for first_day..last_day (inclusive, YYYY-MM-DD); days without any are absent."""
+    return REPO.day_stats(user_pk, first_day, last_day)
+
+def rebuild_day_stats(user_pk: str) -> int:
+    """Recompute every DAYSTAT item of a user from the events themselves (backfill/repair).
+
+    Returns how many days have events, or -1 when skipped: the events are read from the
+    time index, which may still miss a write of the last INDEX_SETTLE_SECONDS, and the
+    replace is conditional on the version, so a write during the rebuild (whose ADDs the
+    totals may or may not include) wins. The next run picks the user up again.
+    """
+    version, updated_at = get_version_info(user_pk)
+    if updated_at is not None and time.time() - updated_at <= INDEX_SETTLE_SECONDS:
+        return -1
+    totals: Dict[str, List[int]] = {}
+    after = None
+    while True:
+        items, after = REPO.events_page(user_pk, after, EXPORT_QUERY_PAGE)
+        for it in items:
+            for day, (n, m) in day_stat_deltas(it["startISO"], it["endISO"]).items():
+                acc = totals.setdefault(day, [0, 0])
+                acc[0] += n
+                acc[1] += m
+        if not after:
+            break
+    if not REPO.replace_day_stats(user_pk, {day: (n, m) for day, (n, m) in totals.items()}, version):
+        return -1
+    return len(totals)
+
 def put_event(user_pk: str, title: str, start_iso: str, end_iso: str, immutable: bool, source: str) -> Dict[str, Any]:
     eid = new_id("ev")
     item = {
-        "pk": user_pk,
-        "sk": f"EVENT#{eid}",
-        "type": "EVENT",
         "eventId": eid,
         "title": title,
         "startISO": start_iso,
         "endISO": end_iso,
         "immutable": bool(immutable),
         "source": source or "app",
-        "gsi1pk": user_pk,
-        "gsi1sk": start_iso,  # sort by start time
     }
-    TABLE.put_item(Item=item)
+    record_change(user_pk, "EVENT", eid, "put", event_view(item),
+                  [("put_event", item), *day_stat_ops(day_stat_deltas(start_iso, end_iso))])
     return item
 
-def get_events_in_range(user_pk: str, start_iso: str, end_iso: str) -> List[Dict[str, Any]]:
-    # Query by time GSI; filter to end<=range and start<end
-    # Simple: only check startISO within [start_iso, end_iso)
-    resp_ = TABLE.query(
-        IndexName="GSI1",
-        KeyConditionExpression="gsi1pk = :pk AND gsi1sk BETWEEN :from AND :to",
-        ExpressionAttributeValues={":pk": user_pk, ":from": start_iso, ":to": end_iso},
-    )
-    items = resp_.get("Items") or []
-    # Optionally filter by true overlap; for now, start in range is sufficient.
-    return [i for i in items if i.get("type") == "EVENT"]
+def get_events_in_range(user_pk: str, start_iso: str, end_iso: str, attrs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    # Only startISO within [start_iso, end_iso] is checked; see get_events_overlapping for true overlap
+    return REPO.events_in_range(user_pk, start_iso, end_iso, attrs)
+
+def get_events_overlapping(user_pk: str, start_iso: str, end_iso: str, attrs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    return REPO.events_overlapping(user_pk, start_iso, end_iso, attrs, EXTENSION_LOOKBACK)
 
 def delete_event(user_pk: str, event_id: str) -> bool:
-    sk = f"EVENT#{event_id}"
     # Ensure exists
-    existing = TABLE.get_item(Key={"pk": user_pk, "sk": sk}).get("Item")
+    existing = REPO.get_event(user_pk, event_id)
     if not existing:
         return False
-    TABLE.delete_item(Key={"pk": user_pk, "sk": sk})
+    record_change(user_pk, "EVENT", event_id, "delete", None,
+                  [("delete_event", event_id),
+                   *day_stat_ops(day_stat_deltas(existing["startISO"], existing["endISO"], -1))])
     return True
 
 def put_task(user_pk: str, title: str, duration_min: int, category: Optional[str], notes: Optional[str]) -> Dict[str, Any]:
     tid = new_id("t")
     now = iso(datetime.now(timezone.utc))
     item = {
-        "pk": user_pk,
-        "sk": f"TASK#{tid}",
-        "type": "TASK",
         "taskId": tid,
         "title": title,
         "durationMin": int(duration_min),
@@ -151,34 +440,21 @@ def put_task(user_pk: str, title: str, duration_min: int, category: Optional[str
         "notes": notes or "",
         "createdAt": now,
     }
-    TABLE.put_item(Item=item)
+    record_change(user_pk, "TASK", tid, "put", task_view(item), [("put_task", item)])
     return item
 
-def list_tasks(user_pk: str) -> List[Dict[str, Any]]:
-    resp_ = TABLE.query(
-        KeyConditionExpression=Key("pk").eq(user_pk) & Key("sk").begins_with("TASK#")
-    )
-    return resp_.get("Items") or []
+def list_tasks(user_pk: str, attrs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    return REPO.list_tasks(user_pk, attrs)
 
 def delete_task(user_pk: str, task_id: str) -> bool:
-    sk = f"TASK#{task_id}"
-    existing = TABLE.get_item(Key={"pk": user_pk, "sk": sk}).get("Item")
+    existing = REPO.get_task(user_pk, task_id)
     if not existing:
         return False
-    TABLE.delete_item(Key={"pk": user_pk, "sk": sk})
+    record_change(user_pk, "TASK", task_id, "delete", None, [("delete_task", task_id)])
     return True
 
 def get_availability(user_pk: str) -> Dict[str, Any]:
-    # Fetch all AVAIL#* rows
-    resp_ = TABLE.query(
-        KeyConditionExpression="pk = :pk AND begins_with(sk, :p)",
-        ExpressionAttributeValues={":pk": user_pk, ":p": "AVAIL#"},
-    )
-    weekly = {}
-    for it in resp_.get("Items") or []:
-        # sk = AVAIL#Mon
-        day = it["sk"].split("#", 1)[1]
-        weekly[day] = it.get("windows", [])
+    weekly = REPO.get_availability(user_pk)
     
     # Default to 9:00-21:00 if no availability configured
     default_hours = [["09:00", "21:00"]]
@@ -191,21 +467,14 @@ def get_availability(user_pk: str) -> Dict[str, Any]:
     
     return {
         "weekly": weekly,
-        "timezone": "Asia/Jerusalem",
+        "timezone": DEFAULT_TIMEZONE,
     }
 
 def put_availability(user_pk: str, weekly: Dict[str, List[List[str]]], tz: str):
-    # Replace all AVAIL#* entries (idempotent, small N=7)
-    days = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-    for d in days:
-        windows = weekly.get(d, [])
-        TABLE.put_item(Item={
-            "pk": user_pk,
-            "sk": f"AVAIL#{d}",
-            "type": "AVAIL",
-            "windows": windows,
-            "timezone": tz or "Asia/Jerusalem",
-        })
+    # Replace all seven weekdays (idempotent, small N=7)
+    tz = tz or DEFAULT_TIMEZONE
+    record_change(user_pk, "AVAIL", "weekly", "put", {"weekly": weekly, "timezone": tz},
+                  [("put_availability", weekly, tz)])
 
 # ---- Scheduling helpers (intervals, availability, candidates) ----------------
 
@@ -264,17 +533,23 @@ def subtract_intervals(
     base: List[Tuple[datetime, datetime]],
     blocks: List[Tuple[datetime, datetime]],
 ) -> List[Tuple[datetime, datetime]]:
-    """Subtract blocks from base, returning remaining free intervals (all UTC)."""
+    """Subtract blocks from base, returning remaining free intervals (all UTC).
+
+    Merged blocks are disjoint and sorted, so their ends are sorted too: each
+    base interval bisects to the first block ending after its start and walks
+    only the blocks it overlaps (O((base + blocks) log blocks), not base x blocks).
+    """
     if not base:
         return []
     blocks = merge_intervals(blocks)
+    ends = [be for _, be in blocks]
     free = []
     for s, e in base:
         cur_start = s
-        for bs, be in blocks:
-            if be <= cur_start or bs >= e:
-                continue
-            # overlap
+        for i in range(bisect.bisect_right(ends, s), len(blocks)):
+            bs, be = blocks[i]
+            if bs >= e:
+                break
             if bs > cur_start:
                 free.append((cur_start, bs))
             cur_start = max(cur_start, be)
@@ -310,6 +585,25 @@ def events_to_intervals(events: List[Dict[str, Any]]) -> List[Tuple[datetime, da
             continue
     return merge_intervals(out)
 
+def availability_intervals(
+    weekly: Dict[str, List[List[str]]], tz_name: str, range_start: datetime, range_end: datetime
+) -> List[Tuple[datetime, datetime]]:
+    """Build availability intervals in UTC across the requested range (day by day in user's tz)."""
+    avail_intervals: List[Tuple[datetime, datetime]] = []
+    # Iterate actual calendar days in the user's timezone to avoid crossing DST weirdness
+    # We approximate by iterating UTC dates and converting per-day in local tz (sufficient for MVP).
+    for d in daterange_utc(range_start, range_end):
+        day_ints = local_day_windows_to_utc(d, weekly, tz_name)
+        if not day_ints:
+            continue
+        avail_intervals.extend(day_ints)
+
+    # Clip to requested window
+    return clamp_to_range(merge_intervals(avail_intervals), range_start, range_end)
+
+# Cap proposals per long interval (avoid thousands)
+MAX_CANDIDATES_PER_INTERVAL = 12
+
 def step_candidates_in_interval(
     s: datetime, e: datetime, duration: timedelta, step: timedelta
 ) -> List[Tuple[datetime, datetime]]:
@@ -319,49 +613,323 @@ def step_candidates_in_interval(
     while cursor + duration <= e:
         out.append((cursor, cursor + duration))
         cursor += step
-        # Cap proposals per long interval (avoid thousands)
-        if len(out) >= 12:
+        if len(out) >= MAX_CANDIDATES_PER_INTERVAL:
             break
     return out
 
+GAP_PENALTY = 0.05
+MAX_PENALTY = 2 * GAP_PENALTY
+TINY_GAP = timedelta(minutes=15)
+_ZERO = timedelta(0)
+
+def base_score(cs: datetime, now: datetime) -> float:
+    # earlier is better -> subtract proportional days/minutes
+    return 1.0 - (cs - now).total_seconds() / (60*60*24*30)  # small decay over ~month
+
+def score_candidate(
+    cand: Tuple[datetime, datetime],
+    host: Optional[Tuple[datetime, datetime]],
+    now: datetime,
+) -> Tuple[float, List[str]]:
+    cs, ce = cand
+    reasons = []
+    base = base_score(cs, now)
+    # fragmentation penalty
+    if host:
+        fs, fe = host
+        left_gap = cs - fs
+        right_gap = fe - ce
+        if _ZERO < left_gap < TINY_GAP:
+            base -= GAP_PENALTY
+            reasons.append("avoided tiny left gap penalty")
+        if _ZERO < right_gap < TINY_GAP:
+            base -= GAP_PENALTY
+            reasons.append("avoided tiny right gap penalty")
+    return base, reasons
+
 def rank_candidates(
     candidates: List[Tuple[datetime, datetime]],
     free_intervals: List[Tuple[datetime, datetime]],
+    now: Optional[datetime] = None,
 ) -> List[Tuple[Tuple[datetime, datetime], float, List[str]]]:
     """A simple scoring:
        + earlier is better
        - small fragmentation penalty if candidate creates tiny gaps (<15m) against its host free interval
     """
+    now = now or datetime.now(timezone.utc)
+    host_of = _host_finder(free_intervals)
     scored = []
-    tiny = timedelta(minutes=15)
     for cand in candidates:
-        cs, ce = cand
-        # find host free interval
-        host = None
-        for fs, fe in free_intervals:
-            if cs >= fs and ce <= fe:
-                host = (fs, fe)
-                break
-        reasons = []
-        base = 1.0
-        # earlier is better -> subtract proportional days/minutes
-        base -= (cs - datetime.now(timezone.utc)).total_seconds() / (60*60*24*30)  # small decay over ~month
-        # fragmentation penalty
-        if host:
-            fs, fe = host
-            left_gap = cs - fs
-            right_gap = fe - ce
-            if timedelta(0) < left_gap < tiny:
-                base -= 0.05
-                reasons.append("avoided tiny left gap penalty")
-            if timedelta(0) < right_gap < tiny:
-                base -= 0.05
-                reasons.append("avoided tiny right gap penalty")
-        scored.append((cand, base, reasons))
+        score, reasons = score_candidate(cand, host_of(cand), now)
+        scored.append((cand, score, reasons))
     # sort by score desc, then earlier first
     scored.sort(key=lambda x: (-x[1], x[0][0]))
     return scored
 
+def _host_finder(free_intervals: List[Tuple[datetime, datetime]]):
+    """cand -> the first free interval containing it, or None.
+
+    Free intervals out of subtract_intervals are sorted and disjoint, so only
+    the last one starting at or before the candidate can contain it (a bisect);
+    any other list is searched linearly, in order, as before.
+    """
+    ordered = all(fs <= fe for fs, fe in free_intervals) and all(
+        a[1] <= b[0] for a, b in zip(free_intervals, free_intervals[1:]))
+    if not ordered:
+        def linear(cand):
+            for fs, fe in free_intervals:
+                if cand[0] >= fs and cand[1] <= fe:
+                    return (fs, fe)
+            return None
+        return linear
+    starts = [fs for fs, _ in free_intervals]
+
+    def bisected(cand):
+        i = bisect.bisect_right(starts, cand[0]) - 1
+        if i >= 0 and cand[1] <= free_intervals[i][1]:
+            return free_intervals[i]
+        return None
+    return bisected
+
+def top_candidates(
+    free_intervals: List[Tuple[datetime, datetime]],
+    duration: timedelta,
+    step: timedelta,
+    k: int,
+    now: datetime,
+    after: Optional[Tuple[float, datetime]] = None,
+) -> List[Tuple[Tuple[datetime, datetime], float, List[str]]]:
+    """The first k entries of rank_candidates over every step candidate that rank after `after`.
+
+    Candidates are generated lazily in time order. No penalty can raise a
+    score above base_score(start), which falls with time, so generation stops
+    once that bound drops below the k-th best score so far. With `after`
+    (score, start of the last one already shown), everything whose score
+    must still be above it is skipped without being generated.
+    """
+    best: List[Tuple[Tuple[float, datetime], Tuple[datetime, datetime], float, List[str]]] = []
+    skip_until = None
+    if after is not None:
+        # base_score(cs) - MAX_PENALTY > after score  =>  already shown
+        skip_until = now + timedelta(seconds=(1.0 - MAX_PENALTY - after[0]) * 60*60*24*30) - timedelta(seconds=1)
+    for fs, fe in free_intervals:
+        first = 0
+        if skip_until is not None and skip_until > fs:
+            first = -(-(skip_until - fs) // step)
+        for i in range(first, MAX_CANDIDATES_PER_INTERVAL):
+            cs = fs + i * step
+            ce = cs + duration
+            if ce > fe:
+                break
+            if len(best) == k and base_score(cs, now) < best[-1][2]:
+                return [(c, sc, r) for _, c, sc, r in best]
+            score, reasons = score_candidate((cs, ce), (fs, fe), now)
+            key = (-score, cs)
+            if after is not None and key <= (-after[0], after[1]):
+                continue
+            if len(best) < k or key < best[-1][0]:
+                bisect.insort(best, (key, (cs, ce), score, reasons), key=lambda x: x[0])
+                del best[k:]
+    return [(c, sc, r) for _, c, sc, r in best]
+
+
+# ---- Rate limiting --------------------------------------------------------------
+
+# Routes that cost far more than a point read; they get the tighter budget. /batch itself
+# is a default request: each of its entries is charged to its own class (handle_batch).
+_EXPENSIVE_ROUTES = {("POST", "/suggest"), ("GET", "/export")}
+
+def rate_class(method: str, path: str) -> Optional[str]:
+    if method == "OPTIONS" or path.endswith("/health"):
+        return None  # preflight and health checks are never limited
+    return "expensive" if (method, path) in _EXPENSIVE_ROUTES else "default"
+
+class RateLimiter:
+    """Per-user token buckets, one per route class.
+
+    The bucket lives in this warm container. With `shared`, each token must
+    also be covered by a lease taken in blocks of `lease` from a per-minute
+    DynamoDB counter (atomic ADD, conditional on the minute's budget), so
+    all containers together stay within rate*60+burst per user per minute
+    while paying one write per lease, not per request.
+    """
+
+    MAX_BUCKETS = 10000
+
+    def __init__(self, limits: Dict[str, str], shared: bool, lease: int):
+        self.limits = {}
+        for cls, spec in limits.items():
+            rate, _, burst = spec.partition("/")
+            self.limits[cls] = (float(rate), float(burst or rate))
+        self.shared = shared
+        self.lease = max(1, lease)
+        self.buckets: Dict[Tuple[str, str], List[float]] = {}
+
+    def _lease(self, user_pk: str, cls: str, window: int, budget: int) -> int:
+        n = min(self.lease, budget)
+        try:
+            leased = REPO.lease_rate(user_pk, cls, window, n, budget, (window + 2) * 60)
+        except Exception as e:
+            # Never fail requests because the counter is unavailable; fall back to the local bucket
+            LOG.warning("rate limit counter unavailable", exc=e)
+            return n
+        return n if leased else 0
+
+    def check(self, user_pk: str, cls: str, now: Optional[float] = None) -> Optional[float]:
+        """Consume one token; None if allowed, else seconds until the client may retry."""
+        now = time.time() if now is None else now
+        rate, burst = self.limits[cls]
+        key = (user_pk, cls)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.MAX_BUCKETS:
+                self.buckets.clear()
+            # [tokens, last refill, leased tokens left, lease window]
+            bucket = self.buckets[key] = [burst, now, 0.0, -1.0]
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return (1 - bucket[0]) / rate
+        if self.shared:
+            window = int(now // 60)
+            if bucket[3] != window:
+                bucket[2], bucket[3] = 0.0, window
+            if bucket[2] < 1:
+                bucket[2] += self._lease(user_pk, cls, window, int(rate * 60 + burst))
+                if bucket[2] < 1:
+                    return (window + 1) * 60 - now
+            bucket[2] -= 1
+        bucket[0] -= 1
+        return None
+
+RATE_LIMITER = RateLimiter(RATE_LIMITS, RATE_LIMIT_SHARED, RATE_LIMIT_LEASE)
+
+def rate_limited(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """A 429 response when the caller is over budget for this route, else None."""
+    cls = rate_class((event.get("httpMethod") or "").upper(), event.get("path") or "/")
+    if cls is None:
+        return None
+    retry_after = RATE_LIMITER.check(get_user_id(event), cls)
+    if retry_after is None:
+        return None
+    LOG.bind(rateLimited=cls)
+    return too_many_requests(cls, retry_after)
+
+def too_many_requests(cls: str, retry_after: float) -> Dict[str, Any]:
+    return resp(429, {"error": "TooManyRequests", "message": f"Rate limit exceeded for {cls} requests"},
+                {"Retry-After": str(max(1, int(-(-retry_after // 1))))})
+
+# ---- Idempotency keys ---------------------------------------------------------
+
+def _idempotency_key(event: Dict[str, Any]) -> Optional[str]:
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    key = (headers.get("idempotency-key") or "").strip()
+    if not key:
+        return None
+    ensure(len(key) <= 255 and key.isprintable(), "Idempotency-Key must be 1..255 printable characters")
+    return key
+
+def idempotent(event: Dict[str, Any], handle) -> Dict[str, Any]:
+    """Run `handle(event)` at most once per (user, Idempotency-Key); repeats replay the stored response.
+
+    The key is claimed with a conditional put before any work happens. A
+    concurrent duplicate gets 409, a reused key with a different payload
+    gets 422. Raised errors (400s included) and 5xx results release the key
+    so the retry runs again.
+    """
+    key = _idempotency_key(event)
+    if key is None:
+        return handle(event)
+    user_pk = get_user_id(event)
+    fingerprint = hashlib.sha256(
+        f"{event.get('httpMethod')} {event.get('path')} {event.get('body') or ''}".encode("utf-8")
+    ).hexdigest()
+    now = int(time.time())
+    claimed = REPO.claim_idempotency(
+        user_pk, key,
+        {"state": "pending", "fingerprint": fingerprint, "lockedAt": now, "ttl": now + IDEMPOTENCY_TTL_HOURS * 3600},
+        stale_before=now - IDEMPOTENCY_LOCK_SECONDS,
+    )
+    if not claimed:
+        existing = REPO.get_idempotency(user_pk, key) or {}
+        if existing.get("fingerprint") != fingerprint:
+            return resp(422, {"error": "IdempotencyKeyReused", "message": "Idempotency-Key was used with a different request"})
+        if existing.get("state") != "done":
+            return resp(409, {"error": "RequestInProgress", "message": "A request with this Idempotency-Key is in progress"},
+                        {"Retry-After": "1"})
+        replay = text_resp(int(existing["statusCode"]), existing["body"], existing.get("contentType", "application/json"))
+        replay["headers"]["Idempotent-Replayed"] = "true"
+        return replay
+
+    try:
+        response = handle(event)
+    except Exception:
+        REPO.delete_idempotency(user_pk, key)
+        raise
+    if response["statusCode"] >= 500:
+        REPO.delete_idempotency(user_pk, key)
+        return response
+    REPO.put_idempotency(user_pk, key, {
+        "state": "done", "fingerprint": fingerprint,
+        "statusCode": response["statusCode"], "body": response["body"],
+        "contentType": response["headers"].get("Content-Type", "application/json"),
+        "ttl": now + IDEMPOTENCY_TTL_HOURS * 3600,
+    })
+    return response
+
+# ---- Conditional GETs ---------------------------------------------------------
+
+# Request headers that pick the user (get_user_id); conditional GETs vary on them
+VARY_IDENTITY = "Authorization, X-Debug-User"
+
+def make_etag(user_pk: str, version: int, event: Dict[str, Any]) -> str:
+    # Same user + data version + path/query => same body, so the tag never needs the body itself.
+    # Versions are per user: without the user two callers at the same version would share tags.
+    qs = event.get("queryStringParameters") or {}
+    key = json.dumps([user_pk, version, event.get("path") or "", sorted(qs.items())])
+    return 'W/"%s"' % hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+def etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    raw = headers.get("if-none-match")
+    if not raw:
+        return False
+    # Weak comparison (RFC 9110): compare opaque tags, ignoring W/
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for tag in raw.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == wanted:
+            return True
+    return False
+
+def conditional_get(event: Dict[str, Any], user_pk: str, build,
+                    version_info: Optional[Tuple[int, Optional[int]]] = None,
+                    index_read: bool = False) -> Dict[str, Any]:
+    """Answer 304 off a single GetItem when the client's ETag is current; else run `build()` and tag it.
+
+    Pass `version_info` (get_version_info) when the caller has already read it.
+    Set `index_read` when the body comes from the time index (GSI1 on DynamoDB),
+    which cannot be read consistently: for INDEX_SETTLE_SECONDS after a write
+    such a body may predate the version, so it goes out without an ETag.
+    """
+    version, updated_at = version_info or get_version_info(user_pk)
+    etag = make_etag(user_pk, version, event)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": VARY_IDENTITY}
+    if etag_matches(event, etag):
+        # Safe within the settle window too: this tag was only ever given out after it
+        not_modified = resp(304, None, cache_headers)
+        not_modified["body"] = ""
+        return not_modified
+    response = build()
+    # The body depends on who asks, tagged or not
+    response["headers"]["Vary"] = VARY_IDENTITY
+    # A "no-store" body can change without a version bump, so it is never tagged
+    if response.get("statusCode") == 200 and response["headers"].get("Cache-Control") != "no-store":
+        if index_read and updated_at is not None and time.time() - updated_at <= INDEX_SETTLE_SECONDS:
+            response["headers"]["Cache-Control"] = "private, no-cache"
+        else:
+            response["headers"].update(cache_headers)
+    return response
 
 # ---- HTTP handlers ------------------------------------------------------------
 
@@ -382,10 +950,10 @@ def handle_events_post(event: Dict[str, Any]) -> Dict[str, Any]:
     start_dt = parse_iso(startISO)
     end_dt = parse_iso(endISO)
     ensure(end_dt > start_dt, "endISO must be after startISO")
-    ensure((end_dt - start_dt) <= timedelta(hours=12), "event duration too long")
+    ensure((end_dt - start_dt) <= MAX_EVENT_DURATION, "event duration too long")
 
     item = put_event(user_pk, title, iso(start_dt), iso(end_dt), immutable, source)
-    return resp(201, {"eventId": item["eventId"], **{k: item[k] for k in ("title","startISO","endISO","immutable","source")}})
+    return resp(201, event_view(item))
 
 def handle_events_get(event: Dict[str, Any]) -> Dict[str, Any]:
     user_pk = get_user_id(event)
@@ -396,18 +964,13 @@ def handle_events_get(event: Dict[str, Any]) -> Dict[str, Any]:
     start = parse_iso(fromISO)
     end = parse_iso(toISO)
     ensure(end > start, "to must be after from")
+    fields = parse_fields(event, EVENT_FIELDS)
 
-    items = get_events_in_range(user_pk, iso(start), iso(end))
-    # Return clean model
-    events = [{
-        "eventId": it["eventId"],
-        "title": it["title"],
-        "startISO": it["startISO"],
-        "endISO": it["endISO"],
-        "immutable": it.get("immutable", True),
-        "source": it.get("source","app")
-    } for it in items]
-    return resp(200, {"events": events})
+    def build():
+        items = get_events_in_range(user_pk, iso(start), iso(end), fields)
+        # Return clean model
+        return resp(200, {"events": [event_view(it, fields) for it in items]})
+    return conditional_get(event, user_pk, build, index_read=True)
 
 def handle_events_delete(event: Dict[str, Any]) -> Dict[str, Any]:
     user_pk = get_user_id(event)
@@ -438,20 +1001,19 @@ def handle_events_put(event: Dict[str, Any]) -> Dict[str, Any]:
     immutable = data.get("immutable")
 
     # Load existing
-    sk = f"EVENT#{event_id}"
-    res = TABLE.get_item(Key={"pk": user_pk, "sk": sk})
-    item = res.get("Item")
+    item = REPO.get_event(user_pk, event_id)
     if not item:
         return resp(404, {"error": "NotFound"})
+    old_span = (item["startISO"], item["endISO"])
 
     # Validate times if provided
     if startISO and endISO:
         s = parse_iso(startISO)
         e = parse_iso(endISO)
         ensure(e > s, "endISO must be after startISO")
+        ensure((e - s) <= MAX_EVENT_DURATION, "event duration too long")
         item["startISO"] = iso(s)
         item["endISO"] = iso(e)
-        item["gsi1sk"] = item["startISO"]
 
     if title is not None:
         item["title"] = (title or "").strip()
@@ -460,15 +1022,12 @@ def handle_events_put(event: Dict[str, Any]) -> Dict[str, Any]:
     if immutable is not None:
         item["immutable"] = bool(immutable)
 
-    TABLE.put_item(Item=item)
-    return resp(200, {
-        "eventId": item["eventId"],
-        "title": item["title"],
-        "startISO": item["startISO"],
-        "endISO": item["endISO"],
-        "immutable": item.get("immutable", True),
-        "source": item.get("source", "app")
-    })
+    writes: List[Tuple[Any, ...]] = [("put_event", item)]
+    if (item["startISO"], item["endISO"]) != old_span:
+        writes += day_stat_ops(day_stat_deltas(*old_span, -1), day_stat_deltas(item["startISO"], item["endISO"]))
+    view = event_view(item)
+    record_change(user_pk, "EVENT", event_id, "put", view, writes)
+    return resp(200, view)
 
 
 def handle_tasks_post(event: Dict[str, Any]) -> Dict[str, Any]:
@@ -481,27 +1040,16 @@ def handle_tasks_post(event: Dict[str, Any]) -> Dict[str, Any]:
     ensure(len(title) > 0, "title is required")
     ensure(isinstance(duration, int) and 5 <= duration <= 480, "durationMin (5..480) required (minutes)")
     item = put_task(user_pk, title, duration, category, notes)
-    return resp(201, {
-        "taskId": item["taskId"],
-        "title": item["title"],
-        "durationMin": item["durationMin"],
-        "category": item.get("category",""),
-        "notes": item.get("notes",""),
-        "createdAt": item["createdAt"],
-    })
+    return resp(201, task_view(item))
 
 def handle_tasks_get(event: Dict[str, Any]) -> Dict[str, Any]:
     user_pk = get_user_id(event)
-    tasks = list_tasks(user_pk)
-    clean = [{
-        "taskId": it["taskId"],
-        "title": it["title"],
-        "durationMin": it["durationMin"],
-        "category": it.get("category",""),
-        "notes": it.get("notes",""),
-        "createdAt": it["createdAt"],
-    } for it in tasks]
-    return resp(200, {"tasks": clean})
+    fields = parse_fields(event, TASK_FIELDS)
+
+    def build():
+        tasks = list_tasks(user_pk, fields)
+        return resp(200, {"tasks": [task_view(it, fields) for it in tasks]})
+    return conditional_get(event, user_pk, build)
 
 def handle_tasks_delete(event: Dict[str, Any]) -> Dict[str, Any]:
     user_pk = get_user_id(event)
@@ -515,15 +1063,211 @@ def handle_tasks_delete(event: Dict[str, Any]) -> Dict[str, Any]:
         return resp(404, {"error": "NotFound"})
     return resp(204, {})
 
+def _change_time(it: Dict[str, Any]) -> int:
+    # Entries from before "at" was stored: the ttl was set at write time
+    return int(it["at"]) if "at" in it else int(it["ttl"]) - CHANGE_TTL_DAYS * 86400
+
+def _change_cursor(seq: int, at: int) -> str:
+    """"<seq>.<time>": every change after `seq` was written at `time` - grace or later."""
+    return f"{seq}.{at}"
+
+def _parse_change_cursor(raw: str) -> Tuple[int, Optional[int]]:
+    seq, _, at = raw.partition(".")
+    try:
+        return int(seq), int(at) if at else None  # plain "<seq>" from older responses
+    except ValueError:
+        raise BadRequest("since must be a cursor returned by /changes")
+
+def handle_changes_get(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Change-log entries after the cursor, contiguous by seq.
+
+    The version bump and the CHANGE# put are separate writes, so the log can
+    have holes: a seq whose put is still in flight (the page ends before it
+    and is not cacheable, the next poll picks it up), or one whose put failed
+    (skipped once CHANGE_HOLE_GRACE_SECONDS have passed). Expired entries only
+    explain a hole right after a cursor older than the retention; that is the
+    410.
+    """
+    user_pk = get_user_id(event)
+    qs = event.get("queryStringParameters") or {}
+    since_raw = qs.get("since")
+    if since_raw is None:
+        # Starting point: take this cursor first, then load the snapshot, then poll with it
+        cursor = _change_cursor(get_version(user_pk), int(time.time()))
+        return resp(200, {"changes": [], "cursor": cursor, "hasMore": False})
+    since, since_at = _parse_change_cursor(since_raw)
+    ensure(since >= 0, "since must be a cursor returned by /changes")
+    version_info = get_version_info(user_pk)
+
+    def build():
+        items, has_more = get_changes(user_pk, since, CHANGES_PAGE_SIZE)
+        now = int(time.time())
+        if (items and int(items[0]["seq"]) > since + 1) or (not items and version_info[0] > since):
+            if since_at is None or now >= since_at + CHANGE_TTL_DAYS * 86400 - CHANGE_HOLE_GRACE_SECONDS:
+                return resp(410, {"error": "CursorExpired", "message": "Changes since this cursor are gone; reload and take a new cursor"})
+        changes = []
+        cursor = (since, since_at if since_at is not None else now)
+        settled = True
+        for it in items:
+            seq, at = int(it["seq"]), _change_time(it)
+            if seq != cursor[0] + 1 and now - at < CHANGE_HOLE_GRACE_SECONDS:
+                settled = False  # the missing seqs may still be written: end the page before them
+                break
+            change = {"seq": seq, "entity": it["entity"], "id": it["id"], "op": it["op"]}
+            if "data" in it:
+                change["data"] = it["data"]
+            changes.append(change)
+            cursor = (seq, at)
+        if settled and not has_more and cursor[0] < version_info[0]:
+            settled = False  # the newest entries are not in the log (yet)
+        body = {"changes": changes, "cursor": _change_cursor(*cursor), "hasMore": has_more and settled}
+        return resp(200, body, None if settled else {"Cache-Control": "no-store"})
+    return conditional_get(event, user_pk, build, version_info)
+
+# Export sources in output order: (line type, page reader, clean model)
+_EXPORT_KINDS = {
+    "events": ("event", lambda pk, after, limit: REPO.events_page(pk, after, limit), event_view),
+    "tasks": ("task", lambda pk, after, limit: REPO.tasks_page(pk, after, limit), task_view),
+}
+
+def _encode_cursor(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, cls=DecimalJSONEncoder).encode("utf-8")).decode("ascii")
+
+def _decode_cursor(raw: str) -> Dict[str, Any]:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(raw.encode("ascii")))
+        ensure(isinstance(state, dict), "invalid cursor")
+        return state
+    except (ValueError, TypeError):
+        raise BadRequest("invalid cursor")
+
+def iter_export(user_pk: str, kinds: List[str], cursor: Optional[Dict[str, Any]] = None,
+                max_items: Optional[int] = None) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """Yield (ndjson line, None) per item straight off the paginated queries.
+
+    Only one storage page is held at a time. With `max_items`, stops at the
+    first page boundary past the limit and yields a final ("", cursor) to resume from.
+    """
+    emitted = 0
+    start_kind = (cursor or {}).get("kind", kinds[0])
+    ensure(start_kind in kinds, "invalid cursor")
+    start_key = (cursor or {}).get("key")
+    for kind in kinds[kinds.index(start_kind):]:
+        line_type, read_page, view = _EXPORT_KINDS[kind]
+        last = start_key if kind == start_kind else None
+        while True:
+            items, last = read_page(user_pk, last, EXPORT_QUERY_PAGE)
+            for it in items:
+                yield json.dumps({"type": line_type, **view(it)}, cls=DecimalJSONEncoder) + "\n", None
+                emitted += 1
+            if not last:
+                break
+            if max_items is not None and emitted >= max_items:
+                yield "", {"kind": kind, "key": last}
+                return
+        start_key = None
+
+def _export_args(event: Dict[str, Any]) -> Tuple[str, List[str], Optional[Dict[str, Any]]]:
+    qs = event.get("queryStringParameters") or {}
+    ensure((qs.get("format") or "ndjson") == "ndjson", "format must be ndjson")
+    kinds = [k.strip() for k in (qs.get("include") or "events,tasks").split(",") if k.strip()]
+    ensure(kinds and all(k in _EXPORT_KINDS for k in kinds), "include must be a subset of events,tasks")
+    user_pk = get_user_id(event)
+    cursor = _decode_cursor(qs["cursor"]) if qs.get("cursor") else None
+    if cursor is not None:
+        # The key goes back to the store as-is: only one it could have handed out for this caller
+        kind = cursor.get("kind")
+        ensure(kind in kinds and REPO.is_page_key(user_pk, _EXPORT_KINDS[kind][0].upper(), cursor.get("key")),
+               "invalid cursor")
+    return user_pk, kinds, cursor
+
+def stream_export(event: Dict[str, Any]) -> Iterator[bytes]:
+    """Unbounded chunked variant for callers that can stream a body (local server, tools)."""
+    user_pk, kinds, cursor = _export_args(event)
+    for line, _ in iter_export(user_pk, kinds, cursor):
+        yield line.encode("utf-8")
+
+def export_stream_request(event: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Iterator[bytes]]]:
+    """GET /export as one unbounded stream (server.py): (response, body chunks), where the
+    response carries the status and headers, or is the whole answer when chunks is None.
+
+    Called under the lock `handler` runs in, which covers the rate limit and the first page;
+    the chunks are read after it is released, beside other requests. So the export logs and
+    counts into its own context and collector instead of begin()'s, and writes its request
+    line and EMF record when the stream ends (or the client goes away).
+    """
+    started = time.perf_counter()
+    route_label = route_name("GET", "/export")
+    user_pk = get_user_id(event)
+    request_id = request_id_for(event)
+    context: Dict[str, Any] = {"requestId": request_id, "route": route_label, "user": user_pk}
+    metrics = RequestMetrics()
+
+    def finish(status: int, **fields: Any):
+        total_ms = (time.perf_counter() - started) * 1000
+        metrics.emit(route_label, total_ms, status, user_pk)
+        with LOG.using(context):
+            LOG.info("request", status=status, latencyMs=round(total_ms, 2), **fields, **metrics.capacity_fields())
+
+    chunks: Optional[Iterator[bytes]] = None
+    with LOG.using(context), METRICS.using(metrics):
+        try:
+            response = rate_limited(event)
+            if response is None:
+                chunks = stream_export(event)
+                first = next(chunks, b"")  # a bad query string is still a plain 400
+        except Exception as e:
+            response = error_to_response(e)
+    if response is not None:
+        response["headers"]["X-Request-Id"] = request_id
+        finish(response["statusCode"])
+        return response, None
+
+    def body() -> Iterator[bytes]:
+        done = False
+        try:
+            if first:
+                yield first
+            while True:
+                with LOG.using(context), METRICS.using(metrics):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+            done = True
+        except Exception as e:
+            with LOG.using(context):
+                LOG.error("export stream failed", exc=e)
+            raise
+        finally:
+            finish(200, complete=done)
+
+    response = text_resp(200, "", "application/x-ndjson", {
+        "Content-Disposition": 'attachment; filename="export.ndjson"', "X-Request-Id": request_id})
+    return response, body()
+
+def handle_export(event: Dict[str, Any]) -> Dict[str, Any]:
+    # API Gateway proxy responses are buffered, so each response carries at most
+    # EXPORT_MAX_ITEMS lines and X-Export-Cursor points at the rest.
+    user_pk, kinds, cursor = _export_args(event)
+    lines: List[str] = []
+    headers = {"Content-Disposition": 'attachment; filename="export.ndjson"'}
+    for line, next_cursor in iter_export(user_pk, kinds, cursor, EXPORT_MAX_ITEMS):
+        if next_cursor is not None:
+            headers["X-Export-Cursor"] = _encode_cursor(next_cursor)
+        else:
+            lines.append(line)
+    return text_resp(200, "".join(lines), "application/x-ndjson", headers)
+
 def handle_availability_get(event: Dict[str, Any]) -> Dict[str, Any]:
     user_pk = get_user_id(event)
-    return resp(200, get_availability(user_pk))
+    return conditional_get(event, user_pk, lambda: resp(200, get_availability(user_pk)))
 
 def handle_availability_put(event: Dict[str, Any]) -> Dict[str, Any]:
     user_pk = get_user_id(event)
     data = parse_json(event.get("body"))
     weekly = data.get("weekly") or {}
-    tz = (data.get("timezone") or "Asia/Jerusalem").strip()
+    tz = (data.get("timezone") or DEFAULT_TIMEZONE).strip()
     # quick validation: list of [start,end] strings
     for day, windows in weekly.items():
         if not isinstance(windows, list):
@@ -534,87 +1278,236 @@ def handle_availability_put(event: Dict[str, Any]) -> Dict[str, Any]:
     put_availability(user_pk, weekly, tz)
     return resp(200, {"ok": True})
 
+class EventIndex:
+    """Events sorted by start with a running max of end times, for overlap lookups."""
+
+    def __init__(self, events: List[Dict[str, Any]]):
+        rows = []
+        for ev in events:
+            try:
+                rows.append((parse_iso(ev["startISO"]), parse_iso(ev["endISO"]), ev))
+            except BadRequest:
+                continue
+        rows.sort(key=lambda r: r[0])
+        self.rows = rows
+        self.starts = [r[0] for r in rows]
+        self.max_end: List[datetime] = []
+        for _, e, _ in rows:
+            self.max_end.append(max(e, self.max_end[-1]) if self.max_end else e)
+
+    def overlapping(self, s: datetime, e: datetime) -> List[Dict[str, Any]]:
+        # Only rows from the first whose running max end passes `s` up to the last start before `e` can overlap
+        lo = bisect.bisect_right(self.max_end, s)
+        hi = bisect.bisect_left(self.starts, e)
+        return [ev for ev_s, ev_e, ev in self.rows[lo:hi] if ev_e > s]
+
+def _utc_day(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, dt.day, tzinfo=timezone.utc)
+
 def handle_extension_check(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Conflict check for one {startISO,endISO} or many {"ranges": [...]} candidate times.
+
+    Ranges are grouped into contiguous UTC day spans; each span costs one
+    query, and every range is then answered from one in-memory index.
+    """
     user_pk = get_user_id(event)
     data = parse_json(event.get("body"))
-    startISO = data.get("startISO")
-    endISO = data.get("endISO")
-    ensure(startISO and endISO, "startISO and endISO are required")
-    s = parse_iso(startISO)
-    e = parse_iso(endISO)
-    ensure(e > s, "endISO must be after startISO")
-    # Query events overlapping [s,e): simplest is to fetch events in that day range
-    day_start = iso(datetime(s.year, s.month, s.day, tzinfo=timezone.utc))
-    day_end = iso(datetime(s.year, s.month, s.day, tzinfo=timezone.utc) + timedelta(days=1))
-    events = get_events_in_range(user_pk, day_start, day_end)
-    conflicts = []
-    for ev in events:
-        ev_s = parse_iso(ev["startISO"])
-        ev_e = parse_iso(ev["endISO"])
-        if not (e <= ev_s or s >= ev_e):  # overlap exists
-            conflicts.append({
-                "eventId": ev["eventId"],
-                "title": ev["title"],
-                "startISO": ev["startISO"],
-                "endISO": ev["endISO"],
-            })
-    return resp(200, {"available": len(conflicts) == 0, "conflicts": conflicts})
+    single = "ranges" not in data
+    raw = [data] if single else data.get("ranges")
+    ensure(isinstance(raw, list) and raw, "ranges must be a non-empty list")
+    ensure(len(raw) <= EXTENSION_MAX_RANGES, f"at most {EXTENSION_MAX_RANGES} ranges per request")
+    ranges: List[Tuple[datetime, datetime]] = []
+    for r in raw:
+        if isinstance(r, list) and len(r) == 2:
+            startISO, endISO = r
+        else:
+            ensure(isinstance(r, dict), "each range must be [startISO, endISO] or {startISO, endISO}")
+            startISO, endISO = r.get("startISO"), r.get("endISO")
+        ensure(startISO and endISO, "startISO and endISO are required")
+        s = parse_iso(startISO)
+        e = parse_iso(endISO)
+        ensure(e > s, "endISO must be after startISO")
+        ranges.append((s, e))
+
+    # Whole UTC days touched by each range, merged into disjoint spans
+    spans = merge_intervals([(_utc_day(s), _utc_day(e - timedelta(seconds=1)) + timedelta(days=1)) for s, e in ranges])
+    events: Dict[str, Dict[str, Any]] = {}
+    for span_start, span_end in spans:
+        for ev in get_events_overlapping(user_pk, iso(span_start), iso(span_end)):
+            events[ev["eventId"]] = ev
+    index = EventIndex(list(events.values()))
+
+    results = []
+    for s, e in ranges:
+        conflicts = [{
+            "eventId": ev["eventId"],
+            "title": ev["title"],
+            "startISO": ev["startISO"],
+            "endISO": ev["endISO"],
+        } for ev in index.overlapping(s, e)]
+        results.append({"startISO": iso(s), "endISO": iso(e), "available": len(conflicts) == 0, "conflicts": conflicts})
+    if single:
+        return resp(200, {"available": results[0]["available"], "conflicts": results[0]["conflicts"]})
+    return resp(200, {"results": results})
+
+def busy_offsets(busy: List[Tuple[datetime, datetime]], start: datetime, end: datetime) -> List[List[int]]:
+    """Busy intervals as [startMin, endMin) offsets from `start`, widened outward to whole minutes."""
+    out: List[List[int]] = []
+    for s, e in clamp_to_range(busy, start, end):
+        a = int((s - start).total_seconds() // 60)
+        b = -int(-(e - start).total_seconds() // 60)  # ceil
+        if out and a <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], b)
+        else:
+            out.append([a, b])
+    return out
+
+def busy_bitmap(offsets: List[List[int]], total_min: int, resolution: int) -> Tuple[int, bytes]:
+    """One bit per `resolution`-minute slot (MSB first), set when any part of the slot is busy."""
+    slots = -(-total_min // resolution)
+    bits = bytearray(-(-slots // 8))
+    for a, b in offsets:
+        for slot in range(a // resolution, min(slots, -(-b // resolution))):
+            bits[slot >> 3] |= 0x80 >> (slot & 7)
+    return slots, bytes(bits)
+
+def handle_freebusy(event: Dict[str, Any]) -> Dict[str, Any]:
+    user_pk = get_user_id(event)
+    qs = event.get("queryStringParameters") or {}
+    fromISO = qs.get("from")
+    toISO = qs.get("to")
+    ensure(fromISO and toISO, "from and to query params are required")
+    start = parse_iso(fromISO)
+    end = parse_iso(toISO)
+    ensure(end > start, "to must be after from")
+    ensure(end - start <= timedelta(days=92), "range too long (max 92 days)")
+    fmt = qs.get("format") or "offsets"
+    ensure(fmt in ("offsets", "bitmap"), "format must be offsets or bitmap")
+    try:
+        resolution = int(qs.get("resolution") or 15)
+    except ValueError:
+        raise BadRequest("resolution must be an integer number of minutes")
+    ensure(1 <= resolution <= 1440, "resolution (1..1440) minutes")
+
+    version_info = get_version_info(user_pk)
+    version = version_info[0]
+
+    def build():
+        # Straight from stored items to merged intervals; no per-event response objects
+        events = freebusy_snapshot_events(user_pk, version, start, end)
+        if events is None:
+            # Overlap, not start-in-range: an event running into `from` is busy time too
+            events = get_events_overlapping(user_pk, iso(start), iso(end), ["startISO", "endISO"])
+        busy = events_to_intervals(events)
+        offsets = busy_offsets(busy, start, end)
+        body: Dict[str, Any] = {"from": iso(start), "to": iso(end)}
+        if fmt == "bitmap":
+            total_min = -int(-(end - start).total_seconds() // 60)
+            slots, bits = busy_bitmap(offsets, total_min, resolution)
+            body.update({"resolution": resolution, "slots": slots,
+                         "bitmap": base64.b64encode(bits).decode("ascii")})
+        else:
+            body.update({"unit": "min", "busy": offsets})
+        return resp(200, body)
+    return conditional_get(event, user_pk, build, version_info, index_read=True)
+
+def handle_summary_month(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-day event counts and busy minutes, from the DAYSTAT counters (one small query).
+
+    `?month=YYYY-MM`, or `?from=YYYY-MM-DD&to=YYYY-MM-DD` (inclusive) for a
+    grid that spills into the neighbouring months.
+    """
+    user_pk = get_user_id(event)
+    qs = event.get("queryStringParameters") or {}
+    try:
+        if qs.get("from") or qs.get("to"):
+            ensure(qs.get("from") and qs.get("to"), "from and to must be given together")
+            first = date.fromisoformat(qs["from"])
+            last = date.fromisoformat(qs["to"])
+        else:
+            month = qs.get("month") or datetime.now(ZoneInfo(DAYSTAT_TZ)).strftime("%Y-%m")
+            first = datetime.strptime(month, "%Y-%m").date()
+            last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    except ValueError:
+        raise BadRequest("month must be YYYY-MM; from/to must be YYYY-MM-DD")
+    ensure(first <= last, "to must not be before from")
+    ensure((last - first).days < SUMMARY_MAX_DAYS, f"range too long (max {SUMMARY_MAX_DAYS} days)")
+
+    def build():
+        days = []
+        for it in get_day_stats(user_pk, first.isoformat(), last.isoformat()):
+            if it["events"] or it["busyMin"]:
+                days.append(it)
+        return resp(200, {
+            "from": first.isoformat(), "to": last.isoformat(), "timezone": DAYSTAT_TZ, "days": days,
+            "totals": {"events": sum(d["events"] for d in days), "busyMin": sum(d["busyMin"] for d in days)},
+        })
+    return conditional_get(event, user_pk, build)
 
 def handle_suggest(event: Dict[str, Any]) -> Dict[str, Any]:
     user_pk = get_user_id(event)
     data = parse_json(event.get("body"))
-    duration_min = data.get("durationMin")
-    fromISO = data.get("fromISO")
-    toISO = data.get("toISO")
-    ensure(isinstance(duration_min, int) and 5 <= duration_min <= 480, "durationMin (5..480) required")
-    ensure(fromISO and toISO, "fromISO and toISO required")
-
-    now_utc = datetime.now(timezone.utc)
-    range_start = parse_iso(fromISO)
-    range_end   = parse_iso(toISO)
-    # Clamp start to now; never suggest in the past
-    if range_start < now_utc:
-        range_start = now_utc.replace(microsecond=0)
-    ensure(range_end > range_start, "toISO must be after fromISO")
+    limit = data.get("limit", 4)
+    ensure(isinstance(limit, int) and 1 <= limit <= 20, "limit (1..20) must be an integer")
+    version = get_version(user_pk)
+    after = None
+    if data.get("cursor"):
+        # Resume exactly where the previous page stopped: same range, same clock, same data
+        state = _decode_cursor(str(data["cursor"]))
+        try:
+            duration_min = int(state["d"])
+            range_start = parse_iso(state["f"])
+            range_end = parse_iso(state["t"])
+            now_utc = datetime.fromtimestamp(float(state["n"]), timezone.utc)
+            after = (float(state["s"]), parse_iso(state["a"]))
+            cursor_version = int(state["v"])
+        except (KeyError, TypeError, ValueError):
+            raise BadRequest("invalid cursor")
+        if cursor_version != version:
+            return resp(410, {"error": "CursorStale", "message": "Calendar changed since this page; request suggestions again"})
+    else:
+        duration_min = data.get("durationMin")
+        fromISO = data.get("fromISO")
+        toISO = data.get("toISO")
+        ensure(isinstance(duration_min, int) and 5 <= duration_min <= 480, "durationMin (5..480) required")
+        ensure(fromISO and toISO, "fromISO and toISO required")
+
+        now_utc = datetime.now(timezone.utc)
+        range_start = parse_iso(fromISO)
+        range_end   = parse_iso(toISO)
+        # Clamp start to now; never suggest in the past
+        if range_start < now_utc:
+            range_start = now_utc.replace(microsecond=0)
+        ensure(range_end > range_start, "toISO must be after fromISO")
 
     # Load availability & timezone
     avail = get_availability(user_pk)  # {"weekly": {...}, "timezone": "..."}
     weekly = avail.get("weekly", {})
-    tz_name = avail.get("timezone") or "Asia/Jerusalem"
+    tz_name = avail.get("timezone") or DEFAULT_TIMEZONE
 
-    # Build availability intervals in UTC across the requested range (day by day in user's tz)
-    avail_intervals: List[Tuple[datetime, datetime]] = []
-    # Iterate actual calendar days in the user's timezone to avoid crossing DST weirdness
-    # We approximate by iterating UTC dates and converting per-day in local tz (sufficient for MVP).
-    for d in daterange_utc(range_start, range_end):
-        day_ints = local_day_windows_to_utc(d, weekly, tz_name)
-        if not day_ints:
-            continue
-        avail_intervals.extend(day_ints)
-
-    # Clip to requested window
-    avail_intervals = clamp_to_range(merge_intervals(avail_intervals), range_start, range_end)
+    with METRICS.span("availability"):
+        avail_intervals = availability_intervals(weekly, tz_name, range_start, range_end)
 
     # Load fixed events in range and subtract
-    events = get_events_in_range(user_pk, iso(range_start), iso(range_end))
-    busy = events_to_intervals(events)
-    free = subtract_intervals(avail_intervals, busy)
+    events = get_events_in_range(user_pk, iso(range_start), iso(range_end), ["startISO", "endISO"])
+    with METRICS.span("subtract"):
+        busy = events_to_intervals(events)
+        free = subtract_intervals(avail_intervals, busy)
 
     if not free:
         return resp(200, {"suggestions": [], "note": "No free intervals in the requested range."})
 
-    # Generate candidates: step every 30 minutes inside each free interval
+    # Candidates step every 30 minutes inside each free interval; only as many
+    # as it takes to fill this page (+1 to know whether another page exists)
     dur = timedelta(minutes=duration_min)
     step = timedelta(minutes=30)
-    candidates: List[Tuple[datetime, datetime]] = []
-    for fs, fe in free:
-        candidates.extend(step_candidates_in_interval(fs, fe, dur, step))
-
-    if not candidates:
-        return resp(200, {"suggestions": [], "note": "No slots of the requested duration."})
+    with METRICS.span("rank"):
+        ranked = top_candidates(free, dur, step, limit + 1, now_utc, after)
+    top = ranked[:limit]
 
-    ranked = rank_candidates(candidates, free)
-    top = ranked[:4]
+    if not top:
+        note = "No more slots of the requested duration." if after else "No slots of the requested duration."
+        return resp(200, {"suggestions": [], "note": note})
 
     suggestions = [{
         "startISO": iso(cs),
@@ -623,56 +1516,309 @@ def handle_suggest(event: Dict[str, Any]) -> Dict[str, Any]:
         "reasons": reasons
     } for (cs, ce), score, reasons in top]
 
-    return resp(200, {"suggestions": suggestions})
+    body: Dict[str, Any] = {"suggestions": suggestions}
+    if len(ranked) > limit:
+        (last_start, _), last_score, _ = top[-1]
+        body["nextCursor"] = _encode_cursor({
+            "v": version, "d": duration_min, "f": iso(range_start), "t": iso(range_end),
+            "n": now_utc.timestamp(), "s": last_score, "a": iso(last_start),
+        })
+    return resp(200, body)
+
+# ---- Batch --------------------------------------------------------------------
+
+# Routes with no side effects; consecutive ones in a batch run concurrently
+_READ_ROUTES = {("POST", "/suggest"), ("POST", "/extension/check")}
+
+def _is_read(method: str, path: str) -> bool:
+    return method == "GET" or (method, path) in _READ_ROUTES
+
+_OUTER_ONLY_HEADERS = ("if-none-match", "accept-encoding", "content-length", "idempotency-key", "x-profile")
+
+def _sub_event(parent: Dict[str, Any], op: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a proxy event for one batch entry, inheriting the caller's identity."""
+    ensure(isinstance(op, dict), "each batch entry must be an object")
+    method = str(op.get("method") or "").upper()
+    url = urlsplit(str(op.get("path") or ""))
+    ensure(method and url.path.startswith("/"), "each batch entry needs method and path")
+    ensure(url.path != "/batch", "batch entries cannot be nested batches")
+    query = op.get("query") or {}
+    ensure(isinstance(query, dict) and all(isinstance(v, str) for v in query.values()),
+           "query must be an object of strings")
+    extra_headers = op.get("headers") or {}
+    ensure(isinstance(extra_headers, dict) and all(isinstance(v, str) for v in extra_headers.values()),
+           "headers must be an object of strings")
+    qs = dict(parse_qsl(url.query))
+    qs.update(query)
+    # Conditional/encoding headers belong to the outer request, not its parts; so do the
+    # per-request Idempotency-Key and X-Profile (an entry may send its own key)
+    headers = {k: v for k, v in (parent.get("headers") or {}).items() if k.lower() not in _OUTER_ONLY_HEADERS}
+    headers.update(extra_headers)
+    body = op.get("body")
+    return {
+        "httpMethod": method,
+        "path": url.path,
+        "headers": headers,
+        "queryStringParameters": qs or None,
+        "body": body if body is None or isinstance(body, str) else json.dumps(body),
+        "requestContext": parent.get("requestContext") or {},
+    }
+
+# Response headers a batch entry carries over, and the key they get in it
+_SUB_HEADERS = {"ETag": "etag", "X-Export-Cursor": "exportCursor", "Retry-After": "retryAfter",
+                "Idempotent-Replayed": "idempotentReplayed"}
+
+def _sub_result(r: Dict[str, Any]) -> Dict[str, Any]:
+    """One entry of the batch response: {status, body} plus the headers a client needs."""
+    out: Dict[str, Any] = {"status": r["statusCode"], "body": None}
+    content_type = r["headers"].get("Content-Type", "")
+    if r.get("body"):
+        if content_type.startswith("application/json"):
+            out["body"] = json.loads(r["body"])
+        else:
+            # Text routes (the NDJSON of /export) go through as a string
+            out["body"] = r["body"]
+            out["contentType"] = content_type
+    for header, key in _SUB_HEADERS.items():
+        if header in r["headers"]:
+            out[key] = r["headers"][header]
+    return out
+
+def _sub_rate_limited(sub: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """A 429 entry when the entry's own route class is over budget, else None (token taken)."""
+    cls = rate_class(sub["httpMethod"], sub["path"])
+    retry_after = RATE_LIMITER.check(get_user_id(sub), cls) if cls else None
+    return None if retry_after is None else _sub_result(too_many_requests(cls, retry_after))
+
+def _dispatch(sub: Dict[str, Any]) -> Dict[str, Any]:
+    # Own log context: what the entry binds (errorClass, ...) must not land on the batch's line
+    with LOG.scope(subRoute=route_name(sub["httpMethod"], sub["path"])):
+        try:
+            r = route(sub)
+        except Exception as e:
+            r = error_to_response(e)
+    return _sub_result(r)
+
+def handle_batch(event: Dict[str, Any]) -> Dict[str, Any]:
+    data = parse_json(event.get("body"))
+    ops = data.get("requests")
+    ensure(isinstance(ops, list) and ops, "requests must be a non-empty list")
+    ensure(len(ops) <= BATCH_MAX_OPS, f"at most {BATCH_MAX_OPS} requests per batch")
+    # A malformed entry gets its own 400; the rest still run
+    subs: List[Optional[Dict[str, Any]]] = []
+    results: List[Optional[Dict[str, Any]]] = []
+    for op in ops:
+        try:
+            subs.append(_sub_event(event, op))
+            results.append(None)
+        except BadRequest as e:
+            subs.append(None)
+            with LOG.scope():
+                results.append(_sub_result(error_to_response(e)))
+
+    # Every entry pays for its route class as if sent on its own; those over budget get a 429
+    limited = 0
+    for k, sub in enumerate(subs):
+        if sub is not None and results[k] is None:
+            results[k] = _sub_rate_limited(sub)
+            limited += results[k] is not None
+    if limited:
+        LOG.bind(rateLimitedEntries=limited)
+
+    # Preserve order: writes run alone, runs of adjacent reads run together
+    i = 0
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as pool:
+        while i < len(subs):
+            if results[i] is not None:
+                i += 1
+                continue
+            j = i
+            while j < len(subs) and results[j] is None and _is_read(subs[j]["httpMethod"], subs[j]["path"]):
+                j += 1
+            if j - i > 1:
+                for k, r in zip(range(i, j), pool.map(_dispatch, subs[i:j])):
+                    results[k] = r
+                i = j
+            else:
+                results[i] = _dispatch(subs[i])
+                i += 1
+    return resp(200, {"responses": results})
+
+# ---- Scheduled maintenance ----------------------------------------------------
+
+def is_scheduled(event: Dict[str, Any]) -> bool:
+    """An EventBridge schedule tick, not an API request."""
+    return "httpMethod" not in event and event.get("source") == "aws.events" \
+        and event.get("detail-type") == "Scheduled Event"
+
+def _snapshot_window(now: datetime) -> Tuple[datetime, datetime]:
+    start = now.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=FREEBUSY_SNAPSHOT_DAYS)
+
+def precompute_freebusy(user_pk: str, now: datetime) -> int:
+    """Store the intervals of the events overlapping the coming FREEBUSY_SNAPSHOT_DAYS, tagged
+    with the data version; GET /freebusy answers from it while that version is current.
+    Returns how many, or -1 when the last write is too recent to trust the index."""
+    # Version first: a write racing the query leaves the snapshot outdated, never wrong. Within
+    # INDEX_SETTLE_SECONDS of the last write the index may not show it yet, so nothing is stored.
+    version, updated_at = get_version_info(user_pk)
+    if updated_at is not None and time.time() - updated_at <= INDEX_SETTLE_SECONDS:
+        return -1
+    start, end = _snapshot_window(now)
+    events = get_events_overlapping(user_pk, iso(start), iso(end), ["startISO", "endISO"])
+    REPO.put_snapshot(user_pk, "freebusy", {"from": iso(start), "to": iso(end), "version": version,
+                                            "events": [[e["startISO"], e["endISO"]] for e in events]})
+    return len(events)
+
+def freebusy_snapshot_events(user_pk: str, version: int, start: datetime, end: datetime) -> Optional[List[Dict[str, Any]]]:
+    """What get_events_overlapping(start, end) would return, from the snapshot; None if it can't say."""
+    today, _ = _snapshot_window(datetime.now(timezone.utc))
+    # Only ranges a snapshot from today's or yesterday's run covers are worth the GetItem
+    if start < today or end > today + timedelta(days=FREEBUSY_SNAPSHOT_DAYS - 1):
+        return None
+    snap = REPO.get_snapshot(user_pk, "freebusy")
+    lo, hi = iso(start), iso(end)
+    if not snap or int(snap["version"]) != version or lo < snap["from"] or hi > snap["to"]:
+        return None
+    METRICS.incr("FreeBusySnapshot")
+    return [{"startISO": s, "endISO": e} for s, e in snap["events"] if s < hi and e > lo]
+
+def maintain_user(user_pk: str, now: datetime) -> None:
+    """Refresh one user's derived data: DAYSTAT counters and the free/busy snapshot."""
+    rebuild_day_stats(user_pk)
+    precompute_freebusy(user_pk, now)
+
+def _maintain(user: Dict[str, Any]) -> bool:
+    # Users idle for MAINTENANCE_ACTIVE_DAYS keep what they have
+    if user["updatedAt"] is not None and user["updatedAt"] < time.time() - MAINTENANCE_ACTIVE_DAYS * 86400:
+        return True
+    maintain_user(user["userPk"], datetime.now(timezone.utc))
+    return True
+
+MAINTENANCE_JOB = batchscan.ScanJob(
+    "maintenance",
+    source=lambda segment, total, after, limit: REPO.users_page(after, limit, segment, total),
+    process=_maintain,
+    segments=MAINTENANCE_SEGMENTS,
+    page=MAINTENANCE_PAGE,
+    workers=MAINTENANCE_WORKERS,
+    rcu_budget=MAINTENANCE_RCU_BUDGET,
+).register()
+
+def run_maintenance(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """The daily tick: purge expired records, then start (or resume) the day's maintenance
+    run over every user. Its segments run on threads here, or as their own invocations
+    in Lambda; a duplicate tick finds them running or done."""
+    run_id = str(event.get("time") or iso(datetime.now(timezone.utc)))[:10]
+    purged = REPO.purge_expired()
+    summary = MAINTENANCE_JOB.start(REPO, run_id, context)
+    LOG.info("maintenance", purged=purged, **summary)
+    return {**summary, "purged": purged}
 
 # ---- Router -------------------------------------------------------------------
 
+def route(event: Dict[str, Any]) -> Dict[str, Any]:
+    method = (event.get("httpMethod") or "").upper()
+    path = event.get("path") or "/"
+
+    # CORS preflight
+    if method == "OPTIONS":
+        return resp(200, {"ok": True})
+
+    if path.endswith("/health"):
+        return handle_health(event)
+
+    # /events and /events/{id}
+    if path.startswith("/events"):
+        if method == "POST" and path == "/events":
+            return idempotent(event, handle_events_post)
+        if method == "GET" and path == "/events":
+            return handle_events_get(event)
+        if method == "DELETE":
+            return handle_events_delete(event)
+        if method == "PUT":
+            return handle_events_put(event)
+    # /tasks and /tasks/{id}
+    if path.startswith("/tasks"):
+        if method == "POST" and path == "/tasks":
+            return idempotent(event, handle_tasks_post)
+        if method == "GET" and path == "/tasks":
+            return handle_tasks_get(event)
+        if method == "DELETE":
+            return handle_tasks_delete(event)
+
+    # /export
+    if path == "/export" and method == "GET":
+        return handle_export(event)
+
+    # /changes
+    if path == "/changes" and method == "GET":
+        return handle_changes_get(event)
+
+    # /availability
+    if path == "/availability":
+        if method == "GET":
+            return handle_availability_get(event)
+        if method == "PUT":
+            return handle_availability_put(event)
+
+    # /freebusy
+    if path == "/freebusy" and method == "GET":
+        return handle_freebusy(event)
+
+    # /summary/month
+    if path == "/summary/month" and method == "GET":
+        return handle_summary_month(event)
+
+    # /extension/check
+    if path == "/extension/check" and method == "POST":
+        return handle_extension_check(event)
+
+    # /suggest
+    if path == "/suggest" and method == "POST":
+        return handle_suggest(event)
+
+    # /batch
+    if path == "/batch" and method == "POST":
+        return handle_batch(event)
+
+    return resp(404, {"error": "NotFound", "path": path, "method": method})
+
 def handler(event, context):
+    started = time.perf_counter()
+    request_id = request_id_for(event, context)
+    if is_scheduled(event) or batchscan.is_scan_event(event):
+        label = "SCHEDULED maintenance" if is_scheduled(event) else f"SCAN {event.get('job')}"
+        LOG.begin(request_id, route=label)
+        METRICS.reset()
+        try:
+            return run_maintenance(event, context) if is_scheduled(event) else batchscan.handle_event(event, context, REPO)
+        finally:
+            METRICS.emit(label, (time.perf_counter() - started) * 1000, 200)
+            LOG.end()
+    route_label = route_name((event.get("httpMethod") or "").upper(), event.get("path") or "/")
+    user_pk = get_user_id(event)
+    LOG.begin(request_id, route=route_label, user=user_pk)
+    METRICS.reset()
     try:
-        method = (event.get("httpMethod") or "").upper()
-        path = event.get("path") or "/"
-
-        # CORS preflight
-        if method == "OPTIONS":
-            return resp(200, {"ok": True})
-
-        if path.endswith("/health"):
-            return handle_health(event)
-
-        # /events and /events/{id}
-        if path.startswith("/events"):
-            if method == "POST" and path == "/events":
-                return handle_events_post(event)
-            if method == "GET" and path == "/events":
-                return handle_events_get(event)
-            if method == "DELETE":
-                return handle_events_delete(event)
-            if method == "PUT":
-                return handle_events_put(event)
-        # /tasks and /tasks/{id}
-        if path.startswith("/tasks"):
-            if method == "POST" and path == "/tasks":
-                return handle_tasks_post(event)
-            if method == "GET" and path == "/tasks":
-                return handle_tasks_get(event)
-            if method == "DELETE":
-                return handle_tasks_delete(event)
-
-        # /availability
-        if path == "/availability":
-            if method == "GET":
-                return handle_availability_get(event)
-            if method == "PUT":
-                return handle_availability_put(event)
-
-        # /extension/check
-        if path == "/extension/check" and method == "POST":
-            return handle_extension_check(event)
-
-        # /suggest
-        if path == "/suggest" and method == "POST":
-            return handle_suggest(event)
-
-        return resp(404, {"error": "NotFound", "path": path, "method": method})
+        # Binary media types are enabled on the API (for compressed responses), so
+        # request bodies may arrive base64-encoded; hand the routes plain text.
+        if event.get("isBase64Encoded") and event.get("body"):
+            event = {**event, "body": base64.b64decode(event["body"]).decode("utf-8"), "isBase64Encoded": False}
+        response = rate_limited(event) or route(event)
     except Exception as e:
-        return error_to_response(e)
+        response = error_to_response(e)
+    response = maybe_compress(event, response)
+    total_ms = (time.perf_counter() - started) * 1000
+    response["headers"]["X-Request-Id"] = request_id
+    if METRICS.counts.get("StaleReads"):
+        # Some reads were answered from the last good copy while DynamoDB was failing
+        response["headers"]["Warning"] = '110 - "Response is Stale"'
+    response["headers"]["Server-Timing"] = METRICS.server_timing(total_ms)
+    METRICS.emit(route_label, total_ms, response["statusCode"], user_pk)
+    LOG.info("request", status=response["statusCode"], latencyMs=round(total_ms, 2), **METRICS.capacity_fields())
+    LOG.end()
+    return response
+
+# Opt-in profiling (PROFILE_MODE / signed X-Profile header); a no-op rebind when unset
+handler = profiling.wrap(handler, get_user_id)
@@ -0,0 +1,239 @@
+"""Cross-user batch jobs over a parallel, segmented scan.
+
+A `ScanJob` applies `process` to every item a page source yields, usually
+`Repository.users_page`, split into `segments` independent parts: DynamoDB
+Scan `Segment`/`TotalSegments`, or a hash of the user key on the other
+backends. Table-wide work then scales with the number of segments instead of
+walking the table one page after another.
+
+Each segment:
+
+- is its own leased job run (`claim_job`/`save_job`, run id
+  `<runId>#<segment>/<segments>`). Its cursor (the scan's LastEvaluatedKey)
+  is checkpointed after every page, so a stopped segment resumes where it
+  left off, and a second start of a running or finished segment does nothing;
+- streams: each page is processed and checkpointed before the next is read;
+  a page that fails with StorageUnavailable is not checkpointed and is
+  processed again on resume, so `process` must be idempotent;
+- paces the reads of the whole process, scan pages and whatever `process`
+  reads, to `rcu_budget` RCU per second. The pacing uses the capacity
+  DynamoDB reports (observability; needs DDB_CAPACITY_ACCOUNTING), so the
+  backends without capacity units are never held back.
+
+`ScanJob.start` runs the segments on threads in this process. In Lambda it
+invokes the function once per segment instead, asynchronously, with
+`{"source": "scheduler.scan", "job", "runId", "segment", "totalSegments"}`;
+app.handler passes such events to `handle_event`. Each of those invocations
+gets rcu_budget / segments. A segment with less than SCAN_RESERVE_MS left
+hands the rest on to a new invocation.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from observability import LOG, METRICS
+from resilience import StorageUnavailable
+
+SCAN_SEGMENTS = int(os.environ.get("SCAN_SEGMENTS", "4"))
+SCAN_PAGE = int(os.environ.get("SCAN_PAGE", "500"))
+# RCU per second for a whole job (all segments); 0 = unpaced
+SCAN_RCU_BUDGET = float(os.environ.get("SCAN_RCU_BUDGET", "0"))
+SCAN_RESERVE_MS = int(os.environ.get("SCAN_RESERVE_MS", "3000"))
+# Lease of a segment run outside Lambda, renewed with every checkpoint
+SCAN_LEASE_S = int(os.environ.get("SCAN_LEASE_S", "300"))
+
+EVENT_SOURCE = "scheduler.scan"
+
+# (segment, total_segments, after, limit) -> (items, cursor)
+Source = Callable[[int, int, Optional[Any], int], Any]
+
+JOBS: Dict[str, "ScanJob"] = {}
+
+
+class RcuThrottle:
+    """Holds the read capacity this process consumes to `budget` RCU/s, with up to
+    `burst` seconds' worth ahead of schedule. Shared by the segment threads."""
+
+    def __init__(self, budget: float, burst: float = 1.0, clock=time.monotonic, sleep=time.sleep):
+        self.budget = budget
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.seen = METRICS.capacity_total.get("RCU", 0.0)
+        self.paid_until = clock()  # when the capacity consumed so far fits the budget
+
+    def wait(self) -> None:
+        if self.budget <= 0:
+            return
+        with self._lock:
+            used = METRICS.capacity_total.get("RCU", 0.0)
+            now = self.clock()
+            self.paid_until = max(self.paid_until, now - self.burst) + (used - self.seen) / self.budget
+            self.seen = used
+            delay = self.paid_until - now
+        if delay > 0:
+            METRICS.add_time("throttle", delay * 1000)
+            self.sleep(delay)
+
+
+class ScanJob:
+    """A named batch job: `process(item)` for every item `source` yields, in segments.
+
+    `process` returns a falsy value (or raises) for an item that failed; those
+    are counted and logged, and the job goes on. `workers` threads process
+    the items of a page (shared by the segments running in one process).
+    """
+
+    def __init__(self, name: str, source: Source, process: Callable[[Dict[str, Any]], Any],
+                 segments: int = SCAN_SEGMENTS, page: int = SCAN_PAGE, workers: int = 1,
+                 rcu_budget: float = SCAN_RCU_BUDGET):
+        self.name = name
+        self.source = source
+        self.process = process
+        self.segments = max(1, segments)
+        self.page = page
+        self.workers = max(1, workers)
+        self.rcu_budget = rcu_budget
+
+    def register(self) -> "ScanJob":
+        """Make the job runnable from a `scheduler.scan` event (the segments in Lambda)."""
+        JOBS[self.name] = self
+        return self
+
+    def start(self, repo, run_id: str, context=None) -> Dict[str, Any]:
+        """Run (or resume) every segment of `run_id`: fanned out to Lambda invocations when
+        running in Lambda, else on threads here. Returns a summary."""
+        if getattr(context, "invoked_function_arn", None):
+            invoked = _invoke(context, self.name, run_id, range(self.segments), self.segments)
+            return {"runId": run_id, "segments": self.segments, "invoked": invoked}
+        throttle = RcuThrottle(self.rcu_budget)
+        pool = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            with ThreadPoolExecutor(self.segments) as segs:
+                futures = [segs.submit(self.run_segment, repo, run_id, s, self.segments, None, pool, throttle)
+                           for s in range(self.segments)]
+                results = []
+                for s, f in enumerate(futures):
+                    try:
+                        results.append(f.result())
+                    except Exception as e:
+                        LOG.error("scan segment failed", job=self.name, segment=s, exc=e)
+                        results.append({"segment": s, "status": "error"})
+        finally:
+            if pool:
+                pool.shutdown()
+        summary = {"runId": run_id, "segments": self.segments,
+                   "items": sum(r.get("items", 0) for r in results),
+                   "failed": sum(r.get("failed", 0) for r in results),
+                   "status": _overall(r["status"] for r in results)}
+        return summary
+
+    def run_segment(self, repo, run_id: str, segment: int, total: int, context=None,
+                    pool: Optional[ThreadPoolExecutor] = None, throttle: Optional[RcuThrottle] = None) -> Dict[str, Any]:
+        """Process one segment from its checkpoint until it is done, the lease is lost,
+        or (in Lambda) the invocation is about to time out."""
+        seg_run = f"{run_id}#{segment}/{total}"
+        owner = getattr(context, "aws_request_id", None) or uuid.uuid4().hex
+        remaining = getattr(context, "get_remaining_time_in_millis", None)
+
+        def lease_until() -> int:
+            return int(time.time() + (remaining() / 1000 if remaining else SCAN_LEASE_S)) + 5
+
+        job = repo.claim_job(self.name, seg_run, owner, lease_until(), int(time.time()))
+        if job is None:
+            LOG.info("scan segment already done or in progress", job=self.name, run=seg_run)
+            return {"segment": segment, "status": "skipped"}
+        cursor = job.get("cursor")
+        items, failed = int(job.get("items", 0)), int(job.get("failed", 0))
+        status = "running"
+        try:
+            while True:
+                page, next_cursor = self.source(segment, total, cursor, self.page)
+                ok = sum(pool.map(self._one, page) if pool else map(self._one, page))
+                items, failed, cursor = items + len(page), failed + len(page) - ok, next_cursor
+                status = "running" if cursor else "done"
+                state = {"cursor": cursor, "items": items, "failed": failed, "status": status,
+                         "leaseUntil": lease_until()}
+                if not repo.save_job(self.name, seg_run, owner, state):
+                    LOG.warning("scan segment lease lost", job=self.name, run=seg_run)
+                    status = "lost"
+                    break
+                if cursor is None:
+                    break
+                (throttle or _NO_THROTTLE).wait()
+                if remaining and remaining() < SCAN_RESERVE_MS:
+                    repo.save_job(self.name, seg_run, owner, {"leaseUntil": 0})
+                    _invoke(context, self.name, run_id, [segment], total)
+                    status = "handed-off"
+                    break
+        except StorageUnavailable:
+            # Stop without advancing; the next claim (after a retry) resumes from the checkpoint
+            repo.save_job(self.name, seg_run, owner, {"leaseUntil": 0})
+            raise
+        LOG.info("scan segment", job=self.name, run=seg_run, items=items, failed=failed, status=status)
+        return {"segment": segment, "items": items, "failed": failed, "status": status}
+
+    def _one(self, item: Dict[str, Any]) -> bool:
+        try:
+            return bool(self.process(item))
+        except StorageUnavailable:
+            raise
+        except Exception as e:
+            LOG.warning("scan job item failed", job=self.name, exc=e)
+            return False
+
+
+_NO_THROTTLE = RcuThrottle(0)
+
+
+def _overall(statuses: Iterable[str]) -> str:
+    statuses = set(statuses)
+    if statuses == {"skipped"}:
+        return "skipped"
+    if statuses <= {"done", "skipped"}:
+        return "done"
+    return "error" if "error" in statuses else "running"
+
+
+def _invoke(context, job: str, run_id: str, segments: Iterable[int], total: int) -> int:
+    """Start one asynchronous invocation of this function per segment; returns how many went out."""
+    import boto3
+
+    client = boto3.client("lambda")
+    sent = 0
+    for s in segments:
+        payload = {"source": EVENT_SOURCE, "job": job, "runId": run_id, "segment": s, "totalSegments": total}
+        try:
+            client.invoke(FunctionName=context.invoked_function_arn, InvocationType="Event",
+                          Payload=json.dumps(payload).encode("utf-8"))
+            sent += 1
+        except Exception as e:
+            LOG.error("scan segment invoke failed; it resumes on the next start", job=job, runId=run_id,
+                      segment=s, exc=e)
+    return sent
+
+
+def is_scan_event(event: Dict[str, Any]) -> bool:
+    return event.get("source") == EVENT_SOURCE and "httpMethod" not in event
+
+
+def handle_event(event: Dict[str, Any], context, repo) -> Dict[str, Any]:
+    """Run the segment a `scheduler.scan` invocation was started for."""
+    job = JOBS.get(event.get("job"))
+    if job is None:
+        LOG.error("unknown scan job", job=event.get("job"))
+        return {"status": "unknown-job"}
+    total = int(event["totalSegments"])
+    throttle = RcuThrottle(job.rcu_budget / total)
+    pool = ThreadPoolExecutor(job.workers) if job.workers > 1 else None
+    try:
+        return {"job": job.name, "runId": event["runId"],
+                **job.run_segment(repo, event["runId"], int(event["segment"]), total, context, pool, throttle)}
+    finally:
+        if pool:
+            pool.shutdown()
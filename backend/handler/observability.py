@@ -0,0 +1,334 @@
+"""Structured request logging and per-request metrics for the API Lambda.
+
+One JSON object per line on stdout (CloudWatch picks them up as-is). Each line
+carries the request context bound by `begin()`: request id, user, route.
+
+Cost control, so logging never dominates under an error storm:
+- LOG_LEVEL drops anything below the threshold before any formatting happens.
+- LOG_SAMPLE_RATE samples whole requests for below-WARNING lines (the decision
+  is made once per request so a sampled request keeps all of its lines).
+- Stack traces are formatted lazily and only while the per-container trace
+  budget (LOG_TRACE_PER_SEC / LOG_TRACE_BURST) has tokens; the rest are counted
+  and reported as `tracesSuppressed` on the next trace that does get rendered.
+
+Metrics: `METRICS.span(name)` times a phase of the current request and
+`METRICS.incr(name)` counts things (DynamoDB calls are counted and timed via
+botocore event hooks, see `instrument_client`). At the end of a request the
+handler turns them into a `Server-Timing` header and one CloudWatch Embedded
+Metric Format line.
+
+Every DynamoDB call also asks for `ReturnConsumedCapacity=INDEXES`; the
+capacity units it reports are summed per request as RCU/WCU (plus per-index
+`RCU.<index>`/`WCU.<index>`), logged on the request line and emitted with the
+Route dimension and, for RCU/WCU with METRICS_USER_DIMENSION=true, a User dimension.
+`backend/tools/capacity_report.py` ranks routes and users from those lines.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+
+class JsonLogger:
+    def __init__(self, level: str = "INFO", sample_rate: float = 1.0,
+                 trace_per_sec: float = 1.0, trace_burst: int = 5, stream=None):
+        self.level = LEVELS.get(level.upper(), 20)
+        self.sample_rate = sample_rate
+        self.trace_per_sec = trace_per_sec
+        self.trace_burst = trace_burst
+        self.stream = stream or sys.stdout
+        self._tokens = float(trace_burst)
+        self._refilled = time.monotonic()
+        self.traces_suppressed = 0
+        self._context: Dict[str, Any] = {}
+        self._local = threading.local()  # per-thread contexts opened by scope()
+        self.sampled = True
+
+    @classmethod
+    def from_env(cls) -> "JsonLogger":
+        return cls(
+            level=os.environ.get("LOG_LEVEL", "INFO"),
+            sample_rate=float(os.environ.get("LOG_SAMPLE_RATE", "1.0")),
+            trace_per_sec=float(os.environ.get("LOG_TRACE_PER_SEC", "1.0")),
+            trace_burst=int(os.environ.get("LOG_TRACE_BURST", "5")),
+        )
+
+    # ---- request context
+    @property
+    def context(self) -> Dict[str, Any]:
+        """The context lines get: the innermost scope() of this thread, else the request's."""
+        scoped = getattr(self._local, "context", None)
+        return self._context if scoped is None else scoped
+
+    def begin(self, request_id: str, **fields: Any):
+        self._context = {"requestId": request_id, **fields}
+        self.sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def bind(self, **fields: Any):
+        self.context.update(fields)
+
+    def end(self):
+        self._context = {}
+        self.sampled = True
+
+    @contextmanager
+    def scope(self, **fields: Any):
+        """A copy of the current context plus `fields` for this thread until the block exits.
+
+        For work inside a request, such as /batch sub-requests on worker threads:
+        their lines carry the request context, and what they bind stays theirs.
+        """
+        with self.using({**self.context, **fields}):
+            yield
+
+    @contextmanager
+    def using(self, context: Dict[str, Any]):
+        """`context` itself (what is bound lands in it) for this thread until the block exits.
+
+        For a request running beside the one begin() opened, such as an export
+        streamed by server.py: re-entered around each step, it keeps its own context.
+        """
+        outer = getattr(self._local, "context", None)
+        self._local.context = context
+        try:
+            yield
+        finally:
+            self._local.context = outer
+
+    # ---- emitting
+    def enabled(self, level: str) -> bool:
+        lvl = LEVELS[level]
+        if lvl < self.level:
+            return False
+        return lvl >= LEVELS["WARNING"] or self.sampled
+
+    def _take_trace_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.trace_burst, self._tokens + (now - self._refilled) * self.trace_per_sec)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        self.traces_suppressed += 1
+        return False
+
+    def log(self, level: str, msg: str, exc: Optional[BaseException] = None, **fields: Any):
+        if not self.enabled(level):
+            return
+        rec = {"level": level, "msg": msg, **self.context, **fields}
+        if exc is not None:
+            rec["errorClass"] = type(exc).__name__
+            rec["error"] = str(exc)
+            # The expensive part: only render the stack when the budget allows it
+            if level == "ERROR" and self._take_trace_token():
+                rec["trace"] = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+                if self.traces_suppressed:
+                    rec["tracesSuppressed"] = self.traces_suppressed
+                    self.traces_suppressed = 0
+        self.stream.write(json.dumps(rec, default=str) + "\n")
+
+    def debug(self, msg: str, **fields: Any):
+        self.log("DEBUG", msg, **fields)
+
+    def info(self, msg: str, **fields: Any):
+        self.log("INFO", msg, **fields)
+
+    def warning(self, msg: str, **fields: Any):
+        self.log("WARNING", msg, **fields)
+
+    def error(self, msg: str, **fields: Any):
+        self.log("ERROR", msg, **fields)
+
+
+LOG = JsonLogger.from_env()
+
+
+def request_id_for(event: Dict[str, Any], context: Any = None) -> str:
+    """Client-supplied X-Request-Id wins, then API Gateway's id, then the Lambda invocation id."""
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    rid = (headers.get("x-request-id") or "").strip()
+    if rid:
+        return rid[:128]
+    rid = (event.get("requestContext") or {}).get("requestId")
+    if rid:
+        return rid
+    return getattr(context, "aws_request_id", None) or uuid.uuid4().hex
+
+
+def route_name(method: str, path: str) -> str:
+    """Low-cardinality route label for aggregation: ids in /events/{id} etc. are collapsed."""
+    parts = [p for p in (path or "/").split("/") if p]
+    if len(parts) >= 2 and parts[0] in ("events", "tasks"):
+        parts = [parts[0], "{id}"]
+    return f"{method or '-'} /{'/'.join(parts)}"
+
+
+# ---- Metrics -------------------------------------------------------------------
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "SmartHybridScheduler")
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+# One custom metric per user and capacity kind; turn off if the user count makes that too costly
+# One custom metric per user: opt in only while the number of users keeps that affordable
+METRICS_USER_DIMENSION = os.environ.get("METRICS_USER_DIMENSION", "false").lower() == "true"
+DDB_CAPACITY_ACCOUNTING = os.environ.get("DDB_CAPACITY_ACCOUNTING", "true").lower() == "true"
+
+
+class RequestMetrics:
+    """Phase timings (ms) and counters for the request in flight; reset by the handler."""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # /batch may run sub-requests on worker threads
+        self._local = threading.local()  # per-thread collectors set by using()
+        # Consumed capacity since the process started, never reset: batch jobs pace themselves on it
+        self.capacity_total: Dict[str, float] = {}
+        self.reset()
+
+    def reset(self):
+        self.phases: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.capacity: Dict[str, float] = {}
+
+    @contextmanager
+    def using(self, collector: "RequestMetrics"):
+        """Record this thread's timings, counts and capacity in `collector` until the block
+        exits, for a request running beside the one in flight (see JsonLogger.using).
+        Capacity still adds to this process's `capacity_total`."""
+        outer = getattr(self._local, "collector", None)
+        self._local.collector = collector
+        try:
+            yield
+        finally:
+            self._local.collector = outer
+
+    def _collector(self) -> "RequestMetrics":
+        return getattr(self._local, "collector", None) or self
+
+    def add_time(self, name: str, ms: float):
+        target = self._collector()
+        with target._lock:
+            target.phases[name] = target.phases.get(name, 0.0) + ms
+
+    def incr(self, name: str, n: int = 1):
+        target = self._collector()
+        with target._lock:
+            target.counts[name] = target.counts.get(name, 0) + n
+
+    def add_capacity(self, name: str, units: float):
+        target = self._collector()
+        with target._lock:
+            target.capacity[name] = target.capacity.get(name, 0.0) + units
+        with self._lock:
+            self.capacity_total[name] = self.capacity_total.get(name, 0.0) + units
+
+    def capacity_fields(self) -> Dict[str, float]:
+        """{"rcu": .., "wcu": ..} for the request log line (zeros included, so sums are easy)."""
+        return {"rcu": round(self.capacity.get("RCU", 0.0), 2), "wcu": round(self.capacity.get("WCU", 0.0), 2)}
+
+    @contextmanager
+    def span(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, (time.perf_counter() - t0) * 1000)
+
+    def server_timing(self, total_ms: float) -> str:
+        parts = [f"{name};dur={ms:.2f}" for name, ms in self.phases.items()]
+        parts.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(parts)
+
+    def emf(self, route: str, total_ms: float, status: int, user: Optional[str] = None) -> Dict[str, Any]:
+        """One Embedded Metric Format record: everything keyed by the Route dimension,
+        consumed capacity also by User."""
+        values: Dict[str, Any] = {"Latency": round(total_ms, 3)}
+        units = {"Latency": "Milliseconds"}
+        for name, ms in self.phases.items():
+            values[f"Phase.{name}"] = round(ms, 3)
+            units[f"Phase.{name}"] = "Milliseconds"
+        for name, n in self.counts.items():
+            values[name] = n
+            units[name] = "Count"
+        for name, cu in self.capacity.items():
+            values[name] = round(cu, 3)
+            units[name] = "Count"
+        values["Errors"] = 1 if status >= 500 else 0
+        units["Errors"] = "Count"
+        directives = [{
+            "Namespace": METRICS_NAMESPACE,
+            "Dimensions": [["Route"]],
+            "Metrics": [{"Name": k, "Unit": u} for k, u in units.items()],
+        }]
+        record: Dict[str, Any] = {"Route": route, "StatusCode": status}
+        if user:
+            record["User"] = user  # always searchable in Logs Insights; a dimension only if enabled
+            per_user = [k for k in ("RCU", "WCU") if k in self.capacity]
+            if METRICS_USER_DIMENSION and per_user:
+                directives.append({
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["User"]],
+                    "Metrics": [{"Name": k, "Unit": "Count"} for k in per_user],
+                })
+        return {
+            "_aws": {"Timestamp": int(time.time() * 1000), "CloudWatchMetrics": directives},
+            **record,
+            **values,
+        }
+
+    def emit(self, route: str, total_ms: float, status: int, user: Optional[str] = None, stream=None):
+        if METRICS_ENABLED:
+            (stream or sys.stdout).write(json.dumps(self.emf(route, total_ms, status, user)) + "\n")
+
+
+METRICS = RequestMetrics()
+
+
+def _ddb_before_call(model, context, **_):
+    context["_metrics_t0"] = time.perf_counter()
+    METRICS.incr("DynamoDBCalls")
+    METRICS.incr(f"DynamoDB.{model.name}")
+
+
+def _ddb_after_call(context, parsed=None, model=None, **_):
+    t0 = context.pop("_metrics_t0", None)
+    if t0 is not None:
+        METRICS.add_time("ddb", (time.perf_counter() - t0) * 1000)
+    if parsed and model is not None and "ConsumedCapacity" in parsed:
+        record_consumed_capacity(model.name, parsed["ConsumedCapacity"])
+
+
+# Operations that accept ReturnConsumedCapacity, and which of them consume reads
+_CAPACITY_OPS = {"GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan", "BatchGetItem",
+                 "BatchWriteItem", "TransactGetItems", "TransactWriteItems", "ExecuteStatement"}
+_READ_OPS = {"GetItem", "Query", "Scan", "BatchGetItem", "TransactGetItems"}
+
+
+def _ddb_ask_capacity(params, model, **_):
+    if model.name in _CAPACITY_OPS:
+        params.setdefault("ReturnConsumedCapacity", "INDEXES")
+
+
+def record_consumed_capacity(op: str, consumed):
+    """Add a ConsumedCapacity (a dict, or a list per table for batch/transact calls) to the request."""
+    kind = "RCU" if op in _READ_OPS else "WCU"
+    for cc in consumed if isinstance(consumed, list) else [consumed]:
+        units = cc.get("ReadCapacityUnits" if kind == "RCU" else "WriteCapacityUnits", cc.get("CapacityUnits", 0))
+        METRICS.add_capacity(kind, float(units or 0))
+        for index, part in (cc.get("GlobalSecondaryIndexes") or {}).items():
+            METRICS.add_capacity(f"{kind}.{index}", float(part.get("CapacityUnits") or 0))
+
+
+def instrument_client(client):
+    """Count and time every DynamoDB API call made through `client` (retries included)
+    and, unless DDB_CAPACITY_ACCOUNTING=false, account the capacity each one consumed."""
+    client.meta.events.register("before-call.dynamodb", _ddb_before_call)
+    client.meta.events.register("after-call.dynamodb", _ddb_after_call)
+    if DDB_CAPACITY_ACCOUNTING:
+        client.meta.events.register("provide-client-params.dynamodb", _ddb_ask_capacity)
@@ -0,0 +1,150 @@
+"""On-demand profiling of single API requests.
+
+Off unless configured; with neither PROFILE_MODE nor PROFILE_SECRET set,
+`wrap()` hands back the handler untouched, so there is nothing on the hot path.
+
+- PROFILE_MODE=cprofile|tracemalloc|all profiles every request (staging, load tests).
+- PROFILE_SECRET + PROFILE_USERS profiles only requests carrying a valid
+  `X-Profile: <mode>.<expires>.<hmac>` header minted for an allow-listed user:
+
+      python profiling.py sign --user <cognito-sub> --mode all --ttl 3600
+
+Output goes to PROFILE_DIR (default /tmp/profiles) as `<id>.pstats` plus
+`<id>.txt` (top functions by cumulative time) and `<id>.mem.txt` (top
+allocation sites), and is copied to s3://PROFILE_S3_BUCKET/PROFILE_S3_PREFIX
+when a bucket is configured. The id comes back in the `X-Profile-Id` header.
+"""
+import cProfile
+import functools
+import hashlib
+import hmac
+import io
+import os
+import pstats
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from observability import LOG
+
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "").lower()
+PROFILE_SECRET = os.environ.get("PROFILE_SECRET", "")
+PROFILE_USERS = {u.strip() for u in os.environ.get("PROFILE_USERS", "").split(",") if u.strip()}
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/profiles")
+PROFILE_S3_BUCKET = os.environ.get("PROFILE_S3_BUCKET", "")
+PROFILE_S3_PREFIX = os.environ.get("PROFILE_S3_PREFIX", "profiles/")
+
+MODES = ("cprofile", "tracemalloc", "all")
+
+
+def sign(user_id: str, mode: str, expires: int, secret: str = PROFILE_SECRET) -> str:
+    msg = f"{user_id}|{mode}|{expires}".encode("utf-8")
+    sig = hmac.new(secret.encode("utf-8"), msg, hashlib.sha256).hexdigest()
+    return f"{mode}.{expires}.{sig}"
+
+
+def requested_mode(event: Dict[str, Any], user_pk: str) -> Optional[str]:
+    """Profiling mode for this request, or None. Invalid tokens are ignored, never an error."""
+    if PROFILE_MODE in MODES:
+        return PROFILE_MODE
+    if not PROFILE_SECRET:
+        return None
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    token = (headers.get("x-profile") or "").strip()
+    if not token:
+        return None
+    user_id = user_pk.split("#", 1)[-1]
+    if user_id not in PROFILE_USERS:
+        return None
+    try:
+        mode, expires, _ = token.split(".", 2)
+        expires_at = int(expires)
+    except ValueError:
+        return None
+    if mode not in MODES or expires_at < time.time():
+        return None
+    if not hmac.compare_digest(token, sign(user_id, mode, expires_at)):
+        return None
+    return mode
+
+
+def _upload(paths):
+    import boto3  # only needed when a bucket is configured
+    s3 = boto3.client("s3")
+    for path in paths:
+        s3.upload_file(path, PROFILE_S3_BUCKET, PROFILE_S3_PREFIX + os.path.basename(path))
+
+
+def run_profiled(fn: Callable, event: Dict[str, Any], context: Any, mode: str):
+    profile_id = uuid.uuid4().hex[:12]
+    prof = cProfile.Profile() if mode in ("cprofile", "all") else None
+    trace_mem = mode in ("tracemalloc", "all")
+    if trace_mem:
+        tracemalloc.start(25)
+    if prof:
+        prof.enable()
+    try:
+        response = fn(event, context)
+    finally:
+        if prof:
+            prof.disable()
+        snapshot = tracemalloc.take_snapshot() if trace_mem else None
+        peak = tracemalloc.get_traced_memory()[1] if trace_mem else 0
+        if trace_mem:
+            tracemalloc.stop()
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, profile_id)
+    written = []
+    if prof:
+        prof.dump_stats(base + ".pstats")
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(40)
+        with open(base + ".txt", "w") as f:
+            f.write(out.getvalue())
+        written += [base + ".pstats", base + ".txt"]
+    if snapshot is not None:
+        with open(base + ".mem.txt", "w") as f:
+            f.write(f"peak_bytes {peak}\n")
+            for stat in snapshot.statistics("lineno")[:30]:
+                f.write(f"{stat}\n")
+        written.append(base + ".mem.txt")
+    if PROFILE_S3_BUCKET:
+        try:
+            _upload(written)
+        except Exception as e:  # a failed upload must not fail the request
+            LOG.warning("profile upload failed", exc=e, profileId=profile_id)
+
+    LOG.info("profile written", profileId=profile_id, mode=mode, files=written)
+    response.setdefault("headers", {})["X-Profile-Id"] = profile_id
+    return response
+
+
+def wrap(handler: Callable, user_of: Callable[[Dict[str, Any]], str]) -> Callable:
+    """Return `handler` itself when profiling is not configured, else a checking wrapper."""
+    if not (PROFILE_MODE or PROFILE_SECRET):
+        return handler
+
+    @functools.wraps(handler)
+    def profiled(event, context):
+        mode = requested_mode(event, user_of(event))
+        if mode is None:
+            return handler(event, context)
+        return run_profiled(handler, event, context, mode)
+
+    return profiled
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Mint an X-Profile header value")
+    ap.add_argument("command", choices=["sign"])
+    ap.add_argument("--user", required=True, help="user id without the USER# prefix")
+    ap.add_argument("--mode", choices=MODES, default="cprofile")
+    ap.add_argument("--ttl", type=int, default=3600, help="seconds until the token expires")
+    args = ap.parse_args()
+    if not PROFILE_SECRET:
+        raise SystemExit("PROFILE_SECRET must be set")
+    print(sign(args.user, args.mode, int(time.time()) + args.ttl))
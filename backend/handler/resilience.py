@@ -0,0 +1,232 @@
+"""Failing fast when DynamoDB is unhealthy.
+
+The client already retries (adaptive mode, see `storage.dynamodb_resource`);
+what reaches this layer is a call that failed after its retries: throttled,
+a 5xx, or a connect/read timeout. `GuardedTable` wraps the boto3 Table so:
+
+- every such failure is counted by a `CircuitBreaker`; after
+  DDB_BREAKER_FAILURES in a row the circuit opens and calls fail at once with
+  `StorageUnavailable` (503 + Retry-After) instead of each request burning
+  its Lambda timeout on timeouts. After DDB_BREAKER_COOLDOWN seconds one
+  probe call is let through; if it succeeds the circuit closes.
+- reads (GetItem/Query) keep the last good response per exact request for
+  DDB_STALE_MAX_AGE seconds. When a read fails or the circuit is open, that
+  response is served instead and the request is marked stale (the handler
+  adds a `Warning: 110` header). Consistent reads never fall back: they are
+  made where an older answer would be wrong (versions, idempotency records,
+  counters). Nor do pages (Limit/ExclusiveStartKey), which only make sense
+  next to the neighbouring pages of the same moment. Writes never fall back.
+- `batch_writer` sends its BatchWriteItem calls through the breaker as well.
+
+Conditional-check failures and validation errors are answers, not outages,
+and count as successes.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+from observability import LOG, METRICS
+
+BREAKER_FAILURES = int(os.environ.get("DDB_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("DDB_BREAKER_COOLDOWN", "5"))
+# 0 turns the stale-read fallback off
+STALE_CACHE_ENTRIES = int(os.environ.get("DDB_STALE_CACHE_ENTRIES", "256"))
+STALE_MAX_AGE = float(os.environ.get("DDB_STALE_MAX_AGE", "900"))
+
+# Error codes that mean "DynamoDB could not serve this right now" (after client retries)
+UNAVAILABLE_CODES = {
+    "ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded",
+    "InternalServerError", "ServiceUnavailable", "InternalFailure",
+}
+
+
+class StorageUnavailable(Exception):
+    """DynamoDB is failing or the circuit is open; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_unavailable(e: Exception) -> bool:
+    if isinstance(e, ClientError):
+        return e.response.get("Error", {}).get("Code") in UNAVAILABLE_CODES
+    return isinstance(e, (BotoConnectionError, HTTPClientError))  # connect/read timeouts, resets
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` consecutive failures -> half-open after
+    `cooldown` seconds (one probe at a time) -> closed on the first success."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN,
+                 clock=time.monotonic):
+        self.failures = max(1, failures)
+        self.cooldown = cooldown
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.clock() - self.opened_at >= self.cooldown else "open"
+
+    def before(self) -> None:
+        """Raise StorageUnavailable unless a call may go out now."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            wait = self.opened_at + self.cooldown - self.clock()
+            if wait <= 0 and not self.probing:
+                self.probing = True  # this call is the probe
+                return
+        METRICS.incr("DynamoDB.FastFail")
+        raise StorageUnavailable("DynamoDB circuit is open", max(wait, 1.0))
+
+    def success(self) -> None:
+        with self._lock:
+            was_open = self.opened_at is not None
+            self.consecutive, self.opened_at, self.probing = 0, None, False
+        if was_open:
+            LOG.warning("dynamodb circuit closed")
+
+    def failure(self) -> None:
+        with self._lock:
+            self.consecutive += 1
+            reopen = self.probing or (self.opened_at is None and self.consecutive >= self.failures)
+            if reopen:
+                self.opened_at, self.probing = self.clock(), False
+        if reopen:
+            LOG.warning("dynamodb circuit open", failures=self.consecutive, cooldownS=self.cooldown)
+
+
+class StaleCache:
+    """Last good response per read request, LRU-bounded."""
+
+    def __init__(self, entries: int = STALE_CACHE_ENTRIES, max_age: float = STALE_MAX_AGE, clock=time.monotonic):
+        self.entries = entries
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        # Kept as returned, not copied: most entries are never served, so copying every
+        # successful read would cost more than the rare fallback; `get` copies instead
+        if self.entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self.clock(), response)
+            self._data.move_to_end(key)
+            while len(self._data) > self.entries:
+                self._data.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            hit = self._data.get(key)
+        if hit is None or self.clock() - hit[0] > self.max_age:
+            return None
+        return _snapshot(hit[1])
+
+
+def _snapshot(response: Dict[str, Any]) -> Dict[str, Any]:
+    # Items are copied one level deep: handlers edit loaded items before writing them back
+    out = {k: v for k, v in response.items() if k not in ("Item", "Items", "ResponseMetadata")}
+    if "Item" in response:
+        out["Item"] = dict(response["Item"])
+    if "Items" in response:
+        out["Items"] = [dict(i) for i in response["Items"]]
+    return out
+
+
+def _request_key(op: str, kwargs: Dict[str, Any]) -> str:
+    return op + repr(sorted(kwargs.items()))
+
+
+class GuardedTable:
+    """A boto3 Table (or LocalTable) behind a circuit breaker, with stale reads."""
+
+    READS = ("get_item", "query")
+    UNCACHED = ("put_item", "update_item", "delete_item", "scan")  # writes, and scans (jobs): no fallback
+    # Reads with any of these set are never cached nor answered stale (see the module docstring)
+    UNCACHED_ARGS = ("ConsistentRead", "ExclusiveStartKey", "Limit")
+
+    def __init__(self, table, breaker: Optional[CircuitBreaker] = None, cache: Optional[StaleCache] = None):
+        self.table = table
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = cache if cache is not None else StaleCache()
+
+    def __getattr__(self, name):
+        attr = getattr(self.table, name)  # name, meta, ...
+        if name in self.READS:
+            return lambda **kw: self._read(name, attr, kw)
+        if name in self.UNCACHED:
+            return lambda **kw: self._call(attr, kw)
+        return attr
+
+    def transact_write_items(self, **kwargs):
+        # Not a Table method in boto3: it lives on the resource's client (same native types)
+        fn = getattr(self.table, "transact_write_items", None) or self.table.meta.client.transact_write_items
+        return self._call(fn, kwargs)
+
+    def batch_writer(self, **kwargs):
+        return _GuardedWriter(self, self.table.batch_writer(**kwargs))
+
+    def _call(self, fn, kwargs):
+        self.breaker.before()
+        try:
+            out = fn(**kwargs)
+        except Exception as e:
+            if not is_unavailable(e):
+                self.breaker.success()  # DynamoDB answered (e.g. a failed condition)
+                raise
+            self.breaker.failure()
+            wait = self.breaker.cooldown if self.breaker.state != "closed" else 1.0
+            raise StorageUnavailable(f"DynamoDB unavailable: {type(e).__name__}", wait) from e
+        self.breaker.success()
+        return out
+
+    def _read(self, op, fn, kwargs):
+        if any(kwargs.get(arg) for arg in self.UNCACHED_ARGS):
+            return self._call(fn, kwargs)
+        key = _request_key(op, kwargs)
+        try:
+            out = self._call(fn, kwargs)
+        except StorageUnavailable as e:
+            stale = self.cache.get(key)
+            if stale is None:
+                raise
+            METRICS.incr("StaleReads")
+            LOG.debug("serving stale read", op=op, reason=str(e))
+            return stale
+        self.cache.put(key, out)
+        return out
+
+
+class _GuardedWriter:
+    """A batch writer whose calls pass the breaker: BatchWriteItem goes out from put_item
+    and delete_item (whenever the buffer fills) and from the flush on exit."""
+
+    def __init__(self, guard: GuardedTable, writer):
+        self.guard = guard
+        self.writer = writer
+
+    def __enter__(self):
+        self.guard._call(self.writer.__enter__, {})
+        return self
+
+    def __exit__(self, *exc):
+        return self.guard._call(lambda: self.writer.__exit__(*exc), {})
+
+    def put_item(self, **kwargs):
+        return self.guard._call(self.writer.put_item, kwargs)
+
+    def delete_item(self, **kwargs):
+        return self.guard._call(self.writer.delete_item, kwargs)
@@ -0,0 +1,304 @@
+"""Run the API as a plain HTTP server instead of behind API Gateway + Lambda.
+
+Each HTTP request is turned into the REST proxy event `app.handler` already
+takes, so routing, auth, rate limits, ETags and compression behave the same.
+Meant for a single box next to a local DynamoDB or a SQLite file:
+
+    STORAGE_BACKEND=sqlite SQLITE_PATH=/var/lib/scheduler.db \\
+        python backend/handler/server.py --port 8080 --workers 4
+
+or under any WSGI server, e.g. `gunicorn -w 4 -k gthread --threads 16
+--chdir backend/handler server:application`.
+
+A worker process is the equivalent of one warm Lambda container: it imports
+`app` once (storage client and its connection pool, zoneinfo and rate-limit
+state stay warm) and runs one handler invocation at a time, since the request
+log context and metrics are per process. Its threads keep HTTP/1.1
+connections alive and do the parsing and I/O around the handler; add workers
+for more throughput. `GET /export` is streamed chunked in one response instead
+of being paged through X-Export-Cursor.
+
+STORAGE_BACKEND=memory keeps data inside one process, so it needs --workers 1.
+"""
+import argparse
+import base64
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_SECONDS = float(os.environ.get("SERVER_KEEPALIVE_SECONDS", "75"))
+MAX_BODY_BYTES = int(os.environ.get("SERVER_MAX_BODY_BYTES", str(6 * 1024 * 1024)))  # Lambda's payload cap
+
+_app = None
+_app_lock = threading.Lock()
+_invoke_lock = threading.Lock()
+
+
+def load():
+    """Import the handler module once per process (after any fork)."""
+    global _app
+    with _app_lock:
+        if _app is None:
+            import app
+            _app = app
+    return _app
+
+
+def proxy_event(method: str, target: str, headers: Dict[str, str], body: bytes,
+                source_ip: str = "") -> Dict[str, Any]:
+    """The API Gateway REST proxy event for one HTTP request."""
+    parts = urlsplit(target)
+    path = unquote(parts.path) or "/"
+    multi: Dict[str, List[str]] = {}
+    for k, v in parse_qsl(parts.query, keep_blank_values=True):
+        multi.setdefault(k, []).append(v)
+    try:
+        text, is_b64 = body.decode("utf-8"), False
+    except UnicodeDecodeError:
+        text, is_b64 = base64.b64encode(body).decode("ascii"), True
+    return {
+        "resource": "/{proxy+}",
+        "path": path,
+        "httpMethod": method.upper(),
+        "headers": dict(headers),
+        "multiValueHeaders": {k: [v] for k, v in headers.items()},
+        "queryStringParameters": {k: v[-1] for k, v in multi.items()} or None,
+        "multiValueQueryStringParameters": multi or None,
+        "pathParameters": {"proxy": path.lstrip("/")},
+        "body": text if body else None,
+        "isBase64Encoded": is_b64,
+        "requestContext": {
+            "requestId": uuid.uuid4().hex, "httpMethod": method.upper(), "path": path,
+            "stage": "local", "requestTimeEpoch": int(time.time() * 1000),
+            "identity": {"sourceIp": source_ip},
+        },
+    }
+
+
+def invoke(event: Dict[str, Any]) -> Tuple[int, List[Tuple[str, str]], Iterable[bytes]]:
+    """(status, headers, body chunks) for a proxy event.
+
+    Full exports are streamed: the first chunk is produced before returning so a
+    bad query string still comes back as a normal 400 rather than a broken stream.
+    The rest is read by the connection thread, beside other invocations
+    (see app.export_stream_request).
+    """
+    app = load()
+    if event["httpMethod"] == "GET" and event["path"] == "/export":
+        with _invoke_lock:
+            response, chunks = app.export_stream_request(event)
+        if chunks is None:
+            return _split(response)
+        return 200, list(response["headers"].items()), chunks
+    with _invoke_lock:
+        response = app.handler(event, None)
+    return _split(response)
+
+
+def _split(response: Dict[str, Any]) -> Tuple[int, List[Tuple[str, str]], Iterable[bytes]]:
+    body = response.get("body") or ""
+    data = base64.b64decode(body) if response.get("isBase64Encoded") else body.encode("utf-8")
+    headers = [(k, str(v)) for k, v in (response.get("headers") or {}).items()]
+    for k, values in (response.get("multiValueHeaders") or {}).items():
+        headers += [(k, str(v)) for v in values]
+    headers.append(("Content-Length", str(len(data))))
+    return int(response["statusCode"]), headers, [data]
+
+
+# ---- WSGI ----------------------------------------------------------------------
+
+def application(environ, start_response):
+    """WSGI entry point (gunicorn, uwsgi, waitress, ...)."""
+    try:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    if length > MAX_BODY_BYTES:
+        start_response("413 Payload Too Large", [("Content-Length", "0")])
+        return [b""]
+    body = environ["wsgi.input"].read(length) if length else b""
+    headers = {k[5:].replace("_", "-").title(): v for k, v in environ.items() if k.startswith("HTTP_")}
+    if environ.get("CONTENT_TYPE"):
+        headers["Content-Type"] = environ["CONTENT_TYPE"]
+    target = environ.get("PATH_INFO") or "/"
+    if environ.get("QUERY_STRING"):
+        target += "?" + environ["QUERY_STRING"]
+    event = proxy_event(environ["REQUEST_METHOD"], target, headers, body, environ.get("REMOTE_ADDR", ""))
+    status, out_headers, chunks = invoke(event)
+    start_response(f"{status} {_reason(status)}", out_headers)
+    return chunks
+
+
+def _reason(status: int) -> str:
+    return BaseHTTPRequestHandler.responses.get(status, ("",))[0]
+
+
+# ---- Built-in server -----------------------------------------------------------
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive unless the client says otherwise
+    timeout = KEEPALIVE_SECONDS
+    server_version = "scheduler"
+    disable_nagle_algorithm = True  # headers and body are separate writes; don't wait on delayed ACKs
+
+    def _serve(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.send_error(413)
+            return
+        body = self.rfile.read(length) if length else b""
+        event = proxy_event(self.command, self.path, dict(self.headers.items()), body, self.client_address[0])
+        status, headers, chunks = invoke(event)
+        self.send_response(status)
+        streamed = not isinstance(chunks, list)
+        if streamed and self.request_version == "HTTP/1.0":
+            streamed, self.close_connection = False, True  # no chunking: the body ends at close
+        for k, v in headers:
+            self.send_header(k, v)
+        if streamed:
+            self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if streamed:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            else:
+                self.wfile.write(chunk)
+        if streamed:
+            self.wfile.write(b"0\r\n\r\n")
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = _serve
+
+    def log_message(self, format, *args):
+        pass  # the handler already logs one JSON line per request
+
+
+class PooledHTTPServer(HTTPServer):
+    """Connections are served by a fixed pool of threads instead of a thread each."""
+
+    daemon_threads = True
+
+    def __init__(self, sock: socket.socket, threads: int):
+        super().__init__(sock.getsockname()[:2], RequestHandler, bind_and_activate=False)
+        self.socket = sock
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="conn")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._work, request, client_address)
+
+    def _work(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except ConnectionError:
+            pass  # client went away
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def listen(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def run_worker(sock: socket.socket, threads: int):
+    load()  # warm before taking traffic
+    server = PooledHTTPServer(sock, threads)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def serve(host: str, port: int, workers: int, threads: int):
+    """Pre-fork `workers` processes sharing one listening socket; respawn any that die."""
+    sock = listen(host, port)
+    print(f"listening on {host}:{port} ({workers} worker(s) x {threads} threads)", file=sys.stderr, flush=True)
+    if workers <= 1:
+        try:
+            run_worker(sock, threads)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            code = 0
+            try:
+                run_worker(sock, threads)
+            except BaseException:
+                code = 1
+            os._exit(code)
+        children[pid] = slot
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(workers):
+        spawn(slot)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            print(f"worker {pid} exited ({status}); restarting", file=sys.stderr, flush=True)
+            time.sleep(0.5)
+            spawn(slot)
+    sock.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default=os.environ.get("SERVER_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.environ.get("SERVER_PORT", "8080")))
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("SERVER_WORKERS", "1")),
+                    help="processes, each a warm copy of the handler")
+    ap.add_argument("--threads", type=int, default=int(os.environ.get("SERVER_THREADS", "32")),
+                    help="open connections served concurrently per worker")
+    args = ap.parse_args(argv)
+    if args.workers > 1 and os.environ.get("STORAGE_BACKEND", "dynamodb").lower() == "memory":
+        ap.error("STORAGE_BACKEND=memory is per process; use --workers 1 or sqlite/dynamodb")
+    # Streamed exports run outside the invoke lock: up to --threads DynamoDB calls besides /batch fan-out
+    os.environ.setdefault("DDB_MAX_POOL_CONNECTIONS",
+                          str(args.threads + int(os.environ.get("BATCH_MAX_WORKERS", "8"))))
+    serve(args.host, args.port, args.workers, args.threads)
+
+
+if __name__ == "__main__":
+    main()
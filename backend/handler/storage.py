@@ -0,0 +1,1201 @@
+"""Storage backends for the scheduler's per-user data.
+
+The handler talks to a `Repository`; which one is picked by STORAGE_BACKEND:
+
+- `dynamodb` (default): the single table in TABLE_NAME, item shapes as in
+  docs/ARCHITECTURE.md.
+- `sqlite`: one file at SQLITE_PATH, for single-node deployments. Events are
+  indexed on (user, start) and (user, end), so overlap queries are exact.
+- `memory`: dicts plus per-user event lists kept sorted by start and
+  searched with bisect. Process-local; for benchmarks and local runs.
+
+Every backend stores and returns the same item dicts (the API fields plus
+whatever keys the backend needs), so the handler never sees which one it has.
+Time-limited records (change log, idempotency keys, rate leases) carry a
+`ttl` in epoch seconds. DynamoDB deletes them itself (late, so expired ones
+are skipped on read there too); the other backends skip expired records on
+read and drop them in `purge_expired()`.
+
+For batch jobs (see batchscan.py) every backend can also list its users
+(`users_page`, with when each last changed, optionally one segment of a
+parallel scan), hold per-user snapshots of derived data, and keep a leased
+checkpoint per job run (`claim_job`, `save_job`) so a run can be picked up by
+the next invocation.
+"""
+import bisect
+import contextlib
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "dynamodb").lower()
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "/tmp/scheduler.db")
+
+# DynamoDB client. Adaptive retries back off client-side when throttled; with
+# these timeouts a call gives up in about DDB_MAX_ATTEMPTS * (connect + read)
+# seconds, well inside the 10 s Lambda timeout. The pool needs a connection
+# per concurrent call: /batch fans reads out over BATCH_MAX_WORKERS threads.
+DDB_RETRY_MODE = os.environ.get("DDB_RETRY_MODE", "adaptive")
+DDB_MAX_ATTEMPTS = int(os.environ.get("DDB_MAX_ATTEMPTS", "3"))
+DDB_CONNECT_TIMEOUT = float(os.environ.get("DDB_CONNECT_TIMEOUT", "0.5"))
+DDB_READ_TIMEOUT = float(os.environ.get("DDB_READ_TIMEOUT", "2"))
+DDB_MAX_POOL_CONNECTIONS = int(os.environ.get(
+    "DDB_MAX_POOL_CONNECTIONS", str(int(os.environ.get("BATCH_MAX_WORKERS", "8")) + 2)))
+
+# A page of items plus the opaque key to continue from (None when done)
+Page = Tuple[List[Dict[str, Any]], Optional[Any]]
+
+
+def _parse(ts: str) -> datetime:
+    return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+def segment_of(user_pk: str, total_segments: int) -> int:
+    """The scan segment a user falls in on the backends without DynamoDB's own split."""
+    return zlib.crc32(user_pk.encode("utf-8")) % total_segments
+
+
+def _fmt(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _pick(item: Dict[str, Any], attrs: Optional[Iterable[str]]) -> Dict[str, Any]:
+    if not attrs:
+        return dict(item)
+    return {a: item[a] for a in attrs if a in item}
+
+
+def _overlaps(item: Dict[str, Any], start_iso: str, end_iso: str) -> bool:
+    return item["startISO"] < end_iso and item["endISO"] > start_iso
+
+
+def _live(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # DynamoDB deletes expired items up to a few days late; until then reads still return them
+    now = int(time.time())
+    return [it for it in items if "ttl" not in it or int(it["ttl"]) > now]
+
+
+class Repository(ABC):
+    """Everything the handler persists, per user (`user_pk` is "USER#<id>")."""
+
+    # ---- events (item: eventId, title, startISO, endISO, immutable, source)
+    @abstractmethod
+    def put_event(self, user_pk: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def get_event(self, user_pk: str, event_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def delete_event(self, user_pk: str, event_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def events_in_range(self, user_pk: str, start_iso: str, end_iso: str,
+                        attrs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Events whose startISO lies in [start_iso, end_iso], ordered by start."""
+
+    def events_overlapping(self, user_pk: str, start_iso: str, end_iso: str,
+                           attrs: Optional[List[str]] = None,
+                           lookback: timedelta = timedelta(hours=12)) -> List[Dict[str, Any]]:
+        """Events intersecting (start_iso, end_iso). Backends that can only
+        search by start look back `lookback` for events that began earlier."""
+        lo = _fmt(_parse(start_iso) - lookback)
+        return [it for it in self.events_in_range(user_pk, lo, end_iso, attrs) if _overlaps(it, start_iso, end_iso)]
+
+    @abstractmethod
+    def events_page(self, user_pk: str, after: Optional[Any], limit: int) -> Page:
+        """All events by start, `limit` at a time."""
+
+    def is_page_key(self, user_pk: str, entity: str, after: Any) -> bool:
+        """Whether `after` is shaped like a key events_page ("EVENT") or tasks_page ("TASK")
+        returns for `user_pk`. Keys that went out to a client are checked before reuse."""
+        if entity == "EVENT":
+            return isinstance(after, list) and len(after) == 2 and all(isinstance(k, str) for k in after)
+        return isinstance(after, str)
+
+    def put_events(self, user_pk: str, items: Iterable[Dict[str, Any]]) -> int:
+        """Bulk load (imports, generated data): no version bump, change log or day stats."""
+        n = 0
+        for item in items:
+            self.put_event(user_pk, item)
+            n += 1
+        return n
+
+    # ---- tasks (item: taskId, title, durationMin, category, notes, createdAt)
+    @abstractmethod
+    def put_task(self, user_pk: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def get_task(self, user_pk: str, task_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def delete_task(self, user_pk: str, task_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def list_tasks(self, user_pk: str, attrs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def tasks_page(self, user_pk: str, after: Optional[Any], limit: int) -> Page:
+        ...
+
+    def put_tasks(self, user_pk: str, items: Iterable[Dict[str, Any]]) -> int:
+        n = 0
+        for item in items:
+            self.put_task(user_pk, item)
+            n += 1
+        return n
+
+    # ---- availability
+    @abstractmethod
+    def get_availability(self, user_pk: str) -> Dict[str, List[List[str]]]:
+        """{weekday: windows} for the weekdays that have a stored row."""
+
+    @abstractmethod
+    def put_availability(self, user_pk: str, weekly: Dict[str, List[List[str]]], tz: str) -> None:
+        ...
+
+    # ---- data version and change log
+    @abstractmethod
+    def bump_version(self, user_pk: str) -> int:
+        ...
+
+    @abstractmethod
+    def get_version(self, user_pk: str) -> int:
+        ...
+
+    def version_info(self, user_pk: str) -> Tuple[int, Optional[int]]:
+        """(version, updatedAt) where reads by start time (events_in_range, events_overlapping)
+        may lag behind the version for a moment after a write, else (version, None)."""
+        return self.get_version(user_pk), None
+
+    @abstractmethod
+    def put_change(self, user_pk: str, change: Dict[str, Any]) -> None:
+        """change: seq, entity, id, op, optional data, at (write time), ttl."""
+
+    @abstractmethod
+    def changes_after(self, user_pk: str, since: int, limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Changes with seq > since, oldest first, and whether more remain."""
+
+    def write_all(self, user_pk: str, ops: List[Tuple[Any, ...]]) -> None:
+        """Apply several writes all or nothing. Each op is (method name, *args) of
+        put_event, delete_event, put_task, delete_task, put_availability,
+        add_day_stats or put_change; each item may appear once."""
+        for name, *args in ops:
+            getattr(self, name)(user_pk, *args)
+
+    # ---- per-day aggregates
+    @abstractmethod
+    def add_day_stats(self, user_pk: str, day: str, events: int, busy_min: int) -> None:
+        ...
+
+    @abstractmethod
+    def day_stats(self, user_pk: str, first_day: str, last_day: str) -> List[Dict[str, Any]]:
+        """[{date, events, busyMin}] for stored days in first_day..last_day, by date."""
+
+    @abstractmethod
+    def replace_day_stats(self, user_pk: str, totals: Dict[str, Tuple[int, int]], version: int) -> bool:
+        """Make `totals` the user's day stats, as long as their data version is still `version`
+        (no write has ADDed to the counters since the totals were computed); False if it moved."""
+
+    # ---- idempotency records
+    @abstractmethod
+    def claim_idempotency(self, user_pk: str, key: str, record: Dict[str, Any], stale_before: int) -> bool:
+        """Store `record` unless a live record exists that is done or pending since stale_before or later."""
+
+    @abstractmethod
+    def get_idempotency(self, user_pk: str, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def put_idempotency(self, user_pk: str, key: str, record: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def delete_idempotency(self, user_pk: str, key: str) -> None:
+        ...
+
+    # ---- rate limit leases
+    @abstractmethod
+    def lease_rate(self, user_pk: str, cls: str, window: int, n: int, budget: int, ttl: int) -> bool:
+        """Add n to the (user, cls, window) counter if it stays within budget."""
+
+    def purge_expired(self, now: Optional[int] = None) -> int:
+        """Drop records whose ttl has passed; returns how many (0 where the store expires them)."""
+        return 0
+
+    # ---- users, snapshots and job runs (batch jobs)
+    @abstractmethod
+    def users_page(self, after: Optional[Any], limit: int, segment: int = 0, total_segments: int = 1) -> Page:
+        """Every user as {"userPk", "updatedAt"} (epoch seconds of the last version bump, or
+        None), about `limit` at a time. A page may hold no users and still continue. With
+        total_segments > 1, only the users of `segment`; the segments partition the users."""
+
+    @abstractmethod
+    def put_snapshot(self, user_pk: str, name: str, data: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def get_snapshot(self, user_pk: str, name: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def claim_job(self, name: str, run_id: str, owner: str, lease_until: int, now: int) -> Optional[Dict[str, Any]]:
+        """Lease the run's record to `owner` (creating it: status "running", no cursor) unless it
+        is done or leased to someone else past `now`. Returns the record, or None."""
+
+    @abstractmethod
+    def save_job(self, name: str, run_id: str, owner: str, state: Dict[str, Any]) -> bool:
+        """Merge `state` (cursor, counters, status, leaseUntil) into the run if `owner` still holds it."""
+
+
+# ---- DynamoDB ------------------------------------------------------------------
+
+def projection(attrs: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Query kwargs fetching only `attrs` (all names aliased; several are reserved words)."""
+    if not attrs:
+        return {}
+    names = {f"#p{i}": a for i, a in enumerate(dict.fromkeys(attrs))}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+
+
+def dynamodb_resource(**overrides):
+    """The boto3 DynamoDB resource, configured from the DDB_* settings and instrumented.
+
+    `overrides` are botocore Config arguments (e.g. max_pool_connections for a
+    scan job with more threads than the API uses).
+    """
+    import boto3
+    from botocore.config import Config
+    from observability import instrument_client
+
+    config = Config(**{
+        "retries": {"mode": DDB_RETRY_MODE, "total_max_attempts": DDB_MAX_ATTEMPTS},
+        "connect_timeout": DDB_CONNECT_TIMEOUT,
+        "read_timeout": DDB_READ_TIMEOUT,
+        "max_pool_connections": DDB_MAX_POOL_CONNECTIONS,
+        "tcp_keepalive": True,
+        **overrides,
+    })
+    ddb = boto3.resource("dynamodb", config=config)
+    instrument_client(ddb.meta.client)
+    return ddb
+
+
+class DynamoRepository(Repository):
+    """The single-table layout: everything under pk=USER#<id>, events also on GSI1 by start."""
+
+    VERSION_SK = "META#version"
+
+    def __init__(self, table):
+        self.table = table
+
+    @classmethod
+    def from_env(cls) -> "DynamoRepository":
+        from resilience import GuardedTable
+
+        ddb = dynamodb_resource()
+        return cls(GuardedTable(ddb.Table(os.environ.get("TABLE_NAME", ""))))
+
+    def _conditional(self, fn, **kwargs) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            fn(**kwargs)
+            return True
+        except ClientError as e:
+            # A transaction is cancelled by a failed condition (or a conflicting write)
+            if e.response["Error"]["Code"] in ("ConditionalCheckFailedException", "TransactionCanceledException"):
+                return False
+            raise
+
+    # ---- events
+    @staticmethod
+    def event_item(user_pk, item):
+        return {**item, "pk": user_pk, "sk": f"EVENT#{item['eventId']}", "type": "EVENT",
+                "gsi1pk": user_pk, "gsi1sk": item["startISO"]}  # sort by start time
+
+    @staticmethod
+    def task_item(user_pk, item):
+        return {**item, "pk": user_pk, "sk": f"TASK#{item['taskId']}", "type": "TASK"}
+
+    def put_event(self, user_pk, item):
+        item = self.event_item(user_pk, item)
+        self.table.put_item(Item=item)
+        return item
+
+    def write_all(self, user_pk, ops):
+        # One TransactWriteItems (100 items at most; a write path needs a handful). Twice the
+        # WCU of the same writes done one by one, for never leaving half of them behind.
+        items = [entry for name, *args in ops for entry in getattr(self, f"_tx_{name}")(user_pk, *args)]
+        self.table.transact_write_items(
+            TransactItems=[{kind: {"TableName": self.table.name, **spec}} for kind, spec in items])
+
+    # (kind, spec) entries of a transaction, one builder per write_all op
+    def _tx_put_event(self, user_pk, item):
+        return [("Put", {"Item": self.event_item(user_pk, item)})]
+
+    def _tx_delete_event(self, user_pk, event_id):
+        return [("Delete", {"Key": {"pk": user_pk, "sk": f"EVENT#{event_id}"}})]
+
+    def _tx_put_task(self, user_pk, item):
+        return [("Put", {"Item": self.task_item(user_pk, item)})]
+
+    def _tx_delete_task(self, user_pk, task_id):
+        return [("Delete", {"Key": {"pk": user_pk, "sk": f"TASK#{task_id}"}})]
+
+    def _tx_put_availability(self, user_pk, weekly, tz):
+        return [("Put", {"Item": it}) for it in self.availability_items(user_pk, weekly, tz)]
+
+    def _tx_add_day_stats(self, user_pk, day, events, busy_min):
+        return [("Update", self.day_stats_update(user_pk, day, events, busy_min))]
+
+    def _tx_put_change(self, user_pk, change):
+        return [("Put", {"Item": self.change_item(user_pk, change)})]
+
+    def put_events(self, user_pk, items):
+        return self._put_batch(self.event_item(user_pk, it) for it in items)
+
+    def _put_batch(self, items):
+        # BatchWriteItem, 25 per request; the writer resends unprocessed items
+        n = 0
+        with self.table.batch_writer() as bw:
+            for item in items:
+                bw.put_item(Item=item)
+                n += 1
+        return n
+
+    def get_event(self, user_pk, event_id):
+        return self.table.get_item(Key={"pk": user_pk, "sk": f"EVENT#{event_id}"}).get("Item")
+
+    def delete_event(self, user_pk, event_id):
+        self.table.delete_item(Key={"pk": user_pk, "sk": f"EVENT#{event_id}"})
+
+    def events_in_range(self, user_pk, start_iso, end_iso, attrs=None):
+        # Query by time GSI; only startISO within [start_iso, end_iso] is checked
+        resp_ = self.table.query(
+            IndexName="GSI1",
+            KeyConditionExpression="gsi1pk = :pk AND gsi1sk BETWEEN :from AND :to",
+            ExpressionAttributeValues={":pk": user_pk, ":from": start_iso, ":to": end_iso},
+            **projection(list(attrs) + ["type"] if attrs else None),
+        )
+        return [i for i in resp_.get("Items") or [] if i.get("type") == "EVENT"]
+
+    def events_page(self, user_pk, after, limit):
+        return self._page(user_pk, after, limit, "EVENT", IndexName="GSI1",
+                          KeyConditionExpression="gsi1pk = :pk", ExpressionAttributeValues={":pk": user_pk})
+
+    def is_page_key(self, user_pk, entity, after):
+        # Exactly the key attributes of the table (and of GSI1 for events), all in this user's partition
+        attrs = {"pk", "sk", "gsi1pk", "gsi1sk"} if entity == "EVENT" else {"pk", "sk"}
+        return (isinstance(after, dict) and set(after) == attrs and all(isinstance(v, str) for v in after.values())
+                and after["pk"] == after.get("gsi1pk", user_pk) == user_pk and after["sk"].startswith(f"{entity}#"))
+
+    def _page(self, user_pk, after, limit, type_, **kwargs):
+        if after:
+            kwargs["ExclusiveStartKey"] = after
+        page = self.table.query(Limit=limit, **kwargs)
+        items = [i for i in page.get("Items") or [] if i.get("type") == type_]
+        return items, page.get("LastEvaluatedKey")
+
+    # ---- tasks
+    def put_task(self, user_pk, item):
+        item = self.task_item(user_pk, item)
+        self.table.put_item(Item=item)
+        return item
+
+    def put_tasks(self, user_pk, items):
+        return self._put_batch(self.task_item(user_pk, it) for it in items)
+
+    def get_task(self, user_pk, task_id):
+        return self.table.get_item(Key={"pk": user_pk, "sk": f"TASK#{task_id}"}).get("Item")
+
+    def delete_task(self, user_pk, task_id):
+        self.table.delete_item(Key={"pk": user_pk, "sk": f"TASK#{task_id}"})
+
+    def list_tasks(self, user_pk, attrs=None):
+        # Consistent reads wherever a body is tagged with the (consistently read) version
+        resp_ = self.table.query(
+            KeyConditionExpression="pk = :pk AND begins_with(sk, :p)",
+            ExpressionAttributeValues={":pk": user_pk, ":p": "TASK#"},
+            ConsistentRead=True,
+            **projection(attrs),
+        )
+        return resp_.get("Items") or []
+
+    def tasks_page(self, user_pk, after, limit):
+        return self._page(user_pk, after, limit, "TASK",
+                          KeyConditionExpression="pk = :pk AND begins_with(sk, :p)",
+                          ExpressionAttributeValues={":pk": user_pk, ":p": "TASK#"})
+
+    # ---- availability
+    def get_availability(self, user_pk):
+        # Fetch all AVAIL#* rows; sk = AVAIL#Mon
+        resp_ = self.table.query(
+            KeyConditionExpression="pk = :pk AND begins_with(sk, :p)",
+            ExpressionAttributeValues={":pk": user_pk, ":p": "AVAIL#"},
+            ConsistentRead=True,
+        )
+        return {it["sk"].split("#", 1)[1]: it.get("windows", []) for it in resp_.get("Items") or []}
+
+    @staticmethod
+    def availability_items(user_pk, weekly, tz):
+        return [{
+            "pk": user_pk,
+            "sk": f"AVAIL#{d}",
+            "type": "AVAIL",
+            "windows": weekly.get(d, []),
+            "timezone": tz,
+        } for d in ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")]
+
+    def put_availability(self, user_pk, weekly, tz):
+        # Replace all AVAIL#* entries (idempotent, small N=7)
+        for item in self.availability_items(user_pk, weekly, tz):
+            self.table.put_item(Item=item)
+
+    # ---- version and change log
+    def bump_version(self, user_pk):
+        res = self.table.update_item(
+            Key={"pk": user_pk, "sk": self.VERSION_SK},
+            UpdateExpression="ADD #v :one SET updatedAt = :now",
+            ExpressionAttributeNames={"#v": "version"},
+            ExpressionAttributeValues={":one": 1, ":now": int(time.time())},
+            ReturnValues="UPDATED_NEW",
+        )
+        return int(res["Attributes"]["version"])
+
+    def get_version(self, user_pk):
+        return self.version_info(user_pk)[0]
+
+    def version_info(self, user_pk):
+        # Strongly consistent: a stale read here would answer 304 for data that just changed.
+        # GSI1 is only eventually consistent, hence updatedAt.
+        item = self.table.get_item(
+            Key={"pk": user_pk, "sk": self.VERSION_SK}, ConsistentRead=True,
+        ).get("Item") or {}
+        updated = item.get("updatedAt")
+        return int(item.get("version", 0)), int(updated) if updated is not None else None
+
+    @staticmethod
+    def change_item(user_pk, change):
+        return {"pk": user_pk, "sk": f"CHANGE#{change['seq']:012d}", "type": "CHANGE", **change}
+
+    def put_change(self, user_pk, change):
+        self.table.put_item(Item=self.change_item(user_pk, change))
+
+    def changes_after(self, user_pk, since, limit):
+        resp_ = self.table.query(
+            KeyConditionExpression="pk = :pk AND sk BETWEEN :from AND :to",
+            ExpressionAttributeValues={
+                ":pk": user_pk, ":from": f"CHANGE#{since + 1:012d}", ":to": "CHANGE#999999999999",
+            },
+            Limit=limit,
+            ConsistentRead=True,  # a lagging read would show holes that are not there
+        )
+        return _live(resp_.get("Items") or []), "LastEvaluatedKey" in resp_
+
+    # ---- day stats
+    @staticmethod
+    def day_stats_update(user_pk, day, events, busy_min):
+        return {
+            "Key": {"pk": user_pk, "sk": f"DAYSTAT#{day}"},
+            "UpdateExpression": "SET #t = :t ADD #n :n, #m :m",
+            "ExpressionAttributeNames": {"#t": "type", "#n": "events", "#m": "busyMin"},
+            "ExpressionAttributeValues": {":t": "DAYSTAT", ":n": events, ":m": busy_min},
+        }
+
+    def add_day_stats(self, user_pk, day, events, busy_min):
+        self.table.update_item(**self.day_stats_update(user_pk, day, events, busy_min))
+
+    def day_stats(self, user_pk, first_day, last_day):
+        resp_ = self.table.query(
+            KeyConditionExpression="pk = :pk AND sk BETWEEN :from AND :to",
+            ExpressionAttributeValues={":pk": user_pk, ":from": f"DAYSTAT#{first_day}", ":to": f"DAYSTAT#{last_day}"},
+            ConsistentRead=True,
+        )
+        return [{"date": it["sk"].split("#", 1)[1], "events": int(it.get("events", 0)),
+                 "busyMin": int(it.get("busyMin", 0))} for it in resp_.get("Items") or []]
+
+    def replace_day_stats(self, user_pk, totals, version):
+        # Only days that differ are written, so a periodic refresh of correct counters is reads only
+        current = {it["date"]: (it["events"], it["busyMin"]) for it in self.day_stats(user_pk, "0000-00-00", "9999-99-99")}
+        writes = [("Delete", {"Key": {"pk": user_pk, "sk": f"DAYSTAT#{day}"}})
+                  for day in sorted(current.keys() - totals.keys())]
+        writes += [("Put", {"Item": {"pk": user_pk, "sk": f"DAYSTAT#{day}", "type": "DAYSTAT",
+                                     "events": n, "busyMin": m}})
+                   for day, (n, m) in sorted(totals.items()) if current.get(day) != (n, m)]
+        # Each transaction also checks the version: a write landing between two of them stops
+        # the rest, and its ADDs apply on top of the days already replaced, which stay right
+        check = ("ConditionCheck", {"Key": {"pk": user_pk, "sk": self.VERSION_SK},
+                                    "ConditionExpression": "attribute_not_exists(pk)"})
+        if version:
+            check[1].update(ConditionExpression="#v = :v", ExpressionAttributeNames={"#v": "version"},
+                            ExpressionAttributeValues={":v": version})
+        for i in range(0, len(writes), 99):
+            if not self._conditional(self.table.transact_write_items, TransactItems=[
+                    {kind: {"TableName": self.table.name, **spec}} for kind, spec in writes[i:i + 99] + [check]]):
+                return False
+        return True
+
+    # ---- idempotency
+    def claim_idempotency(self, user_pk, key, record, stale_before):
+        return self._conditional(
+            self.table.put_item,
+            Item={"pk": user_pk, "sk": f"IDEMP#{key}", "type": "IDEMP", **record},
+            ConditionExpression="attribute_not_exists(pk) OR #ttl <= :now OR (#s = :pending AND lockedAt < :stale)",
+            ExpressionAttributeNames={"#s": "state", "#ttl": "ttl"},
+            ExpressionAttributeValues={":pending": "pending", ":stale": stale_before, ":now": int(time.time())},
+        )
+
+    def get_idempotency(self, user_pk, key):
+        item = self.table.get_item(Key={"pk": user_pk, "sk": f"IDEMP#{key}"}, ConsistentRead=True).get("Item")
+        return item if item and _live([item]) else None
+
+    def put_idempotency(self, user_pk, key, record):
+        self.table.put_item(Item={"pk": user_pk, "sk": f"IDEMP#{key}", "type": "IDEMP", **record})
+
+    def delete_idempotency(self, user_pk, key):
+        self.table.delete_item(Key={"pk": user_pk, "sk": f"IDEMP#{key}"})
+
+    # ---- rate leases
+    def lease_rate(self, user_pk, cls, window, n, budget, ttl):
+        return self._conditional(
+            self.table.update_item,
+            Key={"pk": user_pk, "sk": f"RATE#{cls}#{window}"},
+            UpdateExpression="ADD used :n SET #ttl = :ttl",
+            ConditionExpression="attribute_not_exists(used) OR used <= :room",
+            ExpressionAttributeNames={"#ttl": "ttl"},
+            ExpressionAttributeValues={":n": n, ":room": budget - n, ":ttl": ttl},
+        )
+
+    # ---- users, snapshots and job runs
+    def users_page(self, after, limit, segment=0, total_segments=1):
+        # No user index: a filtered scan for the version items (one per user), `limit` items evaluated
+        proj = projection(["pk", "updatedAt"])
+        kwargs = {"Limit": limit, "FilterExpression": "sk = :v", "ExpressionAttributeValues": {":v": self.VERSION_SK},
+                  **proj}
+        if total_segments > 1:
+            kwargs.update(Segment=segment, TotalSegments=total_segments)
+        if after:
+            kwargs["ExclusiveStartKey"] = after
+        page = self.table.scan(**kwargs)
+        users = [{"userPk": it["pk"], "updatedAt": int(it["updatedAt"]) if "updatedAt" in it else None}
+                 for it in page.get("Items") or []]
+        return users, page.get("LastEvaluatedKey")
+
+    def put_snapshot(self, user_pk, name, data):
+        self.table.put_item(Item={"pk": user_pk, "sk": f"SNAP#{name}", "type": "SNAP", "data": data})
+
+    def get_snapshot(self, user_pk, name):
+        item = self.table.get_item(Key={"pk": user_pk, "sk": f"SNAP#{name}"}).get("Item")
+        return item.get("data") if item else None
+
+    def claim_job(self, name, run_id, owner, lease_until, now):
+        from botocore.exceptions import ClientError
+
+        try:
+            res = self.table.update_item(
+                Key={"pk": f"JOB#{name}", "sk": f"RUN#{run_id}"},
+                UpdateExpression="SET #o = :o, leaseUntil = :l, #s = if_not_exists(#s, :running),"
+                                 " runId = :r, startedAt = if_not_exists(startedAt, :now), #t = :job,"
+                                 " #ttl = if_not_exists(#ttl, :ttl)",
+                ConditionExpression="attribute_not_exists(pk) OR (#s <> :done AND (leaseUntil < :now OR #o = :o))",
+                ExpressionAttributeNames={"#o": "owner", "#s": "status", "#t": "type", "#ttl": "ttl"},
+                ExpressionAttributeValues={":o": owner, ":l": lease_until, ":running": "running", ":r": run_id,
+                                           ":now": now, ":job": "JOB", ":done": "done", ":ttl": now + 14 * 86400},
+                ReturnValues="ALL_NEW",
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return None
+            raise
+        return res["Attributes"]
+
+    def save_job(self, name, run_id, owner, state):
+        names = {"#o": "owner"}
+        values: Dict[str, Any] = {":o": owner}
+        sets = []
+        for i, (k, v) in enumerate(state.items()):
+            names[f"#f{i}"] = k
+            values[f":f{i}"] = v
+            sets.append(f"#f{i} = :f{i}")
+        return self._conditional(
+            self.table.update_item,
+            Key={"pk": f"JOB#{name}", "sk": f"RUN#{run_id}"},
+            UpdateExpression="SET " + ", ".join(sets),
+            ConditionExpression="#o = :o",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+
+# ---- In-memory -------------------------------------------------------------------
+
+class MemoryRepository(Repository):
+    """Process-local store. Per user, events live in a dict by id plus a list of
+    (startISO, eventId) kept sorted with bisect; the longest event seen bounds
+    how far back an overlap search has to look."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.events: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.by_start: Dict[str, List[Tuple[str, str]]] = {}
+        self.longest: Dict[str, timedelta] = {}
+        self.tasks: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.availability: Dict[str, Dict[str, List[List[str]]]] = {}
+        self.versions: Dict[str, int] = {}
+        self.changes: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self.stats: Dict[str, Dict[str, List[int]]] = {}
+        self.idempotency: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.rates: Dict[Tuple[str, str, int], List[int]] = {}
+        self.updated: Dict[str, int] = {}
+        self.snapshots: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.jobs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    # ---- events
+    def put_event(self, user_pk, item):
+        item = dict(item)
+        with self._lock:
+            self._unindex(user_pk, item["eventId"])
+            self.events.setdefault(user_pk, {})[item["eventId"]] = item
+            bisect.insort(self.by_start.setdefault(user_pk, []), (item["startISO"], item["eventId"]))
+            length = _parse(item["endISO"]) - _parse(item["startISO"])
+            if length > self.longest.get(user_pk, timedelta(0)):
+                self.longest[user_pk] = length
+        return dict(item)
+
+    def write_all(self, user_pk, ops):
+        # Under the lock, so no reader sees part of it
+        with self._lock:
+            super().write_all(user_pk, ops)
+
+    def _unindex(self, user_pk, event_id):
+        old = self.events.get(user_pk, {}).pop(event_id, None)
+        if old is not None:
+            idx = self.by_start[user_pk]
+            del idx[bisect.bisect_left(idx, (old["startISO"], event_id))]
+
+    def get_event(self, user_pk, event_id):
+        with self._lock:
+            item = self.events.get(user_pk, {}).get(event_id)
+            return dict(item) if item else None
+
+    def delete_event(self, user_pk, event_id):
+        with self._lock:
+            self._unindex(user_pk, event_id)
+
+    def _starting_between(self, user_pk, lo, hi, attrs):
+        with self._lock:
+            idx = self.by_start.get(user_pk, [])
+            items = self.events.get(user_pk, {})
+            i = bisect.bisect_left(idx, (lo,))
+            j = bisect.bisect_right(idx, (hi, "\uffff"))
+            return [_pick(items[eid], attrs and list(attrs) + ["startISO", "endISO"]) for _, eid in idx[i:j]]
+
+    def events_in_range(self, user_pk, start_iso, end_iso, attrs=None):
+        return [_pick(it, attrs) for it in self._starting_between(user_pk, start_iso, end_iso, attrs)]
+
+    def events_overlapping(self, user_pk, start_iso, end_iso, attrs=None, lookback=timedelta(hours=12)):
+        # Exact: nothing that starts before start - longest event can still be running
+        lo = _fmt(_parse(start_iso) - self.longest.get(user_pk, timedelta(0)))
+        rows = self._starting_between(user_pk, lo, end_iso, attrs)
+        return [_pick(it, attrs) for it in rows if _overlaps(it, start_iso, end_iso)]
+
+    def events_page(self, user_pk, after, limit):
+        with self._lock:
+            idx = self.by_start.get(user_pk, [])
+            i = bisect.bisect_right(idx, tuple(after)) if after else 0
+            rows = idx[i:i + limit]
+            items = [dict(self.events[user_pk][eid]) for _, eid in rows]
+            return items, (list(rows[-1]) if i + limit < len(idx) else None)
+
+    # ---- tasks
+    def put_task(self, user_pk, item):
+        with self._lock:
+            self.tasks.setdefault(user_pk, {})[item["taskId"]] = dict(item)
+        return dict(item)
+
+    def get_task(self, user_pk, task_id):
+        with self._lock:
+            item = self.tasks.get(user_pk, {}).get(task_id)
+            return dict(item) if item else None
+
+    def delete_task(self, user_pk, task_id):
+        with self._lock:
+            self.tasks.get(user_pk, {}).pop(task_id, None)
+
+    def list_tasks(self, user_pk, attrs=None):
+        with self._lock:
+            tasks = self.tasks.get(user_pk, {})
+            return [_pick(tasks[tid], attrs) for tid in sorted(tasks)]
+
+    def tasks_page(self, user_pk, after, limit):
+        with self._lock:
+            ids = sorted(self.tasks.get(user_pk, {}))
+            i = bisect.bisect_right(ids, after) if after else 0
+            page = ids[i:i + limit]
+            return [dict(self.tasks[user_pk][t]) for t in page], (page[-1] if i + limit < len(ids) else None)
+
+    # ---- availability
+    def get_availability(self, user_pk):
+        with self._lock:
+            return copy.deepcopy(self.availability.get(user_pk, {}))
+
+    def put_availability(self, user_pk, weekly, tz):
+        days = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+        with self._lock:
+            self.availability[user_pk] = {d: copy.deepcopy(weekly.get(d, [])) for d in days}
+
+    # ---- version and change log
+    def bump_version(self, user_pk):
+        with self._lock:
+            self.versions[user_pk] = self.versions.get(user_pk, 0) + 1
+            self.updated[user_pk] = int(time.time())
+            return self.versions[user_pk]
+
+    def get_version(self, user_pk):
+        return self.versions.get(user_pk, 0)
+
+    def put_change(self, user_pk, change):
+        with self._lock:
+            self.changes.setdefault(user_pk, {})[change["seq"]] = dict(change)
+
+    def changes_after(self, user_pk, since, limit):
+        now = int(time.time())
+        with self._lock:
+            log = self.changes.get(user_pk, {})
+            seqs = sorted(s for s, c in log.items() if s > since and c.get("ttl", now + 1) > now)
+            return [dict(log[s]) for s in seqs[:limit]], len(seqs) > limit
+
+    # ---- day stats
+    def add_day_stats(self, user_pk, day, events, busy_min):
+        with self._lock:
+            acc = self.stats.setdefault(user_pk, {}).setdefault(day, [0, 0])
+            acc[0] += events
+            acc[1] += busy_min
+
+    def day_stats(self, user_pk, first_day, last_day):
+        with self._lock:
+            days = self.stats.get(user_pk, {})
+            return [{"date": d, "events": days[d][0], "busyMin": days[d][1]}
+                    for d in sorted(days) if first_day <= d <= last_day]
+
+    def replace_day_stats(self, user_pk, totals, version):
+        with self._lock:
+            if self.get_version(user_pk) != version:
+                return False
+            self.stats[user_pk] = {d: [n, m] for d, (n, m) in totals.items()}
+            return True
+
+    # ---- idempotency
+    def _live_idempotency(self, user_pk, key):
+        rec = self.idempotency.get((user_pk, key))
+        if rec is not None and rec.get("ttl", float("inf")) <= time.time():
+            return None
+        return rec
+
+    def claim_idempotency(self, user_pk, key, record, stale_before):
+        with self._lock:
+            existing = self._live_idempotency(user_pk, key)
+            if existing is not None and not (existing.get("state") == "pending"
+                                             and existing.get("lockedAt", 0) < stale_before):
+                return False
+            self.idempotency[(user_pk, key)] = dict(record)
+            return True
+
+    def get_idempotency(self, user_pk, key):
+        with self._lock:
+            rec = self._live_idempotency(user_pk, key)
+            return dict(rec) if rec else None
+
+    def put_idempotency(self, user_pk, key, record):
+        with self._lock:
+            self.idempotency[(user_pk, key)] = dict(record)
+
+    def delete_idempotency(self, user_pk, key):
+        with self._lock:
+            self.idempotency.pop((user_pk, key), None)
+
+    # ---- rate leases
+    def lease_rate(self, user_pk, cls, window, n, budget, ttl):
+        with self._lock:
+            used = self.rates.setdefault((user_pk, cls, window), [0, ttl])
+            if used[0] > budget - n:
+                return False
+            used[0] += n
+            return True
+
+    def purge_expired(self, now=None):
+        now = int(time.time()) if now is None else now
+        dropped = 0
+        with self._lock:
+            for log in self.changes.values():
+                for seq in [s for s, c in log.items() if c.get("ttl", now + 1) <= now]:
+                    del log[seq]
+                    dropped += 1
+            for k in [k for k, r in self.idempotency.items() if r.get("ttl", now + 1) <= now]:
+                del self.idempotency[k]
+                dropped += 1
+            for k in [k for k, (_, ttl) in self.rates.items() if ttl <= now]:
+                del self.rates[k]
+                dropped += 1
+        return dropped
+
+    # ---- users, snapshots and job runs
+    def users_page(self, after, limit, segment=0, total_segments=1):
+        with self._lock:
+            pks = sorted(pk for pk in set(self.versions) | set(self.events)
+                         if total_segments == 1 or segment_of(pk, total_segments) == segment)
+        i = bisect.bisect_right(pks, after) if after else 0
+        rows = pks[i:i + limit]
+        users = [{"userPk": pk, "updatedAt": self.updated.get(pk)} for pk in rows]
+        return users, (rows[-1] if i + limit < len(pks) else None)
+
+    def put_snapshot(self, user_pk, name, data):
+        with self._lock:
+            self.snapshots[(user_pk, name)] = copy.deepcopy(data)
+
+    def get_snapshot(self, user_pk, name):
+        with self._lock:
+            data = self.snapshots.get((user_pk, name))
+            return copy.deepcopy(data) if data is not None else None
+
+    def claim_job(self, name, run_id, owner, lease_until, now):
+        with self._lock:
+            job = self.jobs.get((name, run_id))
+            if job is None:
+                job = self.jobs[(name, run_id)] = {"runId": run_id, "status": "running", "startedAt": now}
+            elif job["status"] == "done" or (job["leaseUntil"] >= now and job["owner"] != owner):
+                return None
+            job.update(owner=owner, leaseUntil=lease_until)
+            return copy.deepcopy(job)
+
+    def save_job(self, name, run_id, owner, state):
+        with self._lock:
+            job = self.jobs.get((name, run_id))
+            if job is None or job.get("owner") != owner:
+                return False
+            job.update(copy.deepcopy(state))
+            return True
+
+
+# ---- SQLite ------------------------------------------------------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (user_pk TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0,
+                                  longest_event_s INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS events (user_pk TEXT NOT NULL, event_id TEXT NOT NULL, start_iso TEXT NOT NULL,
+                                   end_iso TEXT NOT NULL, item TEXT NOT NULL, PRIMARY KEY (user_pk, event_id));
+CREATE INDEX IF NOT EXISTS events_by_start ON events (user_pk, start_iso, event_id);
+CREATE INDEX IF NOT EXISTS events_by_end ON events (user_pk, end_iso);
+CREATE TABLE IF NOT EXISTS tasks (user_pk TEXT NOT NULL, task_id TEXT NOT NULL, item TEXT NOT NULL,
+                                  PRIMARY KEY (user_pk, task_id));
+CREATE TABLE IF NOT EXISTS availability (user_pk TEXT NOT NULL, day TEXT NOT NULL, windows TEXT NOT NULL,
+                                         timezone TEXT NOT NULL, PRIMARY KEY (user_pk, day));
+CREATE TABLE IF NOT EXISTS changes (user_pk TEXT NOT NULL, seq INTEGER NOT NULL, item TEXT NOT NULL,
+                                    ttl INTEGER NOT NULL, PRIMARY KEY (user_pk, seq));
+CREATE TABLE IF NOT EXISTS day_stats (user_pk TEXT NOT NULL, day TEXT NOT NULL, events INTEGER NOT NULL,
+                                      busy_min INTEGER NOT NULL, PRIMARY KEY (user_pk, day));
+CREATE TABLE IF NOT EXISTS idempotency (user_pk TEXT NOT NULL, key TEXT NOT NULL, record TEXT NOT NULL,
+                                        state TEXT NOT NULL, locked_at INTEGER NOT NULL, ttl INTEGER NOT NULL,
+                                        PRIMARY KEY (user_pk, key));
+CREATE TABLE IF NOT EXISTS rate_leases (user_pk TEXT NOT NULL, cls TEXT NOT NULL, window INTEGER NOT NULL,
+                                        used INTEGER NOT NULL, ttl INTEGER NOT NULL,
+                                        PRIMARY KEY (user_pk, cls, window));
+CREATE TABLE IF NOT EXISTS snapshots (user_pk TEXT NOT NULL, name TEXT NOT NULL, data TEXT NOT NULL,
+                                      PRIMARY KEY (user_pk, name));
+CREATE TABLE IF NOT EXISTS jobs (name TEXT NOT NULL, run_id TEXT NOT NULL, record TEXT NOT NULL,
+                                 owner TEXT NOT NULL, lease_until INTEGER NOT NULL, status TEXT NOT NULL,
+                                 PRIMARY KEY (name, run_id));
+"""
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, default=lambda o: int(o) if isinstance(o, Decimal) and o == int(o) else float(o))
+
+
+class SqliteRepository(Repository):
+    """Single-file store. One connection per repository, shared by threads
+    under a lock; several processes can open the same file (WAL mode)."""
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._in_tx = False  # inside write_all: _tx joins its transaction
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.create_function("segment_of", 2, segment_of, deterministic=True)
+        self.db.executescript(_SCHEMA)
+        if "updated_at" not in {r[1] for r in self.db.execute("PRAGMA table_info(users)")}:
+            self.db.execute("ALTER TABLE users ADD COLUMN updated_at INTEGER")  # files from before it existed
+
+    def _q(self, sql: str, args: Tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self.db.execute(sql, args).fetchall()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE .. COMMIT (ROLLBACK on error) under the lock; joins one already open."""
+        with self._lock:
+            if self._in_tx:
+                yield
+                return
+            self.db.execute("BEGIN IMMEDIATE")
+            self._in_tx = True
+            try:
+                yield
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            finally:
+                self._in_tx = False
+            self.db.execute("COMMIT")
+
+    def _tx(self, statements: Iterable[Tuple[str, Tuple]]) -> None:
+        with self._transaction():
+            for sql, args in statements:
+                self.db.execute(sql, args)
+
+    def write_all(self, user_pk, ops):
+        with self._transaction():
+            super().write_all(user_pk, ops)
+
+    # ---- events
+    def put_event(self, user_pk, item):
+        longest = int((_parse(item["endISO"]) - _parse(item["startISO"])).total_seconds())
+        self._tx([
+            ("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)",
+             (user_pk, item["eventId"], item["startISO"], item["endISO"], _dumps(item))),
+            ("INSERT INTO users (user_pk, longest_event_s) VALUES (?, ?) ON CONFLICT (user_pk) DO UPDATE"
+             " SET longest_event_s = max(longest_event_s, excluded.longest_event_s)", (user_pk, longest)),
+        ])
+        return dict(item)
+
+    def put_events(self, user_pk, items):
+        rows, longest = [], 0
+        for it in items:
+            rows.append(("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)",
+                         (user_pk, it["eventId"], it["startISO"], it["endISO"], _dumps(it))))
+            longest = max(longest, int((_parse(it["endISO"]) - _parse(it["startISO"])).total_seconds()))
+        rows.append(("INSERT INTO users (user_pk, longest_event_s) VALUES (?, ?) ON CONFLICT (user_pk) DO UPDATE"
+                     " SET longest_event_s = max(longest_event_s, excluded.longest_event_s)", (user_pk, longest)))
+        self._tx(rows)
+        return len(rows) - 1
+
+    def get_event(self, user_pk, event_id):
+        rows = self._q("SELECT item FROM events WHERE user_pk = ? AND event_id = ?", (user_pk, event_id))
+        return json.loads(rows[0][0]) if rows else None
+
+    def delete_event(self, user_pk, event_id):
+        self._q("DELETE FROM events WHERE user_pk = ? AND event_id = ?", (user_pk, event_id))
+
+    def events_in_range(self, user_pk, start_iso, end_iso, attrs=None):
+        rows = self._q("SELECT item FROM events WHERE user_pk = ? AND start_iso BETWEEN ? AND ?"
+                       " ORDER BY start_iso, event_id", (user_pk, start_iso, end_iso))
+        return [_pick(json.loads(r[0]), attrs) for r in rows]
+
+    def events_overlapping(self, user_pk, start_iso, end_iso, attrs=None, lookback=timedelta(hours=12)):
+        # Exact: bounded on the start index by the longest event stored, then end > start
+        rows = self._q("SELECT longest_event_s FROM users WHERE user_pk = ?", (user_pk,))
+        lo = _fmt(_parse(start_iso) - timedelta(seconds=rows[0][0] if rows else 0))
+        rows = self._q("SELECT item FROM events WHERE user_pk = ? AND start_iso >= ? AND start_iso < ?"
+                       " AND end_iso > ? ORDER BY start_iso, event_id", (user_pk, lo, end_iso, start_iso))
+        return [_pick(json.loads(r[0]), attrs) for r in rows]
+
+    def events_page(self, user_pk, after, limit):
+        after = after or ["", ""]
+        rows = self._q("SELECT start_iso, event_id, item FROM events WHERE user_pk = ? AND (start_iso, event_id) > (?, ?)"
+                       " ORDER BY start_iso, event_id LIMIT ?", (user_pk, after[0], after[1], limit + 1))
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return [json.loads(r[2]) for r in rows], ([rows[-1][0], rows[-1][1]] if more else None)
+
+    # ---- tasks
+    def put_task(self, user_pk, item):
+        self._q("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?)", (user_pk, item["taskId"], _dumps(item)))
+        return dict(item)
+
+    def put_tasks(self, user_pk, items):
+        rows = [("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?)", (user_pk, it["taskId"], _dumps(it))) for it in items]
+        self._tx(rows)
+        return len(rows)
+
+    def get_task(self, user_pk, task_id):
+        rows = self._q("SELECT item FROM tasks WHERE user_pk = ? AND task_id = ?", (user_pk, task_id))
+        return json.loads(rows[0][0]) if rows else None
+
+    def delete_task(self, user_pk, task_id):
+        self._q("DELETE FROM tasks WHERE user_pk = ? AND task_id = ?", (user_pk, task_id))
+
+    def list_tasks(self, user_pk, attrs=None):
+        rows = self._q("SELECT item FROM tasks WHERE user_pk = ? ORDER BY task_id", (user_pk,))
+        return [_pick(json.loads(r[0]), attrs) for r in rows]
+
+    def tasks_page(self, user_pk, after, limit):
+        rows = self._q("SELECT task_id, item FROM tasks WHERE user_pk = ? AND task_id > ? ORDER BY task_id LIMIT ?",
+                       (user_pk, after or "", limit + 1))
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return [json.loads(r[1]) for r in rows], (rows[-1][0] if more else None)
+
+    # ---- availability
+    def get_availability(self, user_pk):
+        rows = self._q("SELECT day, windows FROM availability WHERE user_pk = ?", (user_pk,))
+        return {day: json.loads(windows) for day, windows in rows}
+
+    def put_availability(self, user_pk, weekly, tz):
+        self._tx([("INSERT OR REPLACE INTO availability VALUES (?, ?, ?, ?)",
+                   (user_pk, d, _dumps(weekly.get(d, [])), tz))
+                  for d in ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")])
+
+    # ---- version and change log
+    def bump_version(self, user_pk):
+        rows = self._q("INSERT INTO users (user_pk, version, updated_at) VALUES (?, 1, ?) ON CONFLICT (user_pk)"
+                       " DO UPDATE SET version = version + 1, updated_at = excluded.updated_at RETURNING version",
+                       (user_pk, int(time.time())))
+        return int(rows[0][0])
+
+    def get_version(self, user_pk):
+        rows = self._q("SELECT version FROM users WHERE user_pk = ?", (user_pk,))
+        return int(rows[0][0]) if rows else 0
+
+    def put_change(self, user_pk, change):
+        self._q("INSERT OR REPLACE INTO changes VALUES (?, ?, ?, ?)",
+                (user_pk, change["seq"], _dumps(change), change.get("ttl", 2**62)))
+
+    def changes_after(self, user_pk, since, limit):
+        rows = self._q("SELECT item FROM changes WHERE user_pk = ? AND seq > ? AND ttl > ? ORDER BY seq LIMIT ?",
+                       (user_pk, since, int(time.time()), limit + 1))
+        return [json.loads(r[0]) for r in rows[:limit]], len(rows) > limit
+
+    # ---- day stats
+    def add_day_stats(self, user_pk, day, events, busy_min):
+        self._q("INSERT INTO day_stats VALUES (?, ?, ?, ?) ON CONFLICT (user_pk, day) DO UPDATE"
+                " SET events = events + excluded.events, busy_min = busy_min + excluded.busy_min",
+                (user_pk, day, events, busy_min))
+
+    def day_stats(self, user_pk, first_day, last_day):
+        rows = self._q("SELECT day, events, busy_min FROM day_stats WHERE user_pk = ? AND day BETWEEN ? AND ?"
+                       " ORDER BY day", (user_pk, first_day, last_day))
+        return [{"date": d, "events": n, "busyMin": m} for d, n, m in rows]
+
+    def replace_day_stats(self, user_pk, totals, version):
+        with self._transaction():
+            if self.get_version(user_pk) != version:
+                return False
+            self._tx([("DELETE FROM day_stats WHERE user_pk = ?", (user_pk,))] +
+                     [("INSERT INTO day_stats VALUES (?, ?, ?, ?)", (user_pk, d, n, m)) for d, (n, m) in totals.items()])
+            return True
+
+    # ---- idempotency
+    def claim_idempotency(self, user_pk, key, record, stale_before):
+        rows = self._q(
+            "INSERT INTO idempotency VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (user_pk, key) DO UPDATE"
+            " SET record = excluded.record, state = excluded.state, locked_at = excluded.locked_at, ttl = excluded.ttl"
+            " WHERE idempotency.ttl <= ? OR (idempotency.state = 'pending' AND idempotency.locked_at < ?)"
+            " RETURNING 1",
+            (user_pk, key, _dumps(record), record.get("state", ""), record.get("lockedAt", 0), record.get("ttl", 2**62),
+             int(time.time()), stale_before))
+        return bool(rows)
+
+    def get_idempotency(self, user_pk, key):
+        rows = self._q("SELECT record FROM idempotency WHERE user_pk = ? AND key = ? AND ttl > ?",
+                       (user_pk, key, int(time.time())))
+        return json.loads(rows[0][0]) if rows else None
+
+    def put_idempotency(self, user_pk, key, record):
+        self._q("INSERT OR REPLACE INTO idempotency VALUES (?, ?, ?, ?, ?, ?)",
+                (user_pk, key, _dumps(record), record.get("state", ""), record.get("lockedAt", 0),
+                 record.get("ttl", 2**62)))
+
+    def delete_idempotency(self, user_pk, key):
+        self._q("DELETE FROM idempotency WHERE user_pk = ? AND key = ?", (user_pk, key))
+
+    # ---- rate leases
+    def lease_rate(self, user_pk, cls, window, n, budget, ttl):
+        rows = self._q(
+            "INSERT INTO rate_leases VALUES (?, ?, ?, ?, ?) ON CONFLICT (user_pk, cls, window) DO UPDATE"
+            " SET used = used + excluded.used WHERE used <= ? RETURNING 1",
+            (user_pk, cls, window, n, ttl, budget - n))
+        return bool(rows)
+
+    def purge_expired(self, now=None):
+        now = int(time.time()) if now is None else now
+        dropped = 0
+        with self._lock:
+            for table in ("changes", "idempotency", "rate_leases"):
+                dropped += self.db.execute(f"DELETE FROM {table} WHERE ttl <= ?", (now,)).rowcount
+        return dropped
+
+    # ---- users, snapshots and job runs
+    def users_page(self, after, limit, segment=0, total_segments=1):
+        rows = self._q("SELECT user_pk, updated_at FROM users WHERE user_pk > ? AND (? = 1 OR segment_of(user_pk, ?) = ?)"
+                       " ORDER BY user_pk LIMIT ?", (after or "", total_segments, total_segments, segment, limit + 1))
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return [{"userPk": pk, "updatedAt": ts} for pk, ts in rows], (rows[-1][0] if more else None)
+
+    def put_snapshot(self, user_pk, name, data):
+        self._q("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)", (user_pk, name, _dumps(data)))
+
+    def get_snapshot(self, user_pk, name):
+        rows = self._q("SELECT data FROM snapshots WHERE user_pk = ? AND name = ?", (user_pk, name))
+        return json.loads(rows[0][0]) if rows else None
+
+    def claim_job(self, name, run_id, owner, lease_until, now):
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")  # other processes may share the file
+            try:
+                rows = self.db.execute("SELECT record, owner, lease_until, status FROM jobs"
+                                       " WHERE name = ? AND run_id = ?", (name, run_id)).fetchall()
+                if rows and (rows[0][3] == "done" or (rows[0][2] >= now and rows[0][1] != owner)):
+                    job = None
+                else:
+                    job = json.loads(rows[0][0]) if rows else {"runId": run_id, "status": "running", "startedAt": now}
+                    job.update(owner=owner, leaseUntil=lease_until)
+                    self.db.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?)",
+                                    (name, run_id, _dumps(job), owner, lease_until, job["status"]))
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            return job
+
+    def save_job(self, name, run_id, owner, state):
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.db.execute("SELECT record FROM jobs WHERE name = ? AND run_id = ? AND owner = ?",
+                                       (name, run_id, owner)).fetchall()
+                if rows:
+                    job = {**json.loads(rows[0][0]), **state}
+                    self.db.execute("UPDATE jobs SET record = ?, lease_until = ?, status = ? WHERE name = ? AND run_id = ?",
+                                    (_dumps(job), job["leaseUntil"], job["status"], name, run_id))
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            return bool(rows)
+
+def from_env() -> Repository:
+    if STORAGE_BACKEND == "dynamodb":
+        return DynamoRepository.from_env()
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteRepository(SQLITE_PATH)
+    if STORAGE_BACKEND == "memory":
+        return MemoryRepository()
+    raise ValueError(f"unknown STORAGE_BACKEND {STORAGE_BACKEND!r} (dynamodb, sqlite or memory)")
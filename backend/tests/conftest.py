@@ -0,0 +1,51 @@
+"""Make `backend/handler` and `backend/tools` importable, against the in-memory backend."""
+import os
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("TABLE_NAME", "test-scheduler")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("RATE_LIMIT_SHARED", "false")
+
+for sub in ("handler", "tools"):
+    path = os.path.join(BACKEND, sub)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+import json  # noqa: E402  (after the environment above)
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    """A fresh in-memory repository behind `app`, with rate limits out of the way."""
+    import app
+    import storage
+
+    r = storage.MemoryRepository()
+    monkeypatch.setattr(app, "REPO", r)
+    monkeypatch.setattr(app, "RATE_LIMITER", app.RateLimiter({"expensive": "1000/1000", "default": "1000/1000"},
+                                                               False, 1))
+    return r
+
+
+@pytest.fixture
+def api(repo):
+    """api(method, path, body=None, qs=None, headers=None, user="tester") -> (status, body, headers),
+    through app.handler as API Gateway would call it; JSON bodies come back parsed."""
+    import app
+
+    def call(method, path, body=None, qs=None, headers=None, user="tester"):
+        r = app.handler({"httpMethod": method, "path": path, "headers": {"X-Debug-User": user, **(headers or {})},
+                         "queryStringParameters": qs,
+                         "body": body if body is None or isinstance(body, str) else json.dumps(body)}, None)
+        out = r.get("body")
+        if out and r["headers"].get("Content-Type", "").startswith("application/json"):
+            out = json.loads(out)
+        return r["statusCode"], out, r["headers"]
+    return call
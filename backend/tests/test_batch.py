@@ -0,0 +1,49 @@
+import threading
+
+import app
+
+
+def batch(api, *entries, user="tester"):
+    status, body, _ = api("POST", "/batch", {"requests": list(entries)}, user=user)
+    assert status == 200
+    return body["responses"]
+
+
+def test_a_malformed_entry_gets_its_own_400(api):
+    got = batch(api,
+                "GET /tasks",
+                {"path": "/tasks"},
+                {"method": "POST", "path": "/batch", "body": {"requests": []}},
+                {"method": "GET", "path": "/tasks", "query": {"fields": 1}},
+                {"method": "GET", "path": "/tasks"})
+    assert [r["status"] for r in got] == [400, 400, 400, 400, 200]
+    assert got[2]["body"]["message"] == "batch entries cannot be nested batches"
+    assert api("POST", "/batch", {"requests": []})[0] == 400
+    too_many = [{"method": "GET", "path": "/tasks"}] * (app.BATCH_MAX_OPS + 1)
+    assert api("POST", "/batch", {"requests": too_many})[0] == 400
+
+
+def test_entries_run_in_order_as_the_caller(api):
+    api("POST", "/tasks", {"title": "someone else's", "durationMin": 15}, user="other")
+    got = batch(api,
+                {"method": "GET", "path": "/tasks"},
+                {"method": "POST", "path": "/tasks", "body": {"title": "mine", "durationMin": 30}},
+                {"method": "GET", "path": "/tasks?fields=title"},
+                {"method": "GET", "path": "/nowhere"})
+    assert [r["status"] for r in got] == [200, 201, 200, 404]
+    assert got[0]["body"]["tasks"] == [] and [t["title"] for t in got[2]["body"]["tasks"]] == ["mine"]
+    assert "etag" in got[2]
+
+
+def test_adjacent_reads_fan_out(api, monkeypatch):
+    # Three reads that each wait for the other two: only passes if they run at the same time
+    barrier = threading.Barrier(3, timeout=5)
+    tasks_get = app.handle_tasks_get
+
+    def waiting(event):
+        barrier.wait()
+        return tasks_get(event)
+
+    monkeypatch.setattr(app, "handle_tasks_get", waiting)
+    got = batch(api, *[{"method": "GET", "path": "/tasks"}] * 3)
+    assert [r["status"] for r in got] == [200, 200, 200]
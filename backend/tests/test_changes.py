@@ -0,0 +1,62 @@
+import time
+
+import app
+
+TASK = {"title": "t", "durationMin": 30}
+
+
+def start(api):
+    status, body, _ = api("GET", "/changes")
+    assert status == 200 and body["changes"] == []
+    return body["cursor"]
+
+
+def test_changes_after_a_cursor_then_nothing_new(api):
+    cursor = start(api)
+    api("POST", "/tasks", TASK)
+    api("POST", "/tasks", TASK)
+    status, body, headers = api("GET", "/changes", qs={"since": cursor})
+    assert status == 200 and [(c["seq"], c["entity"], c["op"]) for c in body["changes"]] == [(1, "TASK", "put"), (2, "TASK", "put")]
+    assert not body["hasMore"] and "ETag" in headers
+    status, body, headers = api("GET", "/changes", qs={"since": body["cursor"]})
+    assert body["changes"] == [] and "ETag" in headers
+    assert api("GET", "/changes", qs={"since": body["cursor"]}, headers={"If-None-Match": headers["ETag"]})[0] == 304
+
+
+def test_a_hole_ends_the_page_until_the_grace_has_passed(api, repo, monkeypatch):
+    cursor = start(api)
+    repo.bump_version("USER#tester")  # seq 1: a write whose change entry is not there (yet)
+    api("POST", "/tasks", TASK)
+    status, body, headers = api("GET", "/changes", qs={"since": cursor})
+    assert status == 200 and body["changes"] == [] and headers["Cache-Control"] == "no-store"
+    assert body["cursor"] == cursor
+    monkeypatch.setattr(app, "CHANGE_HOLE_GRACE_SECONDS", 0)
+    status, body, _ = api("GET", "/changes", qs={"since": cursor})
+    assert [c["seq"] for c in body["changes"]] == [2]
+
+
+def test_changes_not_in_the_log_yet_are_not_cacheable(api, repo):
+    cursor = start(api)
+    repo.bump_version("USER#tester")
+    status, body, headers = api("GET", "/changes", qs={"since": cursor})
+    assert status == 200 and body == {"changes": [], "cursor": cursor, "hasMore": False}
+    assert headers["Cache-Control"] == "no-store" and "ETag" not in headers
+
+
+def test_a_cursor_older_than_the_retention_is_gone(api, repo):
+    now = int(time.time())
+    old = now - app.CHANGE_TTL_DAYS * 86400 - 60
+    for seq, ttl in ((1, now - 60), (2, now + 3600)):
+        repo.bump_version("USER#tester")
+        repo.put_change("USER#tester", {"seq": seq, "entity": "TASK", "id": f"t{seq}", "op": "put",
+                                        "at": old if seq == 1 else now, "ttl": ttl})
+    for since in (f"0.{old}", "0"):  # and a plain "<seq>" cursor from older responses
+        status, body, _ = api("GET", "/changes", qs={"since": since})
+        assert status == 410 and body["error"] == "CursorExpired"
+    status, body, _ = api("GET", "/changes", qs={"since": f"1.{old}"})
+    assert status == 200 and [c["seq"] for c in body["changes"]] == [2]
+
+
+def test_since_must_be_a_cursor(api):
+    assert api("GET", "/changes", qs={"since": "soon"})[0] == 400
+    assert api("GET", "/changes", qs={"since": "-1.0"})[0] == 400
@@ -0,0 +1,29 @@
+import gzip
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", ["gzip", "deflate", "br"]),
+    ("br;q=0.5, gzip", ["gzip", "br"]),
+    ("*", ["gzip", "br"]),
+    ("gzip;q=0, *", ["br"]),
+    ("br, *;q=0.5", ["br", "gzip"]),
+    ("gzip;q=0.2, br;q=0, *", ["gzip"]),
+    ("*;q=0", []),
+    ("", []),
+])
+def test_accepted_encodings(header, expected):
+    assert app.accepted_encodings({"headers": {"Accept-Encoding": header}}) == expected
+
+
+def test_wildcard_does_not_override_a_refused_gzip():
+    body = b'{"events": []}' * 200
+    encoding, packed = app.compress_body(body, app.accepted_encodings({"headers": {"accept-encoding": "gzip;q=0, *"}}))
+    assert encoding != "gzip"
+    if encoding is None:
+        assert packed == body
+    encoding, packed = app.compress_body(body, app.accepted_encodings({"headers": {"accept-encoding": "*"}}))
+    assert encoding == "gzip" and gzip.decompress(packed) == body
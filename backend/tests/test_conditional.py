@@ -0,0 +1,36 @@
+import json
+
+import app
+
+
+def get(user, path, qs=None, etag=None):
+    headers = {"X-Debug-User": user}
+    if etag:
+        headers["If-None-Match"] = etag
+    return app.handler({"httpMethod": "GET", "path": path, "headers": headers,
+                        "queryStringParameters": qs, "body": None}, None)
+
+
+def post_task(user, title):
+    r = app.handler({"httpMethod": "POST", "path": "/tasks", "headers": {"X-Debug-User": user},
+                     "body": json.dumps({"title": title, "durationMin": 30})}, None)
+    assert r["statusCode"] == 201
+
+
+def test_etag_is_per_user():
+    post_task("etag-a", "a's task")
+    post_task("etag-b", "b's task")  # same version, same path
+    tag_a = get("etag-a", "/tasks")["headers"]["ETag"]
+    r = get("etag-b", "/tasks", etag=tag_a)
+    assert r["statusCode"] == 200 and "b's task" in r["body"]
+    assert r["headers"]["ETag"] != tag_a
+    assert r["headers"]["Vary"] == "Authorization, X-Debug-User"
+
+
+def test_not_modified_until_the_next_write():
+    post_task("etag-c", "first")
+    tag = get("etag-c", "/tasks")["headers"]["ETag"]
+    r = get("etag-c", "/tasks", etag=tag)
+    assert r["statusCode"] == 304 and r["headers"]["Vary"] == "Authorization, X-Debug-User"
+    post_task("etag-c", "second")
+    assert get("etag-c", "/tasks", etag=tag)["statusCode"] == 200
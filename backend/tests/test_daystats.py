@@ -0,0 +1,12 @@
+import app
+
+
+def test_month_summary_dates_days_in_the_availability_timezone(api):
+    _, avail, _ = api("GET", "/availability")
+    assert app.DAYSTAT_TZ == avail["timezone"]
+    # 22:30Z on the 14th is 01:30 on the 15th in Jerusalem (UTC+3 in October)
+    assert api("POST", "/events", {"title": "late", "startISO": "2026-10-14T22:30:00Z",
+                                   "endISO": "2026-10-14T23:30:00Z"})[0] == 201
+    status, body, _ = api("GET", "/summary/month", qs={"from": "2026-10-01", "to": "2026-10-31"})
+    assert status == 200 and body["timezone"] == app.DAYSTAT_TZ
+    assert body["days"] == [{"date": "2026-10-15", "events": 1, "busyMin": 60}]
@@ -0,0 +1,84 @@
+import base64
+import json
+
+import pytest
+
+import app
+import storage
+from localtable import LocalTable
+
+
+@pytest.fixture(params=["memory", "dynamodb"])
+def backend(request, repo, monkeypatch):
+    if request.param == "dynamodb":
+        monkeypatch.setattr(app, "REPO", storage.DynamoRepository(LocalTable("export")))
+    monkeypatch.setattr(app, "EXPORT_QUERY_PAGE", 3)
+    monkeypatch.setattr(app, "EXPORT_MAX_ITEMS", 4)
+    for user in ("tester", "other"):
+        for i in range(7):
+            app.put_event(f"USER#{user}", f"{user} {i}", f"2026-03-{1 + i:02d}T08:00:00Z",
+                          f"2026-03-{1 + i:02d}T09:00:00Z", True, "app")
+        app.REPO.put_tasks(f"USER#{user}", [{"taskId": f"{user}{i}", "title": "t", "durationMin": 30,
+                                             "createdAt": "2026-03-01T00:00:00Z"}
+                                            for i in range(5)])
+    return request.param
+
+
+def export(api, cursor=None):
+    status, body, headers = api("GET", "/export", qs={"cursor": cursor} if cursor else None)
+    return status, body, headers.get("X-Export-Cursor")
+
+
+def encode(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def test_export_resumes_from_the_cursor(api, backend):
+    lines, cursor, calls = [], None, 0
+    while True:
+        status, body, cursor = export(api, cursor)
+        assert status == 200
+        lines += [json.loads(line) for line in body.splitlines()]
+        calls += 1
+        if not cursor:
+            break
+    assert calls > 1
+    assert [x["title"] for x in lines if x["type"] == "event"] == [f"tester {i}" for i in range(7)]
+    assert sorted(x["taskId"] for x in lines if x["type"] == "task") == [f"tester{i}" for i in range(5)]
+
+
+def test_only_keys_the_store_handed_out_to_the_caller(api, backend):
+    _, _, cursor = export(api)
+    state = json.loads(base64.urlsafe_b64decode(cursor))
+    tampered = [{**state, "kind": "nope"}, {**state, "key": None}, {"kind": state["kind"]}, "not a cursor"]
+    if backend == "dynamodb":
+        key = state["key"]
+        tampered += [
+            {**state, "key": {**key, "pk": "USER#other", "gsi1pk": "USER#other"}},  # someone else's partition
+            {**state, "key": {**key, "extra": "x"}},
+            {**state, "key": {k: v for k, v in key.items() if k != "gsi1sk"}},
+            {"kind": "tasks", "key": {"pk": "USER#tester", "sk": key["sk"]}},  # an event key for the tasks
+        ]
+    else:
+        tampered += [{**state, "key": {"pk": "USER#other"}}, {**state, "key": ["a", 1]}]
+    for bad in tampered:
+        status, body, _ = export(api, bad if isinstance(bad, str) else encode(bad))
+        assert status == 400 and body["message"] == "invalid cursor", bad
+
+
+def test_streamed_export_logs_and_counts_on_its_own(backend, capsys):
+    import server
+    from observability import METRICS
+
+    METRICS.reset()
+    METRICS.incr("Marker")
+    status, headers, chunks = server.invoke(server.proxy_event("GET", "/export", {"X-Debug-User": "tester"}, b""))
+    assert status == 200 and not isinstance(chunks, list)
+    METRICS.incr("Marker")  # another request runs while the stream is read
+    lines = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [line["type"] for line in lines] == ["event"] * 7 + ["task"] * 5
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+    emf = [r for r in records if "_aws" in r]
+    assert [r["Route"] for r in emf] == ["GET /export"] and emf[0]["StatusCode"] == 200
+    assert METRICS.counts == {"Marker": 2} and not METRICS.phases
@@ -0,0 +1,59 @@
+import app
+
+EVENT = {"title": "dentist", "startISO": "2026-03-03T10:00:00Z", "endISO": "2026-03-03T11:00:00Z"}
+
+
+def test_retry_replays_the_first_response(api, repo):
+    status, first, _ = api("POST", "/events", EVENT, headers={"Idempotency-Key": "k1"})
+    assert status == 201
+    status, again, headers = api("POST", "/events", EVENT, headers={"Idempotency-Key": "k1"})
+    assert status == 201 and again == first and headers["Idempotent-Replayed"] == "true"
+    assert len(repo.events["USER#tester"]) == 1
+
+
+def test_key_reused_with_another_payload_is_rejected(api):
+    api("POST", "/tasks", {"title": "a", "durationMin": 30}, headers={"Idempotency-Key": "k2"})
+    status, body, _ = api("POST", "/tasks", {"title": "b", "durationMin": 30}, headers={"Idempotency-Key": "k2"})
+    assert status == 422 and body["error"] == "IdempotencyKeyReused"
+
+
+def test_keys_are_per_user(api):
+    api("POST", "/tasks", {"title": "a", "durationMin": 30}, headers={"Idempotency-Key": "k3"}, user="u1")
+    status, _, headers = api("POST", "/tasks", {"title": "a", "durationMin": 30},
+                             headers={"Idempotency-Key": "k3"}, user="u2")
+    assert status == 201 and "Idempotent-Replayed" not in headers
+
+
+def test_in_flight_duplicate_gets_409(api, monkeypatch):
+    seen = {}
+    handle = app.handle_tasks_post
+
+    def slow_handle(event):
+        # The client retries while the first request is still running
+        status, body, headers = api("POST", "/tasks", event["body"], headers={"Idempotency-Key": "k4"})
+        seen["retry"] = (status, body["error"], headers["Retry-After"])
+        return handle(event)
+
+    monkeypatch.setattr(app, "handle_tasks_post", slow_handle)
+    status, _, _ = api("POST", "/tasks", {"title": "slow", "durationMin": 30}, headers={"Idempotency-Key": "k4"})
+    assert status == 201 and seen["retry"] == (409, "RequestInProgress", "1")
+
+
+def test_errors_release_the_key(api):
+    status, _, _ = api("POST", "/events", {"title": "bad"}, headers={"Idempotency-Key": "k5"})
+    assert status == 400
+    status, _, _ = api("POST", "/events", EVENT, headers={"Idempotency-Key": "k5"})
+    assert status == 201
+
+
+def test_batch_entries_do_not_inherit_the_outer_key(api, repo):
+    ops = [{"method": "POST", "path": "/tasks", "body": {"title": "one", "durationMin": 30}},
+           {"method": "POST", "path": "/tasks", "body": {"title": "two", "durationMin": 30}},
+           {"method": "POST", "path": "/tasks", "body": {"title": "three", "durationMin": 30},
+            "headers": {"Idempotency-Key": "entry-key"}}]
+    status, body, _ = api("POST", "/batch", {"requests": ops}, headers={"Idempotency-Key": "outer"})
+    assert status == 200 and [r["status"] for r in body["responses"]] == [201, 201, 201]
+    # The entry's own key still works: resending that entry replays it
+    status, body, _ = api("POST", "/batch", {"requests": ops[2:]})
+    assert body["responses"][0]["status"] == 201 and body["responses"][0]["idempotentReplayed"] == "true"
+    assert len(repo.tasks["USER#tester"]) == 3
@@ -0,0 +1,62 @@
+import pytest
+
+import app
+import storage
+from localtable import LocalTable
+
+USER = "USER#maint"
+
+
+@pytest.fixture(params=["memory", "dynamo"])
+def repo(request, monkeypatch):
+    r = storage.MemoryRepository() if request.param == "memory" else storage.DynamoRepository(LocalTable("maint"))
+    monkeypatch.setattr(app, "REPO", r)
+    monkeypatch.setattr(app, "INDEX_SETTLE_SECONDS", -1)  # the index is never behind here
+    return r
+
+
+def add_event(day):
+    app.put_event(USER, "e", f"{day}T08:00:00Z", f"{day}T09:00:00Z", True, "app")
+
+
+def stats():
+    return {d["date"]: (d["events"], d["busyMin"]) for d in app.get_day_stats(USER, "2026-01-01", "2026-12-31")}
+
+
+def test_rebuild_repairs_drift(repo):
+    add_event("2026-03-02")
+    repo.add_day_stats(USER, "2026-03-02", 4, 0)
+    repo.add_day_stats(USER, "2026-03-09", 1, 30)
+    assert app.rebuild_day_stats(USER) == 1
+    assert stats() == {"2026-03-02": (1, 60)}
+
+
+def test_rebuild_never_overwrites_a_write_made_during_it(repo, monkeypatch):
+    add_event("2026-03-02")
+    repo.add_day_stats(USER, "2026-03-02", 4, 0)
+    pages = repo.events_page
+
+    def racing(*args):
+        page = pages(*args)
+        add_event("2026-03-03")  # lands after the page was read
+        return page
+
+    monkeypatch.setattr(repo, "events_page", racing)
+    assert app.rebuild_day_stats(USER) == -1
+    assert stats() == {"2026-03-02": (5, 60), "2026-03-03": (1, 60)}  # drift kept, the ADD too
+    monkeypatch.setattr(repo, "events_page", pages)
+    assert app.rebuild_day_stats(USER) == 2
+    assert stats() == {"2026-03-02": (1, 60), "2026-03-03": (1, 60)}
+
+
+def test_maintenance_waits_for_the_index_to_settle(monkeypatch):
+    monkeypatch.setattr(app, "REPO", storage.DynamoRepository(LocalTable("maint")))
+    monkeypatch.setattr(app, "INDEX_SETTLE_SECONDS", 60)
+    now = app.datetime.now(app.timezone.utc)
+    add_event(now.strftime("%Y-%m-%d"))
+    assert app.rebuild_day_stats(USER) == -1
+    assert app.precompute_freebusy(USER, now) == -1
+    assert app.REPO.get_snapshot(USER, "freebusy") is None
+    monkeypatch.setattr(app, "INDEX_SETTLE_SECONDS", -1)
+    assert app.precompute_freebusy(USER, now) == 1
+    assert app.REPO.get_snapshot(USER, "freebusy")["version"] == app.get_version(USER)
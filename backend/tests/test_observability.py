@@ -0,0 +1,83 @@
+import io
+import json
+import re
+
+import app
+import observability
+from observability import JsonLogger, RequestMetrics
+
+
+def test_emf_record_declares_every_value(monkeypatch):
+    monkeypatch.setattr(observability, "METRICS_USER_DIMENSION", True)
+    m = RequestMetrics()
+    m.add_time("ddb", 3.25)
+    m.add_time("ddb", 1.0)
+    m.incr("DynamoDBCalls", 2)
+    m.add_capacity("RCU", 1.5)
+    m.add_capacity("RCU.GSI1", 0.5)
+    out = io.StringIO()
+    m.emit("GET /events", 12.3456, 200, user="USER#u1", stream=out)
+
+    rec = json.loads(out.getvalue())
+    assert rec["Route"] == "GET /events" and rec["StatusCode"] == 200 and rec["User"] == "USER#u1"
+    assert rec["Latency"] == 12.346
+    assert rec["Phase.ddb"] == 4.25
+    assert rec["DynamoDBCalls"] == 2 and rec["RCU"] == 1.5 and rec["RCU.GSI1"] == 0.5
+    assert rec["Errors"] == 0
+    by_route, by_user = rec["_aws"]["CloudWatchMetrics"]
+    assert by_route["Dimensions"] == [["Route"]]
+    for metric in by_route["Metrics"]:
+        assert metric["Name"] in rec  # EMF drops a metric whose value is missing
+    units = {metric["Name"]: metric["Unit"] for metric in by_route["Metrics"]}
+    assert units["Latency"] == "Milliseconds" and units["Phase.ddb"] == "Milliseconds"
+    assert units["DynamoDBCalls"] == "Count"
+    assert by_user == {"Namespace": by_route["Namespace"], "Dimensions": [["User"]],
+                       "Metrics": [{"Name": "RCU", "Unit": "Count"}]}
+
+
+def test_user_dimension_is_opt_in():
+    m = RequestMetrics()
+    m.add_capacity("RCU", 1.0)
+    rec = m.emf("GET /events", 1.0, 200, user="USER#u1")
+    assert rec["User"] == "USER#u1"
+    assert [d["Dimensions"] for d in rec["_aws"]["CloudWatchMetrics"]] == [[["Route"]]]
+
+
+def test_emf_counts_server_errors():
+    m = RequestMetrics()
+    assert m.emf("GET /tasks", 1.0, 503)["Errors"] == 1
+    assert m.emf("GET /tasks", 1.0, 404)["Errors"] == 0
+
+
+def call(method, path, body=None, qs=None):
+    return app.handler({"httpMethod": method, "path": path, "headers": {"X-Debug-User": "obs"},
+                        "queryStringParameters": qs, "body": json.dumps(body) if body is not None else None}, None)
+
+
+def test_server_timing_header():
+    call("POST", "/tasks", {"title": "write", "durationMin": 30})
+    r = call("GET", "/tasks")
+    assert r["statusCode"] == 200
+    parts = [p.strip() for p in r["headers"]["Server-Timing"].split(",")]
+    timings = {}
+    for part in parts:
+        match = re.fullmatch(r"([\w.-]+);dur=(\d+\.\d{2})", part)
+        assert match, part
+        timings[match.group(1)] = float(match.group(2))
+    assert list(timings)[-1] == "total"
+    assert "serialize" in timings
+    assert sum(ms for name, ms in timings.items() if name != "total") <= timings["total"] + 0.01 * len(timings)
+
+
+def test_scope_keeps_bindings_out_of_the_request_context():
+    out = io.StringIO()
+    log = JsonLogger(stream=out)
+    log.begin("req-1", route="POST /batch")
+    with log.scope(subRoute="GET /tasks"):
+        log.bind(errorClass="BadRequest")
+        log.info("inside")
+    log.info("outside")
+    inside, outside = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert inside["requestId"] == "req-1" and inside["subRoute"] == "GET /tasks"
+    assert inside["errorClass"] == "BadRequest"
+    assert "subRoute" not in outside and "errorClass" not in outside
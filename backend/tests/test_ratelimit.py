@@ -0,0 +1,54 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def limits(repo, monkeypatch):
+    """Bursts of 3 default and 2 expensive requests, refilling far slower than a test runs."""
+    monkeypatch.setattr(app, "RATE_LIMITER", app.RateLimiter({"expensive": "0.01/2", "default": "0.01/3"}, False, 1))
+
+
+def test_over_budget_is_429_with_retry_after(api, limits):
+    for _ in range(3):
+        assert api("GET", "/tasks")[0] == 200
+    status, body, headers = api("GET", "/tasks")
+    assert status == 429 and body["error"] == "TooManyRequests"
+    assert headers["Retry-After"] == "100"  # one token at 0.01/s
+    assert api("GET", "/tasks", user="someone-else")[0] == 200
+    assert api("GET", "/health")[0] == 200  # never limited
+
+
+def test_buckets_refill_at_the_rate():
+    limiter = app.RateLimiter({"default": "2/2"}, False, 1)
+    assert limiter.check("U", "default", now=10.0) is None
+    assert limiter.check("U", "default", now=10.0) is None
+    assert limiter.check("U", "default", now=10.0) == pytest.approx(0.5)
+    assert limiter.check("U", "default", now=10.5) is None
+
+
+def test_each_batch_entry_pays_for_its_own_class(api, limits):
+    status, body, _ = api("POST", "/batch", {"requests": [
+        {"method": "POST", "path": "/suggest", "body": {}},
+        {"method": "POST", "path": "/suggest", "body": {}},
+        {"method": "POST", "path": "/suggest", "body": {}},
+        {"method": "GET", "path": "/tasks"},
+    ]})
+    assert status == 200
+    got = body["responses"]
+    assert [r["status"] for r in got] == [400, 400, 429, 200]  # two expensive tokens, then none
+    assert got[2]["retryAfter"] == "100" and got[2]["body"]["error"] == "TooManyRequests"
+    assert api("POST", "/suggest", {})[0] == 429
+    # The batch itself and its GET took two default tokens: one left
+    assert api("GET", "/tasks")[0] == 200
+    assert api("GET", "/tasks")[0] == 429
+
+
+def test_shared_budget_holds_across_containers(repo):
+    # rate*60+burst = 2 per user per minute, whichever container serves the request
+    one = app.RateLimiter({"default": "0.01/2"}, True, 1)
+    two = app.RateLimiter({"default": "0.01/2"}, True, 1)
+    assert one.check("U", "default", now=600.0) is None
+    assert two.check("U", "default", now=601.0) is None
+    assert two.check("U", "default", now=602.0) == pytest.approx(58.0)  # until the next minute
+    assert one.check("U", "default", now=660.0) is None
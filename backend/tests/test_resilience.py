@@ -0,0 +1,141 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from resilience import CircuitBreaker, GuardedTable, StaleCache, StorageUnavailable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyTable:
+    """A table whose calls fail with a throttling error while `failing` is set."""
+
+    def __init__(self):
+        self.failing = False
+        self.calls = 0
+
+    def get_item(self, **kwargs):
+        self.calls += 1
+        if self.failing:
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "GetItem")
+        return {"Item": {"pk": kwargs["Key"]["pk"], "n": self.calls}}
+
+    def put_item(self, **kwargs):
+        return self.get_item(Key={"pk": kwargs["Item"]["pk"]})
+
+    def batch_writer(self):
+        return Writer(self)
+
+
+class Writer:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.table.put_item(Item={"pk": "flush"})
+
+    def put_item(self, **kwargs):
+        pass
+
+
+def guarded(failures=3, cooldown=5.0, cache_entries=0):
+    clock = Clock()
+    table = FlakyTable()
+    guard = GuardedTable(table, CircuitBreaker(failures, cooldown, clock), StaleCache(cache_entries, 60, clock))
+    return guard, table, clock
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_good_probe():
+    guard, table, clock = guarded()
+    key = {"Key": {"pk": "USER#1"}}
+    table.failing = True
+    for _ in range(3):
+        with pytest.raises(StorageUnavailable):
+            guard.get_item(**key)
+    assert guard.breaker.state == "open" and table.calls == 3
+
+    # Open: no call reaches the table
+    with pytest.raises(StorageUnavailable) as err:
+        guard.get_item(**key)
+    assert table.calls == 3 and err.value.retry_after >= 1.0
+
+    # After the cooldown one probe goes out; a failing probe reopens at once
+    clock.now += 5
+    assert guard.breaker.state == "half-open"
+    with pytest.raises(StorageUnavailable):
+        guard.get_item(**key)
+    assert table.calls == 4 and guard.breaker.state == "open"
+
+    clock.now += 5
+    table.failing = False
+    assert guard.get_item(**key)["Item"]["pk"] == "USER#1"
+    assert guard.breaker.state == "closed" and guard.breaker.consecutive == 0
+
+
+def test_answers_are_not_failures():
+    guard, table, _ = guarded(failures=1)
+
+    def conditional_failure(**_):
+        raise ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": "no"}}, "PutItem")
+
+    table.put_item = conditional_failure
+    with pytest.raises(ClientError):
+        guard.put_item(Item={"pk": "USER#1"})
+    assert guard.breaker.state == "closed"
+
+
+def test_reads_fall_back_to_the_last_good_response():
+    guard, table, _ = guarded(failures=2, cache_entries=8)
+    key = {"Key": {"pk": "USER#1"}}
+    fresh = guard.get_item(**key)
+    table.failing = True
+    for _ in range(3):  # the failures, then the open circuit, are served from the cache
+        assert guard.get_item(**key) == fresh
+    assert guard.breaker.state == "open" and table.calls == 3
+    with pytest.raises(StorageUnavailable):
+        guard.get_item(Key={"pk": "USER#2"})
+    with pytest.raises(StorageUnavailable):
+        guard.put_item(Item={"pk": "USER#1"})  # writes never fall back
+
+
+def test_consistent_and_paged_reads_never_fall_back():
+    guard, table, _ = guarded(failures=5, cache_entries=8)
+    for args in ({"ConsistentRead": True}, {"Limit": 10}, {"ExclusiveStartKey": {"pk": "USER#1"}}):
+        guard.get_item(Key={"pk": "USER#1"}, **args)
+    assert not guard.cache._data
+    guard.get_item(Key={"pk": "USER#1"}, ConsistentRead=False)
+    table.failing = True
+    with pytest.raises(StorageUnavailable):
+        guard.get_item(Key={"pk": "USER#1"}, ConsistentRead=True)
+    assert guard.get_item(Key={"pk": "USER#1"}, ConsistentRead=False)["Item"]["n"] == 4
+
+
+def test_responses_are_copied_only_when_served_stale():
+    guard, table, _ = guarded(cache_entries=8)
+    fresh = guard.get_item(Key={"pk": "USER#1"})
+    assert next(iter(guard.cache._data.values()))[1] is fresh
+    table.failing = True
+    stale = guard.get_item(Key={"pk": "USER#1"})
+    stale["Item"]["n"] = -1
+    assert stale is not fresh and guard.get_item(Key={"pk": "USER#1"}) == fresh
+
+
+def test_batch_writes_pass_the_breaker():
+    guard, table, _ = guarded(failures=1)
+    table.failing = True
+    with pytest.raises(StorageUnavailable):
+        with guard.batch_writer() as bw:
+            bw.put_item(Item={"pk": "USER#1"})  # the flush on exit fails
+    assert guard.breaker.state == "open"
+    with pytest.raises(StorageUnavailable):
+        with guard.batch_writer():
+            pass
+    assert table.calls == 1
@@ -0,0 +1,14 @@
+import random
+
+import diff_scheduling
+
+
+def test_handler_matches_reference_on_seeded_cases():
+    for i in range(60):
+        case = diff_scheduling.random_case(random.Random(f"46:{i}"), 25)
+        failing = diff_scheduling.check(case)
+        assert failing is None, f"{failing} (case {i}):\n{diff_scheduling.dump(diff_scheduling.shrink(case, failing))}"
+
+
+def test_handler_matches_reference_on_a_large_calendar():
+    assert diff_scheduling.check(diff_scheduling.big_case(500, 46)) is None
@@ -0,0 +1,104 @@
+"""The same operations against every backend: memory, sqlite and DynamoDB (on LocalTable)."""
+import time
+
+import pytest
+
+import storage
+from localtable import LocalTable
+
+USER = "USER#parity"
+
+
+@pytest.fixture(params=["memory", "sqlite", "dynamodb"])
+def repo(request, tmp_path):
+    if request.param == "memory":
+        return storage.MemoryRepository()
+    if request.param == "sqlite":
+        return storage.SqliteRepository(str(tmp_path / "parity.db"))
+    return storage.DynamoRepository(LocalTable("parity"))
+
+
+def plain(d, keys):
+    return {k: int(d[k]) if k in ("leaseUntil", "startedAt", "done") else d[k] for k in keys if k in d}
+
+
+def drain(page, limit):
+    seen, after, pages = [], None, 0
+    while True:
+        items, after = page(after, limit)
+        seen += items
+        pages += 1
+        if not after:
+            return seen, pages
+
+
+def test_paging_visits_every_item_once_in_order(repo):
+    for u in ("USER#a", "USER#b", "USER#c"):
+        repo.bump_version(u)
+    got, _ = drain(lambda after, limit: repo.users_page(after, limit), 1)
+    assert sorted(u["userPk"] for u in got) == ["USER#a", "USER#b", "USER#c"]
+    events = [{"eventId": f"ev{i:02d}", "title": f"e{i}", "startISO": f"2026-03-{1 + i:02d}T08:00:00Z",
+               "endISO": f"2026-03-{1 + i:02d}T09:00:00Z", "immutable": True, "source": "app"} for i in range(11)]
+    repo.put_events(USER, reversed(events))
+    repo.put_tasks(USER, [{"taskId": f"t{i:02d}", "title": "t", "durationMin": 30, "category": "", "notes": "",
+                           "createdAt": "2026-03-01T00:00:00Z"} for i in range(7)])
+    got, pages = drain(lambda after, limit: repo.events_page(USER, after, limit), 4)
+    assert [e["eventId"] for e in got] == [e["eventId"] for e in events] and pages >= 3
+    got, _ = drain(lambda after, limit: repo.tasks_page(USER, after, limit), 3)
+    assert sorted(t["taskId"] for t in got) == [f"t{i:02d}" for i in range(7)]
+
+
+def test_claim_idempotency(repo):
+    now = int(time.time())
+    pending = {"state": "pending", "lockedAt": now, "ttl": now + 3600}
+    assert repo.claim_idempotency(USER, "k1", pending, now - 60)
+    assert not repo.claim_idempotency(USER, "k1", pending, now - 60)  # in flight
+    assert repo.claim_idempotency(USER, "k1", pending, now + 1)  # pending but stale
+    repo.put_idempotency(USER, "k1", {"state": "done", "lockedAt": now, "ttl": now + 3600, "status": 201})
+    assert not repo.claim_idempotency(USER, "k1", pending, now + 1)  # done is never reclaimed
+    assert repo.get_idempotency(USER, "k1")["status"] == 201
+    repo.delete_idempotency(USER, "k1")
+    assert repo.get_idempotency(USER, "k1") is None
+    assert repo.claim_idempotency(USER, "k1", pending, now - 60)
+
+
+def test_expired_records_are_gone_before_they_are_deleted(repo):
+    now = int(time.time())
+    repo.put_idempotency(USER, "old", {"state": "done", "lockedAt": now - 7200, "ttl": now - 1, "status": 201})
+    assert repo.get_idempotency(USER, "old") is None
+    assert repo.claim_idempotency(USER, "old", {"state": "pending", "lockedAt": now, "ttl": now + 3600}, now - 60)
+    for seq, ttl in ((1, now - 1), (2, now - 1), (3, now + 3600)):
+        repo.put_change(USER, {"seq": seq, "entity": "TASK", "id": f"t{seq}", "op": "delete", "at": now, "ttl": ttl})
+    changes, more = repo.changes_after(USER, 0, 10)
+    assert [c["seq"] for c in changes] == [3] and not more  # a delete's tombstone expires with it
+    repo.purge_expired(now)
+    assert [c["seq"] for c in repo.changes_after(USER, 0, 10)[0]] == [3]
+
+
+def test_jobs_are_leased_to_one_owner(repo):
+    job = repo.claim_job("j", "r1", "a", 100, 50)
+    assert plain(job, ("runId", "status", "owner", "leaseUntil", "startedAt")) == \
+        {"runId": "r1", "status": "running", "owner": "a", "leaseUntil": 100, "startedAt": 50}
+    assert repo.claim_job("j", "r1", "b", 120, 60) is None  # leased to a
+    assert repo.claim_job("j", "r1", "a", 130, 60)["leaseUntil"] == 130  # renewing its own lease
+    assert not repo.save_job("j", "r1", "b", {"cursor": "x", "leaseUntil": 140, "status": "running"})
+    assert repo.save_job("j", "r1", "a", {"cursor": "x", "leaseUntil": 140, "status": "running"})
+    job = repo.claim_job("j", "r1", "b", 200, 150)  # lease passed: b takes over where a got to
+    assert job["owner"] == "b" and job["cursor"] == "x" and int(job["startedAt"]) == 50
+    assert repo.save_job("j", "r1", "b", {"leaseUntil": 200, "status": "done"})
+    assert repo.claim_job("j", "r1", "c", 300, 400) is None  # done
+
+
+def test_replace_day_stats_only_at_the_version_read(repo):
+    repo.add_day_stats(USER, "2026-03-01", 2, 60)
+    repo.add_day_stats(USER, "2026-03-02", 1, 30)
+    version = repo.bump_version(USER)
+    assert repo.replace_day_stats(USER, {"2026-03-02": (1, 30), "2026-03-03": (1, 15)}, version)
+    assert repo.day_stats(USER, "2026-03-01", "2026-03-31") == [
+        {"date": "2026-03-02", "events": 1, "busyMin": 30}, {"date": "2026-03-03", "events": 1, "busyMin": 15}]
+    repo.bump_version(USER)
+    repo.add_day_stats(USER, "2026-03-03", 1, 15)
+    assert not repo.replace_day_stats(USER, {}, version)
+    assert len(repo.day_stats(USER, "2026-03-01", "2026-03-31")) == 2
+    assert repo.replace_day_stats(USER, {}, repo.get_version(USER))
+    assert repo.day_stats(USER, "2026-03-01", "2026-03-31") == []
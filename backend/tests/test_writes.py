@@ -0,0 +1,70 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import app
+import storage
+from localtable import LocalTable
+
+
+class FailingOnce(LocalTable):
+    """Fails the next TransactWriteItems, as a throttled or cancelled transaction would."""
+
+    fail_next = False
+
+    def transact_write_items(self, **kwargs):
+        if self.fail_next:
+            self.fail_next = False
+            raise ClientError({"Error": {"Code": "TransactionCanceledException", "Message": "cancelled"}},
+                              "TransactWriteItems")
+        return super().transact_write_items(**kwargs)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    t = FailingOnce("writes")
+    monkeypatch.setattr(app, "REPO", storage.DynamoRepository(t))
+    return t
+
+
+def call(method, path, body=None, qs=None, etag=None):
+    headers = {"X-Debug-User": "writer"}
+    if etag:
+        headers["If-None-Match"] = etag
+    r = app.handler({"httpMethod": method, "path": path, "headers": headers, "queryStringParameters": qs,
+                     "body": json.dumps(body) if body is not None else None}, None)
+    return r["statusCode"], json.loads(r["body"]) if r.get("body") else None, r["headers"]
+
+
+EVENT = {"title": "standup", "startISO": "2026-03-02T08:00:00Z", "endISO": "2026-03-02T09:00:00Z"}
+
+
+def test_item_counters_and_change_are_one_transaction(table):
+    call("POST", "/events", EVENT)
+    assert table.calls["TransactWriteItems"] == 1
+    assert table.calls["PutItem"] == 0 and table.calls["UpdateItem"] == 1  # only the version bump
+    _, body, _ = call("GET", "/summary/month", qs={"month": "2026-03"})
+    assert [d for d in body["days"] if d["events"]] == [{"date": "2026-03-02", "events": 1, "busyMin": 60}]
+
+
+def test_a_failed_write_moves_the_version_and_nothing_else(table, monkeypatch):
+    _, cursor, _ = call("GET", "/changes")
+    _, _, headers = call("GET", "/tasks")
+    tag = headers["ETag"]
+
+    table.fail_next = True
+    status, _, _ = call("POST", "/events", EVENT)
+    assert status == 500
+    assert not [k for k in table.items if k[1].startswith(("EVENT#", "DAYSTAT#", "CHANGE#"))]
+    # The version moved, so nothing cached before the failed write stays current
+    status, _, _ = call("GET", "/tasks", etag=tag)
+    assert status == 200
+
+    # The seq the failed write took is never filled: skipped once the grace has passed
+    call("POST", "/tasks", {"title": "after", "durationMin": 30})
+    status, body, headers = call("GET", "/changes", qs={"since": cursor["cursor"]})
+    assert status == 200 and body["changes"] == [] and headers["Cache-Control"] == "no-store"
+    monkeypatch.setattr(app, "CHANGE_HOLE_GRACE_SECONDS", 0)
+    status, body, _ = call("GET", "/changes", qs={"since": cursor["cursor"]})
+    assert status == 200 and [c["seq"] for c in body["changes"]] == [2]
@@ -0,0 +1,15 @@
+"""Shared setup for the local tools: make `backend/handler` importable without AWS."""
+import os
+import sys
+
+HANDLER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "handler")
+
+
+def load_app():
+    """Import the Lambda module. boto3 only needs a region to build the (unused) resource."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("TABLE_NAME", "local-scheduler")
+    if HANDLER_DIR not in sys.path:
+        sys.path.insert(0, HANDLER_DIR)
+    import app
+    return app
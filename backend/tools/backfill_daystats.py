@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Rebuild the DAYSTAT# per-day counters of users from their events.
+
+Needed once for users whose events predate the counters, or to repair drift.
+Runs against the table in TABLE_NAME with the ambient AWS credentials.
+`--all` rebuilds every user as a batchscan job: a parallel scan in
+`--segments` segments, paced to `--rcu` read units per second and
+checkpointed, so running it again with the same `--run-id` resumes it.
+
+    TABLE_NAME=SchedulerTable python backend/tools/backfill_daystats.py --user <cognito-sub> [--user ...]
+    TABLE_NAME=SchedulerTable python backend/tools/backfill_daystats.py --all --segments 8 --rcu 200
+"""
+import argparse
+import time
+
+from _bootstrap import load_app
+
+app = load_app()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    who = ap.add_mutually_exclusive_group(required=True)
+    who.add_argument("--user", action="append", help="user id without the USER# prefix")
+    who.add_argument("--all", action="store_true", help="every user in the table")
+    ap.add_argument("--segments", type=int, default=app.batchscan.SCAN_SEGMENTS)
+    ap.add_argument("--rcu", type=float, default=app.batchscan.SCAN_RCU_BUDGET, help="RCU/s budget, 0 = unpaced")
+    ap.add_argument("--run-id", default=time.strftime("%Y-%m-%d"), help="same id = resume that run")
+    args = ap.parse_args()
+    if args.all:
+        job = app.batchscan.ScanJob(
+            "backfill-daystats",
+            source=lambda segment, total, after, limit: app.REPO.users_page(after, limit, segment, total),
+            process=lambda user: app.rebuild_day_stats(user["userPk"]) >= 0,
+            segments=args.segments,
+            rcu_budget=args.rcu,
+        )
+        print(job.start(app.REPO, args.run_id))
+        return
+    for uid in args.user:
+        days = app.rebuild_day_stats(f"USER#{uid}")
+        print(f"{uid}: {days} days" if days >= 0 else f"{uid}: written to meanwhile, run again")
+
+
+if __name__ == "__main__":
+    main()
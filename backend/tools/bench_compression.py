@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""CPU cost vs. bytes saved for response compression.
+
+Builds `GET /events`-shaped bodies of increasing size and runs them through the
+handler's own `compress_body`, so the numbers match what production does.
+
+    python backend/tools/bench_compression.py
+    python backend/tools/bench_compression.py --sizes 5,50,500 --json out.json
+"""
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from _bootstrap import load_app
+
+app = load_app()
+
+
+def events_body(n: int) -> str:
+    start = datetime(2025, 10, 1, 8, tzinfo=timezone.utc)
+    events = []
+    for i in range(n):
+        s = start + timedelta(minutes=95 * i)
+        events.append({
+            "eventId": f"ev_{i:08x}",
+            "title": f"Meeting #{i} with team",
+            "startISO": app.iso(s),
+            "endISO": app.iso(s + timedelta(minutes=45)),
+            "immutable": True,
+            "source": "app",
+        })
+    return app.resp(200, {"events": events})["body"]
+
+
+def time_it(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="5,20,100,500,2000", help="event counts per body")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--json", help="write machine-readable results here")
+    args = ap.parse_args()
+
+    codings = [("gzip-1", lambda b: gzip.compress(b, compresslevel=1, mtime=0)),
+               ("gzip-6", lambda b: app.compress_body(b, ["gzip"])[1]),
+               ("gzip-9", lambda b: gzip.compress(b, compresslevel=9, mtime=0))]
+    if app.brotli is not None:
+        codings.append((f"br-{app.BROTLI_QUALITY}", lambda b: app.compress_body(b, ["br"])[1]))
+
+    rows = []
+    print(f"{'events':>7} {'coding':>7} {'raw B':>9} {'out B':>9} {'ratio':>6} {'cpu ms':>8} {'KB saved/ms':>12}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        raw = events_body(n).encode("utf-8")
+        for name, fn in codings:
+            out = fn(raw)
+            secs = time_it(lambda: fn(raw), args.repeat)
+            saved_kb = (len(raw) - len(out)) / 1024
+            row = {
+                "events": n, "coding": name, "raw_bytes": len(raw), "out_bytes": len(out),
+                "ratio": round(len(raw) / max(len(out), 1), 2), "cpu_ms": round(secs * 1000, 4),
+                "kb_saved_per_ms": round(saved_kb / max(secs * 1000, 1e-9), 1),
+            }
+            rows.append(row)
+            print(f"{n:>7} {name:>7} {row['raw_bytes']:>9} {row['out_bytes']:>9} {row['ratio']:>6} "
+                  f"{row['cpu_ms']:>8} {row['kb_saved_per_ms']:>12}")
+
+    print(f"\nCOMPRESS_MIN_BYTES is {app.COMPRESS_MIN_BYTES}; bodies below it are sent uncompressed.")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"threshold": app.COMPRESS_MIN_BYTES, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
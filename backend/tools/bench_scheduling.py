@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Microbenchmarks for the scheduling helpers behind POST /suggest.
+
+Runs the handler's own functions on deterministic synthetic calendars (busy
+weekdays, overlapping meetings, 9-18 availability) and reports, per helper and
+calendar size: calls/sec, the per-call time, and what one call allocates
+(tracemalloc peak and live blocks in its result). Results can be saved as JSON
+and compared against an earlier run.
+
+    python backend/tools/bench_scheduling.py
+    python backend/tools/bench_scheduling.py --sizes 10,1000 --only merge,subtract
+    python backend/tools/bench_scheduling.py --json after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from _bootstrap import load_app
+
+app = load_app()
+
+NOW = datetime(2025, 1, 6, 6, tzinfo=timezone.utc)  # a Monday morning; fixed so scores are stable
+TZ = "Asia/Jerusalem"
+WEEKLY = {d: [["09:00", "18:00"]] for d in ("Mon", "Tue", "Wed", "Thu", "Fri")}
+DURATION = timedelta(minutes=60)
+STEP = timedelta(minutes=30)
+
+
+def calendar(n: int, seed: int = 7):
+    """`n` events, about six per weekday from NOW on, as stored items (startISO/endISO)."""
+    rnd = random.Random(seed)
+    events = []
+    day = NOW.replace(hour=0)
+    while len(events) < n:
+        if day.weekday() < 5:
+            for _ in range(min(rnd.randint(3, 9), n - len(events))):
+                s = day + timedelta(hours=5, minutes=15 * rnd.randrange(0, 48))
+                e = s + timedelta(minutes=rnd.choice((15, 30, 30, 45, 60, 60, 90, 120)))
+                events.append({"startISO": app.iso(s), "endISO": app.iso(e)})
+        day += timedelta(days=1)
+    rnd.shuffle(events)
+    return events, NOW, day + timedelta(days=1)
+
+
+class Fixture:
+    """Every intermediate of the suggest pipeline for one calendar, built once."""
+
+    def __init__(self, n: int):
+        self.events, self.start, self.end = calendar(n)
+        self.raw = [(app.parse_iso(e["startISO"]), app.parse_iso(e["endISO"])) for e in self.events]
+        self.busy = app.merge_intervals(self.raw)
+        self.days = list(app.daterange_utc(self.start, self.end))
+        self.avail = app.availability_intervals(WEEKLY, TZ, self.start, self.end)
+        self.free = app.subtract_intervals(self.avail, self.busy)
+        self.candidates = [c for fs, fe in self.free for c in app.step_candidates_in_interval(fs, fe, DURATION, STEP)]
+
+
+def suggest_pipeline(f: Fixture):
+    """What handle_suggest computes once its two reads are done."""
+    avail = app.availability_intervals(WEEKLY, TZ, f.start, f.end)
+    free = app.subtract_intervals(avail, app.events_to_intervals(f.events))
+    return app.top_candidates(free, DURATION, STEP, 5, NOW)
+
+
+# name -> (fn(fixture), inner operations per call, description of one operation)
+CASES = {
+    "merge": (lambda f: app.merge_intervals(f.raw), lambda f: len(f.raw), "interval"),
+    "subtract": (lambda f: app.subtract_intervals(f.avail, f.busy), lambda f: len(f.avail), "free window"),
+    "local_day_windows": (lambda f: [app.local_day_windows_to_utc(d, WEEKLY, TZ) for d in f.days],
+                          lambda f: len(f.days), "day"),
+    "step_candidates": (lambda f: [app.step_candidates_in_interval(fs, fe, DURATION, STEP) for fs, fe in f.free],
+                        lambda f: len(f.free), "free interval"),
+    "rank": (lambda f: app.rank_candidates(f.candidates, f.free, NOW), lambda f: len(f.candidates), "candidate"),
+    "top_candidates": (lambda f: app.top_candidates(f.free, DURATION, STEP, 5, NOW), lambda f: len(f.free),
+                       "free interval"),
+    "suggest": (suggest_pipeline, lambda f: len(f.events), "event"),
+}
+
+
+def measure(fn, min_time: float, max_calls: int):
+    """Best and mean seconds per call over as many calls as fit in `min_time` (at least one)."""
+    times = []
+    t_end = time.perf_counter() + min_time
+    while len(times) < max_calls and (not times or time.perf_counter() < t_end):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), sum(times) / len(times), len(times)
+
+
+def allocations(fn):
+    """(peak bytes, live blocks held by the result) for a single call."""
+    tracemalloc.start()
+    try:
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        blocks = sum(s.count for s in tracemalloc.take_snapshot().statistics("filename"))
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, blocks
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="10,1000,50000", help="events per synthetic calendar")
+    ap.add_argument("--only", help=f"comma-separated subset of: {','.join(CASES)}")
+    ap.add_argument("--min-time", type=float, default=0.5, help="seconds of timed calls per case")
+    ap.add_argument("--max-calls", type=int, default=10000)
+    ap.add_argument("--json", help="write machine-readable results here")
+    ap.add_argument("--compare", help="earlier --json output to show speedups against")
+    args = ap.parse_args()
+
+    names = args.only.split(",") if args.only else list(CASES)
+    unknown = set(names) - set(CASES)
+    if unknown:
+        ap.error(f"unknown cases: {','.join(sorted(unknown))}")
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r["case"], r["events"]): r for r in json.load(f)["results"]}
+
+    rows = []
+    print(f"{'case':>18} {'events':>7} {'ops/call':>9} {'calls':>6} {'best ms':>10} {'calls/s':>10} "
+          f"{'ops/s':>11} {'peak KiB':>9} {'blocks':>8}" + (f" {'vs base':>8}" if baseline else ""))
+    for n in [int(x) for x in args.sizes.split(",")]:
+        fixture = Fixture(n)
+        for name in names:
+            fn, ops_of, unit = CASES[name]
+            call = lambda: fn(fixture)  # noqa: E731
+            ops = ops_of(fixture)
+            best, mean, calls = measure(call, args.min_time, args.max_calls)
+            peak, blocks = allocations(call)
+            row = {
+                "case": name, "events": n, "ops_per_call": ops, "op": unit, "calls": calls,
+                "best_ms": round(best * 1000, 4), "mean_ms": round(mean * 1000, 4),
+                "calls_per_sec": round(1 / best, 2), "ops_per_sec": round(ops / best, 1),
+                "peak_bytes": peak, "result_blocks": blocks,
+            }
+            rows.append(row)
+            line = (f"{name:>18} {n:>7} {ops:>9} {calls:>6} {row['best_ms']:>10} {row['calls_per_sec']:>10} "
+                    f"{row['ops_per_sec']:>11} {peak // 1024:>9} {blocks:>8}")
+            base = baseline.get((name, n))
+            if base:
+                line += f" {base['best_ms'] / max(row['best_ms'], 1e-9):>7.2f}x"
+            print(line, flush=True)
+
+    if args.json:
+        meta = {"python": platform.python_version(), "machine": platform.machine(), "git": git_rev(),
+                "at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Which routes and users consume the most DynamoDB capacity.
+
+Reads the handler's log output (files or stdin; CloudWatch exports with a
+timestamp before the JSON are fine) and sums the consumed read/write capacity
+units per route, per user, or per route and user. The `"request"` log lines
+are used when present (they carry `rcu`/`wcu`); otherwise the EMF metric lines
+(`RCU`/`WCU` with Route and User):
+
+    aws logs tail /aws/lambda/scheduler --since 1h > lambda.log
+    python backend/tools/capacity_report.py lambda.log
+    python backend/tools/capacity_report.py lambda.log --by user --top 20
+    python backend/tools/capacity_report.py --by route,user < lambda.log
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+KEYS = ("route", "user", "route,user")
+
+
+def records(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for line in lines:
+        start = line.find("{")
+        if start < 0:
+            continue
+        try:
+            rec = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(rec, dict):
+            yield rec
+
+
+def usage(rec: Dict[str, Any]) -> Optional[Tuple[str, str, str, float, float]]:
+    """(source, route, user, rcu, wcu) for a request log line or an EMF line, else None."""
+    if rec.get("msg") == "request" and "rcu" in rec:
+        return "log", rec.get("route") or "?", rec.get("user") or "-", float(rec["rcu"]), float(rec.get("wcu", 0))
+    if "_aws" in rec and "Route" in rec:
+        return ("emf", rec["Route"], rec.get("User") or "-",
+                float(rec.get("RCU", 0)), float(rec.get("WCU", 0)))
+    return None
+
+
+def aggregate(rows: List[Tuple[str, str, str, float, float]], by: str) -> Dict[Tuple[str, ...], List[float]]:
+    """{key: [requests, rcu, wcu]}, from the request log lines if there are any."""
+    source = "log" if any(r[0] == "log" for r in rows) else "emf"
+    totals: Dict[Tuple[str, ...], List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+    for src, route, user, rcu, wcu in rows:
+        if src != source:
+            continue
+        key = {"route": (route,), "user": (user,), "route,user": (route, user)}[by]
+        t = totals[key]
+        t[0] += 1
+        t[1] += rcu
+        t[2] += wcu
+    return totals
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("files", nargs="*", help="log files (default: stdin)")
+    ap.add_argument("--by", choices=KEYS, default="route")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--sort", choices=("total", "rcu", "wcu", "per-request"), default="total")
+    ap.add_argument("--json", help="also write the full table here")
+    args = ap.parse_args()
+
+    rows = []
+    for name in args.files or ["-"]:
+        f = sys.stdin if name == "-" else open(name, encoding="utf-8", errors="replace")
+        try:
+            rows += [u for u in map(usage, records(f)) if u]
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    if not rows:
+        sys.exit("no request or EMF lines with consumed capacity found")
+
+    totals = aggregate(rows, args.by)
+    sort_key = {
+        "total": lambda kv: kv[1][1] + kv[1][2], "rcu": lambda kv: kv[1][1], "wcu": lambda kv: kv[1][2],
+        "per-request": lambda kv: (kv[1][1] + kv[1][2]) / kv[1][0],
+    }[args.sort]
+    ranked = sorted(totals.items(), key=sort_key, reverse=True)
+    all_rcu = sum(t[1] for t in totals.values())
+    all_wcu = sum(t[2] for t in totals.values())
+    all_n = int(sum(t[0] for t in totals.values()))
+
+    width = max([len(" ".join(k)) for k, _ in ranked[:args.top]] + [len(args.by)])
+    print(f"{args.by:<{width}} {'requests':>9} {'RCU':>10} {'WCU':>10} {'RCU/req':>8} {'WCU/req':>8} {'share':>6}")
+    for key, (n, rcu, wcu) in ranked[:args.top]:
+        share = (rcu + wcu) / max(all_rcu + all_wcu, 1e-9) * 100
+        print(f"{' '.join(key):<{width}} {int(n):>9} {rcu:>10.1f} {wcu:>10.1f} {rcu / n:>8.2f} {wcu / n:>8.2f} "
+              f"{share:>5.1f}%")
+    print(f"\n{all_n} requests, {len(totals)} {args.by} keys: {all_rcu:.1f} RCU, {all_wcu:.1f} WCU "
+          f"({(all_rcu + all_wcu) / max(all_n, 1):.2f} units/request)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([{"key": list(k), "requests": int(n), "rcu": round(r, 3), "wcu": round(w, 3)}
+                       for k, (n, r, w) in ranked], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Differential check of the handler's gap finder against the frozen reference.
+
+Generates random cases (weekly availability in a random timezone, a range
+that often straddles a DST change, events that overlap, touch, duplicate and
+spill over the range edges, random duration/step/k and "now"). For each case
+it compares, handler vs `scheduling_reference`:
+
+- merge_intervals on the raw event intervals
+- subtract_intervals of the busy time from the availability (merged and raw blocks)
+- rank_candidates over every step candidate
+- top_candidates (and paging through it with `after`) against the fully ranked list
+
+A mismatch is shrunk (events, then availability windows, dropped one at a
+time while it still fails) and printed as JSON with the seed that reproduces
+it; the exit status is 1. Afterwards both engines are timed on the same
+inputs, on the random cases and on large calendars:
+
+    python backend/tools/diff_scheduling.py
+    python backend/tools/diff_scheduling.py --cases 2000 --seed 7 --scale 1000,20000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import scheduling_reference as ref
+from _bootstrap import load_app
+
+app = load_app()
+
+TIMEZONES = ("UTC", "Asia/Jerusalem", "Europe/London", "America/New_York", "Australia/Sydney", "Asia/Kolkata")
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+# Ranges often start just before a DST change somewhere
+PIVOTS = [datetime(2026, 3, 8, tzinfo=timezone.utc), datetime(2026, 3, 27, tzinfo=timezone.utc),
+          datetime(2026, 4, 3, tzinfo=timezone.utc), datetime(2026, 10, 23, tzinfo=timezone.utc),
+          datetime(2026, 10, 30, tzinfo=timezone.utc), datetime(2026, 6, 15, tzinfo=timezone.utc)]
+
+
+def hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def random_case(rnd: random.Random, max_events: int) -> Dict[str, Any]:
+    weekly = {}
+    for d in DAYS:
+        windows = []
+        for _ in range(rnd.choice((0, 1, 1, 1, 2, 3))):
+            s = 15 * rnd.randrange(0, 92)
+            e = min(24 * 60 - 1, s + 15 * rnd.randrange(1, 40))
+            windows.append([hhmm(s), hhmm(e)])
+        if windows:
+            weekly[d] = windows
+    start = rnd.choice(PIVOTS) + timedelta(minutes=15 * rnd.randrange(-7 * 96, 96))
+    end = start + timedelta(hours=rnd.randrange(1, 24 * 21))
+    events = []
+    for _ in range(rnd.randrange(0, max_events + 1)):
+        if events and rnd.random() < 0.2:  # touch, contain or duplicate an earlier one
+            s0, e0 = rnd.choice(events)
+            s = rnd.choice((e0, s0, s0 + (e0 - s0) / 2))
+        else:
+            s = start + timedelta(minutes=5 * rnd.randrange(-200, int((end - start).total_seconds() // 300) + 200))
+        events.append((s, s + timedelta(minutes=rnd.choice((5, 10, 15, 30, 45, 60, 90, 120, 600)))))
+    return {
+        "tz": rnd.choice(TIMEZONES), "weekly": weekly, "start": start, "end": end, "events": events,
+        "duration": timedelta(minutes=rnd.choice((15, 30, 45, 60, 90, 120, 240))),
+        "step": timedelta(minutes=rnd.choice((5, 15, 30, 60))),
+        "k": rnd.randint(1, 12),
+        "now": start + timedelta(hours=rnd.randrange(-48, 48)),
+    }
+
+
+def inputs(case: Dict[str, Any]):
+    avail = app.availability_intervals(case["weekly"], case["tz"], case["start"], case["end"])
+    return avail, list(case["events"])
+
+
+def candidates(free, case):
+    return [c for fs, fe in free for c in ref.step_candidates_in_interval(fs, fe, case["duration"], case["step"])]
+
+
+def paged(free, case) -> List[Any]:
+    """Everything top_candidates returns when paged k at a time, as the /suggest cursor does."""
+    out: List[Any] = []
+    after: Optional[Tuple[float, datetime]] = None
+    while True:
+        page = app.top_candidates(free, case["duration"], case["step"], case["k"], case["now"], after)
+        out += page
+        if len(page) < case["k"]:
+            return out
+        after = (page[-1][1], page[-1][0][0])
+
+
+def check(case: Dict[str, Any]) -> Optional[str]:
+    """Name of the first property that fails, or None."""
+    avail, raw = inputs(case)
+    if app.merge_intervals(raw) != ref.merge_intervals(raw):
+        return "merge_intervals"
+    busy = ref.merge_intervals(raw)
+    if app.subtract_intervals(avail, raw) != ref.subtract_intervals(avail, raw):
+        return "subtract_intervals(raw blocks)"
+    free = ref.subtract_intervals(avail, busy)
+    if app.subtract_intervals(avail, busy) != free:
+        return "subtract_intervals"
+    cands = candidates(free, case)
+    full = ref.rank_candidates(cands, free, case["now"])
+    if app.rank_candidates(cands, free, case["now"]) != full:
+        return "rank_candidates"
+    if app.top_candidates(free, case["duration"], case["step"], case["k"], case["now"]) != full[:case["k"]]:
+        return "top_candidates"
+    if paged(free, case) != full:
+        return "top_candidates(paged)"
+    return None
+
+
+def shrink(case: Dict[str, Any], failing: str) -> Dict[str, Any]:
+    """Drop events, then availability windows, one at a time while the same property keeps failing."""
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(case["events"]) - 1, -1, -1):
+            trial = {**case, "events": case["events"][:i] + case["events"][i + 1:]}
+            if check(trial) == failing:
+                case, changed = trial, True
+        for day in list(case["weekly"]):
+            for j in range(len(case["weekly"][day]) - 1, -1, -1):
+                windows = case["weekly"][day][:j] + case["weekly"][day][j + 1:]
+                weekly = {**case["weekly"], day: windows} if windows else \
+                    {d: w for d, w in case["weekly"].items() if d != day}
+                trial = {**case, "weekly": weekly}
+                if check(trial) == failing:
+                    case, changed = trial, True
+                    break
+    return case
+
+
+def dump(case: Dict[str, Any]) -> str:
+    def enc(v):
+        if isinstance(v, datetime):
+            return app.iso(v)
+        if isinstance(v, timedelta):
+            return int(v.total_seconds() // 60)
+        return str(v)
+    return json.dumps({k: v for k, v in case.items() if k not in ("duration", "step")}
+                      | {"duration_min": case["duration"], "step_min": case["step"]}, default=enc)
+
+
+# ---- timing ---------------------------------------------------------------------
+
+def timed(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_row(label: str, cases: List[Dict[str, Any]], repeat: int) -> List[Tuple[str, str, float, float]]:
+    """(label, op, reference seconds, handler seconds), summed over `cases`."""
+    prepared = []
+    for c in cases:
+        avail, raw = inputs(c)
+        busy = ref.merge_intervals(raw)
+        free = ref.subtract_intervals(avail, busy)
+        prepared.append((c, avail, raw, busy, free, candidates(free, c)))
+    ops = {
+        "merge_intervals": (lambda p: ref.merge_intervals(p[2]), lambda p: app.merge_intervals(p[2])),
+        "subtract_intervals": (lambda p: ref.subtract_intervals(p[1], p[3]),
+                               lambda p: app.subtract_intervals(p[1], p[3])),
+        "rank_candidates": (lambda p: ref.rank_candidates(p[5], p[4], p[0]["now"]),
+                            lambda p: app.rank_candidates(p[5], p[4], p[0]["now"])),
+        "top-k suggest": (lambda p: ref.suggest(p[4], p[0]["duration"], p[0]["step"], p[0]["k"], p[0]["now"]),
+                          lambda p: app.top_candidates(p[4], p[0]["duration"], p[0]["step"], p[0]["k"],
+                                                       p[0]["now"])),
+    }
+    rows = []
+    for op, (ref_fn, app_fn) in ops.items():
+        r = sum(timed(lambda: ref_fn(p), repeat) for p in prepared)
+        a = sum(timed(lambda: app_fn(p), repeat) for p in prepared)
+        rows.append((label, op, r, a))
+    return rows
+
+
+def big_case(n: int, seed: int) -> Dict[str, Any]:
+    """A busy calendar: `n` events over office hours, ~6 a working day."""
+    rnd = random.Random(seed)
+    start = datetime(2026, 3, 2, 6, tzinfo=timezone.utc)
+    days = max(1, n // 6 * 7 // 5)
+    events = []
+    for _ in range(n):
+        s = start + timedelta(days=rnd.randrange(days), minutes=15 * rnd.randrange(0, 56))
+        events.append((s, s + timedelta(minutes=rnd.choice((15, 30, 30, 45, 60, 60, 90, 120)))))
+    return {"tz": "Asia/Jerusalem", "weekly": {d: [["09:00", "18:00"]] for d in DAYS[:5]}, "start": start,
+            "end": start + timedelta(days=days), "events": events, "duration": timedelta(minutes=60),
+            "step": timedelta(minutes=30), "k": 5, "now": start}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--cases", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--max-events", type=int, default=60, help="events per random case")
+    ap.add_argument("--scale", default="1000,10000", help="event counts of the large timed calendars")
+    ap.add_argument("--repeat", type=int, default=3, help="timing runs per input (best is kept)")
+    args = ap.parse_args()
+
+    cases = []
+    for i in range(args.cases):
+        case = random_case(random.Random(f"{args.seed}:{i}"), args.max_events)
+        failing = check(case)
+        if failing:
+            small = shrink(case, failing)
+            print(f"MISMATCH in {failing} (case {i}, --seed {args.seed}); shrunk to "
+                  f"{len(small['events'])} events:\n{dump(small)}")
+            sys.exit(1)
+        cases.append(case)
+    print(f"{args.cases} random cases: handler == reference on merge, subtract, rank, top-k and paging")
+
+    big = []
+    for n in [int(x) for x in args.scale.split(",") if x]:
+        case = big_case(n, args.seed)
+        failing = check(case)
+        if failing:
+            print(f"MISMATCH in {failing} on the {n}-event calendar")
+            sys.exit(1)
+        big.append((f"{n} events", case))
+
+    rows = bench_row(f"{args.cases} random", cases, args.repeat)
+    for label, case in big:
+        rows += bench_row(label, [case], 1 if len(case["events"]) > 5000 else args.repeat)
+    print(f"\n{'inputs':>14} {'operation':>20} {'reference ms':>13} {'handler ms':>11} {'speedup':>8}")
+    for label, op, r, a in rows:
+        print(f"{label:>14} {op:>20} {r * 1000:>13.2f} {a * 1000:>11.2f} {r / max(a, 1e-9):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic calendars for benchmarks and load tests.
+
+Generates per-user data in the real schema (events, tasks, weekly
+availability, plus the DAYSTAT aggregates the month view reads) and bulk-loads
+it through a storage repository, so DynamoDB gets EVENT#/TASK#/AVAIL# items
+with gsi1 keys via BatchWriteItem and SQLite one transaction per user:
+
+    python backend/tools/gen_workload.py --users 500 --target sqlite --sqlite-path /tmp/bench.db
+    TABLE_NAME=SchedulerTable-dev python backend/tools/gen_workload.py --users 2000 --target dynamodb
+    python backend/tools/gen_workload.py --users 10000 --target memory   # just the shape report
+
+What is tunable: events per user-week (density), the event length mix,
+how many events fall outside working hours, and how skewed users are
+(per-user multiplier drawn from a Pareto distribution, so a few heavy users
+hold a large share of the events). Each user gets a timezone and an
+availability template; the default range starts 2026-03-02 and spans six
+weeks, which crosses the US, EU and Australian DST changes. The same
+--seed always produces the same users, ids and times.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from _bootstrap import load_app
+
+app = load_app()
+
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# (timezone, weight): a mix of DST rules, half-hour offsets and the southern hemisphere
+TIMEZONES = (
+    ("Asia/Jerusalem", 4), ("Europe/London", 3), ("Europe/Berlin", 3), ("America/New_York", 4),
+    ("America/Los_Angeles", 3), ("Asia/Kolkata", 2), ("Australia/Sydney", 1), ("UTC", 1),
+)
+
+# name -> (weekly windows, weight)
+TEMPLATES = {
+    "office": ({d: [["09:00", "17:00"]] for d in DAYS[:5]}, 5),
+    "long-days": ({d: [["08:00", "19:00"]] for d in DAYS[:5]}, 2),
+    "split": ({d: [["09:00", "12:00"], ["13:00", "18:00"]] for d in DAYS[:5]}, 2),
+    "sun-thu": ({d: [["08:30", "17:30"]] for d in ("Sun", "Mon", "Tue", "Wed", "Thu")}, 2),
+    "part-time": ({d: [["10:00", "15:00"]] for d in ("Mon", "Wed", "Fri")}, 1),
+}
+
+DEFAULT_LENGTHS = "15:2,30:6,45:2,60:6,90:2,120:1,240:0.5,480:0.2"
+TITLES = ("1:1", "Standup", "Planning", "Review", "Interview", "Focus", "Lunch", "Customer call",
+          "Design sync", "Dentist", "Gym", "School pickup")
+CATEGORIES = ("", "deep work", "admin", "errands", "learning")
+
+
+def parse_weights(spec: str) -> List[Tuple[int, float]]:
+    """"15:2,30:6" -> [(15, 2.0), (30, 6.0)]"""
+    out = []
+    for part in spec.split(","):
+        minutes, _, weight = part.partition(":")
+        out.append((int(minutes), float(weight or 1)))
+    return out
+
+
+class Profile:
+    """Knobs of one generated population."""
+
+    def __init__(self, users: int = 100, seed: int = 1, start: str = "2026-03-02", weeks: int = 6,
+                 events_per_week: float = 25.0, tasks_per_user: float = 8.0, lengths: str = DEFAULT_LENGTHS,
+                 off_hours: float = 0.1, heavy_alpha: float = 1.5, heavy_cap: float = 40.0,
+                 prefix: str = "gen"):
+        self.users = users
+        self.seed = seed
+        self.start = date.fromisoformat(start)
+        self.weeks = weeks
+        self.events_per_week = events_per_week
+        self.tasks_per_user = tasks_per_user
+        self.lengths = parse_weights(lengths) if isinstance(lengths, str) else list(lengths)
+        self.off_hours = off_hours
+        self.heavy_alpha = heavy_alpha
+        self.heavy_cap = heavy_cap
+        self.prefix = prefix
+
+
+class UserData:
+    def __init__(self, user_pk: str, tz: str, template: str, weekly: Dict[str, List[List[str]]]):
+        self.user_pk = user_pk
+        self.tz = tz
+        self.template = template
+        self.weekly = weekly
+        self.events: List[Dict[str, Any]] = []
+        self.tasks: List[Dict[str, Any]] = []
+
+    def crosses_dst(self, start: date, end: date) -> bool:
+        zone = ZoneInfo(self.tz)
+        return datetime.combine(start, datetime.min.time(), zone).utcoffset() != \
+            datetime.combine(end, datetime.min.time(), zone).utcoffset()
+
+
+def _hhmm(s: str) -> int:
+    h, m = s.split(":")
+    return int(h) * 60 + int(m)
+
+
+def _new_id(rnd: random.Random, prefix: str, seen: set) -> str:
+    while True:
+        ident = f"{prefix}_{rnd.getrandbits(32):08x}"
+        if ident not in seen:
+            seen.add(ident)
+            return ident
+
+
+def generate_user(p: Profile, index: int) -> UserData:
+    """User `index` of the population; depends only on (seed, index)."""
+    rnd = random.Random(f"{p.seed}:{index}")
+    tz = rnd.choices([t for t, _ in TIMEZONES], [w for _, w in TIMEZONES])[0]
+    template = rnd.choices(list(TEMPLATES), [w for _, w in TEMPLATES.values()])[0]
+    u = UserData(f"USER#{p.prefix}-{index:06d}", tz, template, TEMPLATES[template][0])
+    zone = ZoneInfo(tz)
+
+    # Pareto(alpha) has mean alpha/(alpha-1); rescale so the population mean stays events_per_week
+    scale = (p.heavy_alpha - 1) / p.heavy_alpha if p.heavy_alpha > 1 else 1.0
+    multiplier = min(p.heavy_cap, rnd.paretovariate(p.heavy_alpha)) * scale
+    n_events = max(0, round(p.events_per_week * p.weeks * multiplier))
+
+    days = [p.start + timedelta(days=i) for i in range(p.weeks * 7)]
+    day_weights = [1.0 if u.weekly.get(DAYS[d.weekday()]) else 0.1 for d in days]
+    minutes, weights = [m for m, _ in p.lengths], [w for _, w in p.lengths]
+    seen: set = set()
+    for _ in range(n_events):
+        day = rnd.choices(days, day_weights)[0]
+        windows = u.weekly.get(DAYS[day.weekday()])
+        if windows and rnd.random() >= p.off_hours:
+            ws, we = (_hhmm(x) for x in rnd.choice(windows))
+            start_min = ws + 15 * rnd.randrange(max(1, (we - ws) // 15))
+        else:
+            start_min = 15 * rnd.randrange(6 * 4, 22 * 4)  # evenings, weekends, early mornings
+        length = rnd.choices(minutes, weights)[0]
+        local = datetime.combine(day, datetime.min.time(), zone) + timedelta(minutes=start_min)
+        start = local.astimezone(ZoneInfo("UTC"))
+        u.events.append({
+            "eventId": _new_id(rnd, "ev", seen), "title": rnd.choice(TITLES),
+            "startISO": app.iso(start), "endISO": app.iso(start + timedelta(minutes=length)),
+            "immutable": True, "source": "app",
+        })
+
+    n_tasks = round(rnd.expovariate(1 / p.tasks_per_user)) if p.tasks_per_user > 0 else 0
+    for i in range(n_tasks):
+        created = datetime.combine(p.start - timedelta(days=rnd.randrange(0, 30)), datetime.min.time(), zone)
+        u.tasks.append({
+            "taskId": _new_id(rnd, "t", seen), "title": f"Task {i + 1}",
+            "durationMin": rnd.choice((15, 30, 30, 45, 60, 60, 90, 120)),
+            "category": rnd.choice(CATEGORIES), "notes": "",
+            "createdAt": app.iso(created + timedelta(minutes=rnd.randrange(8 * 60, 18 * 60))),
+        })
+    return u
+
+
+def generate(p: Profile) -> Iterator[UserData]:
+    for i in range(p.users):
+        yield generate_user(p, i)
+
+
+def day_totals(events: List[Dict[str, Any]]) -> Dict[str, Tuple[int, int]]:
+    """DAYSTAT rows for a user's events, as the handler's counters would hold them."""
+    totals: Dict[str, List[int]] = {}
+    for ev in events:
+        for day, (n, m) in app.day_stat_deltas(ev["startISO"], ev["endISO"]).items():
+            acc = totals.setdefault(day, [0, 0])
+            acc[0] += n
+            acc[1] += m
+    return {day: (n, m) for day, (n, m) in totals.items()}
+
+
+def load_user(repo, u: UserData):
+    """Bulk-write one user's data; the version bump invalidates ETags cached before the load."""
+    repo.put_availability(u.user_pk, u.weekly, u.tz)
+    repo.put_events(u.user_pk, u.events)
+    repo.put_tasks(u.user_pk, u.tasks)
+    repo.replace_day_stats(u.user_pk, day_totals(u.events), repo.get_version(u.user_pk))
+    repo.bump_version(u.user_pk)
+
+
+def percentile(values: List[int], p: float) -> int:
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0
+
+
+def summary_row(u: UserData, p: Profile) -> Tuple[int, int, str, bool]:
+    """What the report needs from a user, so the generated items need not be kept."""
+    return len(u.events), len(u.tasks), u.tz, u.crosses_dst(p.start, p.start + timedelta(days=7 * p.weeks))
+
+
+def report(rows: List[Tuple[int, int, str, bool]]) -> Dict[str, Any]:
+    counts = sorted(r[0] for r in rows)
+    total = sum(counts) or 1
+    top = counts[-max(1, len(counts) // 100):]
+    by_tz: Dict[str, int] = {}
+    for r in rows:
+        by_tz[r[2]] = by_tz.get(r[2], 0) + 1
+    return {
+        "users": len(rows), "events": sum(counts), "tasks": sum(r[1] for r in rows),
+        "events_per_user": {"min": counts[0] if counts else 0, "p50": percentile(counts, 50),
+                            "p99": percentile(counts, 99), "max": counts[-1] if counts else 0},
+        "top_1pct_share": round(sum(top) / total, 3),
+        "dst_crossing_users": sum(r[3] for r in rows),
+        "timezones": dict(sorted(by_tz.items(), key=lambda kv: -kv[1])),
+    }
+
+
+def repository(target: str, sqlite_path: str):
+    import storage
+    if target == "dynamodb":
+        return storage.DynamoRepository.from_env()
+    if target == "sqlite":
+        return storage.SqliteRepository(sqlite_path)
+    return storage.MemoryRepository()
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--users", type=int, default=100)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--start", default="2026-03-02", help="first day (YYYY-MM-DD)")
+    ap.add_argument("--weeks", type=int, default=6)
+    ap.add_argument("--events-per-week", type=float, default=25.0, help="mean over the population")
+    ap.add_argument("--tasks-per-user", type=float, default=8.0, help="mean (exponentially distributed)")
+    ap.add_argument("--lengths", default=DEFAULT_LENGTHS, help="minutes:weight,... event length mix")
+    ap.add_argument("--off-hours", type=float, default=0.1, help="share of events outside availability")
+    ap.add_argument("--heavy-alpha", type=float, default=1.5, help="Pareto shape; lower = more skewed")
+    ap.add_argument("--heavy-cap", type=float, default=40.0, help="largest per-user multiplier")
+    ap.add_argument("--prefix", default="gen", help="user ids are <prefix>-NNNNNN")
+    ap.add_argument("--target", choices=("memory", "sqlite", "dynamodb"), default="memory",
+                    help="dynamodb writes to TABLE_NAME with the ambient credentials")
+    ap.add_argument("--sqlite-path", default="/tmp/scheduler-gen.db")
+    args = ap.parse_args(argv)
+
+    p = Profile(users=args.users, seed=args.seed, start=args.start, weeks=args.weeks,
+                events_per_week=args.events_per_week, tasks_per_user=args.tasks_per_user,
+                lengths=args.lengths, off_hours=args.off_hours, heavy_alpha=args.heavy_alpha,
+                heavy_cap=args.heavy_cap, prefix=args.prefix)
+    repo = repository(args.target, args.sqlite_path)
+    rows, items = [], 0
+    t0 = time.perf_counter()
+    for u in generate(p):
+        load_user(repo, u)
+        items += len(u.events) + len(u.tasks)
+        rows.append(summary_row(u, p))
+    secs = time.perf_counter() - t0
+
+    rep = report(rows)
+    print(f"{rep['users']} users, {rep['events']} events, {rep['tasks']} tasks -> {args.target} "
+          f"in {secs:.1f}s ({items / max(secs, 1e-9):.0f} items/s)")
+    e = rep["events_per_user"]
+    print(f"events per user: min {e['min']}  p50 {e['p50']}  p99 {e['p99']}  max {e['max']}; "
+          f"top 1% of users hold {rep['top_1pct_share']:.0%}")
+    print(f"{rep['dst_crossing_users']} users' ranges cross a DST change; timezones: "
+          + ", ".join(f"{tz}={n}" for tz, n in rep["timezones"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""Replay a mixed API workload through `app.handler` against an in-memory table.
+
+No AWS account needed: by default the handler's DynamoDB repository runs on
+`LocalTable` (so DynamoDB calls are counted); `--storage memory|sqlite` uses
+those backends instead. Every request is a real API Gateway (REST, proxy)
+event. A scenario file sets the users, their seeded data, the request mix and
+any env overrides (`setup.generator` seeds a gen_workload.py population instead,
+its keys are gen_workload.Profile arguments, see scenarios/skewed.json):
+
+    python backend/tools/loadtest.py backend/tools/scenarios/mixed.json
+    python backend/tools/loadtest.py scenario.json --requests 5000 --json out.json
+    python backend/tools/loadtest.py scenario.json --storage sqlite --sqlite-path /tmp/load.db
+    python backend/tools/loadtest.py scenario.json --faults throttle=0.02,outage=3-6
+
+`--faults` makes LocalTable fail (see localtable.Faults) once seeding is done,
+to watch the circuit breaker open, 503s and stale reads, and the recovery.
+
+With `--url` the same requests go over HTTP (keep-alive, `--concurrency`
+connections) to a running `backend/handler/server.py`; seeding then goes
+through the API too, and the scenario's env must be given to the server.
+
+    python backend/tools/loadtest.py scenario.json --url http://127.0.0.1:8080 --concurrency 64
+
+Reports per route: request count, statuses, p50/p95/p99/max latency,
+DynamoDB calls per request and (in process) the read/write capacity units per
+request; then the DynamoDB operation totals and peak RSS.
+"""
+import argparse
+import base64
+import gzip
+import http.client
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlencode, urlsplit
+
+from _bootstrap import load_app
+from localtable import Faults, LocalTable
+
+# Quiet by default: the harness measures the handler, not stdout throughput
+DEFAULT_ENV = {"LOG_LEVEL": "WARNING", "METRICS_ENABLED": "false"}
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # bytes on macOS, KiB on Linux
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def proxy_event(user: str, method: str, path: str, qs: Optional[Dict[str, str]] = None,
+                body: Any = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """An API Gateway REST proxy-integration event as the Lambda receives it."""
+    h = {"X-Debug-User": user, "Accept-Encoding": "gzip, deflate, br", "Content-Type": "application/json"}
+    h.update(headers or {})
+    return {
+        "resource": "/{proxy+}",
+        "path": path,
+        "httpMethod": method,
+        "headers": h,
+        "multiValueHeaders": {k: [v] for k, v in h.items()},
+        "queryStringParameters": qs or None,
+        "pathParameters": {"proxy": path.lstrip("/")},
+        "body": json.dumps(body) if body is not None else None,
+        "isBase64Encoded": False,
+        "requestContext": {
+            "requestId": uuid.uuid4().hex, "httpMethod": method, "path": "/prod" + path,
+            "stage": "prod", "requestTimeEpoch": int(time.time() * 1000),
+        },
+    }
+
+
+class HttpTarget:
+    """Sends proxy events to a running server as HTTP requests, one keep-alive connection per thread."""
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname or "127.0.0.1", parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _conn(self) -> http.client.HTTPConnection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def __call__(self, event: Dict[str, Any], context: Any = None) -> Dict[str, Any]:
+        target = self.prefix + event["path"]
+        if event.get("queryStringParameters"):
+            target += "?" + urlencode(event["queryStringParameters"])
+        body = event["body"].encode("utf-8") if event.get("body") is not None else None
+        for attempt in (1, 2):  # a kept-alive connection may have been closed by the server meanwhile
+            conn = self._conn()
+            try:
+                conn.request(event["httpMethod"], target, body, event["headers"])
+                r = conn.getresponse()
+                data = r.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self.local.conn = None
+                if attempt == 2:
+                    raise
+        headers = dict(r.getheaders())
+        if headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        return {"statusCode": r.status, "headers": headers, "body": data.decode("utf-8", "replace")}
+
+
+class User:
+    """What one simulated client knows: its ids, ETags and change cursor."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.events: List[str] = []
+        self.tasks: List[str] = []
+        self.etags: Dict[str, str] = {}
+        self.cursor: Optional[str] = None
+
+
+class Workload:
+    def __init__(self, app, scenario: Dict[str, Any], rnd: random.Random):
+        self.app = app
+        self.rnd = rnd
+        self.revalidate = float(scenario.get("revalidate", 0.5))
+        self.now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.builders: Dict[str, Callable[[User], Dict[str, Any]]] = {
+            "GET /health": lambda u: self.ev(u, "GET", "/health"),
+            "GET /events": lambda u: self.ev(u, "GET", "/events", self.week()),
+            "POST /events": self.post_event,
+            "PUT /events/{id}": self.put_event,
+            "DELETE /events/{id}": lambda u: self.by_id(u, u.events, "DELETE", "/events"),
+            "GET /tasks": lambda u: self.ev(u, "GET", "/tasks"),
+            "POST /tasks": lambda u: self.ev(u, "POST", "/tasks", body={
+                "title": f"task {self.rnd.randrange(10**6)}", "durationMin": self.rnd.choice((30, 60, 90))},
+                headers={"Idempotency-Key": uuid.uuid4().hex}),
+            "DELETE /tasks/{id}": lambda u: self.by_id(u, u.tasks, "DELETE", "/tasks"),
+            "GET /availability": lambda u: self.ev(u, "GET", "/availability"),
+            "PUT /availability": lambda u: self.ev(u, "PUT", "/availability", body=self.availability()),
+            "GET /freebusy": lambda u: self.ev(u, "GET", "/freebusy", dict(self.week(), format=self.rnd.choice(
+                ("offsets", "bitmap")))),
+            "GET /summary/month": lambda u: self.ev(u, "GET", "/summary/month", {"month": self.now.strftime("%Y-%m")}),
+            "GET /changes": lambda u: self.ev(u, "GET", "/changes", {"since": u.cursor} if u.cursor else None),
+            "GET /export": lambda u: self.ev(u, "GET", "/export", {"format": "ndjson", "include": "events,tasks"}),
+            "POST /extension/check": lambda u: self.ev(u, "POST", "/extension/check", body={
+                "ranges": [self.slot(60) for _ in range(self.rnd.randint(1, 5))]}),
+            "POST /suggest": lambda u: self.ev(u, "POST", "/suggest", body={
+                "durationMin": self.rnd.choice((30, 60, 90)), **dict(zip(("fromISO", "toISO"), self.week().values()))}),
+            "POST /batch": lambda u: self.ev(u, "POST", "/batch", body={"requests": [
+                {"method": "GET", "path": "/events", "query": self.week()}, {"method": "GET", "path": "/tasks"}]}),
+            "OPTIONS /events": lambda u: self.ev(u, "OPTIONS", "/events"),
+        }
+
+    # ---- request building
+    def ev(self, u: User, method: str, path: str, qs=None, body=None, headers=None):
+        headers = dict(headers or {})
+        key = path + json.dumps(qs, sort_keys=True)
+        if method == "GET" and key in u.etags and self.rnd.random() < self.revalidate:
+            headers["If-None-Match"] = u.etags[key]
+        return proxy_event(u.name, method, path, qs, body, headers)
+
+    def week(self) -> Dict[str, str]:
+        start = self.now + timedelta(days=self.rnd.randrange(0, 21))
+        return {"from": self.app.iso(start), "to": self.app.iso(start + timedelta(days=7))}
+
+    def slot(self, minutes: int) -> List[str]:
+        s = self.now + timedelta(days=self.rnd.randrange(0, 60), minutes=15 * self.rnd.randrange(28, 80))
+        return [self.app.iso(s), self.app.iso(s + timedelta(minutes=minutes))]
+
+    def availability(self) -> Dict[str, Any]:
+        end = self.rnd.choice(("17:00", "18:00", "19:00"))
+        days = ("Mon", "Tue", "Wed", "Thu", "Fri")
+        return {"timezone": "Asia/Jerusalem", "weekly": {d: [["09:00", end]] for d in days}}
+
+    def post_event(self, u: User):
+        s, e = self.slot(self.rnd.choice((15, 30, 60, 90)))
+        return self.ev(u, "POST", "/events", body={"title": "Load test", "startISO": s, "endISO": e},
+                       headers={"Idempotency-Key": uuid.uuid4().hex})
+
+    def put_event(self, u: User):
+        if not u.events:
+            return self.post_event(u)
+        s, e = self.slot(60)
+        return self.ev(u, "PUT", f"/events/{self.rnd.choice(u.events)}", body={"startISO": s, "endISO": e})
+
+    def by_id(self, u: User, ids: List[str], method: str, base: str):
+        if not ids:
+            return self.ev(u, "GET", base, self.week() if base == "/events" else None)
+        return self.ev(u, method, f"{base}/{ids.pop(self.rnd.randrange(len(ids)))}")
+
+    # ---- seeding (straight through the persistence helpers, not timed)
+    def seed(self, u: User, events: int, tasks: int):
+        self.app.put_availability(f"USER#{u.name}", self.availability()["weekly"], "Asia/Jerusalem")
+        for _ in range(events):
+            s, e = self.slot(self.rnd.choice((30, 60, 90)))
+            u.events.append(self.app.put_event(f"USER#{u.name}", "Seeded", s, e, True, "app")["eventId"])
+        for i in range(tasks):
+            u.tasks.append(self.app.put_task(f"USER#{u.name}", f"seeded {i}", 60, None, None)["taskId"])
+
+    def seed_over_api(self, u: User, send: Callable[[Dict[str, Any]], Dict[str, Any]], events: int, tasks: int):
+        send(self.ev(u, "PUT", "/availability", body=self.availability()))
+        for _ in range(events):
+            s, e = self.slot(self.rnd.choice((30, 60, 90)))
+            event = self.ev(u, "POST", "/events", body={"title": "Seeded", "startISO": s, "endISO": e})
+            self.observe(u, event, send(event))
+        for i in range(tasks):
+            event = self.ev(u, "POST", "/tasks", body={"title": f"seeded {i}", "durationMin": 60})
+            self.observe(u, event, send(event))
+
+    # ---- learning from responses
+    def observe(self, u: User, event: Dict[str, Any], response: Dict[str, Any]):
+        headers = response.get("headers") or {}
+        if event["httpMethod"] == "GET" and headers.get("ETag"):
+            u.etags[event["path"] + json.dumps(event["queryStringParameters"], sort_keys=True)] = headers["ETag"]
+        status = response.get("statusCode")
+        if event["path"] not in ("/events", "/tasks", "/changes") or status not in (200, 201):
+            return
+        body = decode_body(self.app, response)
+        if not isinstance(body, dict):
+            return
+        if event["httpMethod"] == "POST" and "eventId" in body:
+            u.events.append(body["eventId"])
+        elif event["httpMethod"] == "POST" and "taskId" in body:
+            u.tasks.append(body["taskId"])
+        elif event["path"] == "/changes" and body.get("cursor"):
+            u.cursor = str(body["cursor"])
+
+
+def decode_body(app, response: Dict[str, Any]) -> Any:
+    raw = response.get("body") or ""
+    if response.get("isBase64Encoded"):
+        data = base64.b64decode(raw)
+        coding = (response.get("headers") or {}).get("Content-Encoding")
+        if coding == "gzip":
+            data = gzip.decompress(data)
+        elif coding == "br" and app.brotli is not None:
+            data = app.brotli.decompress(data)
+        raw = data.decode("utf-8")
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("scenario", help="scenario JSON file")
+    ap.add_argument("--requests", type=int, help="override the scenario's request count")
+    ap.add_argument("--seed", type=int, help="override the scenario's random seed")
+    ap.add_argument("--storage", choices=("localtable", "memory", "sqlite"), default="localtable")
+    ap.add_argument("--sqlite-path", default=":memory:", help="database file for --storage sqlite")
+    ap.add_argument("--url", help="send the requests over HTTP to this server instead of calling the handler")
+    ap.add_argument("--concurrency", type=int, default=1, help="parallel connections with --url")
+    ap.add_argument("--faults", help="with localtable: faults to inject during the run, e.g. "
+                                     "throttle=0.05,error=0.01,timeout=0.01,latency=5,outage=3-6")
+    ap.add_argument("--json", help="write machine-readable results here")
+    args = ap.parse_args()
+    if args.faults and (args.url or args.storage != "localtable"):
+        ap.error("--faults needs the in-process localtable storage")
+
+    with open(args.scenario) as f:
+        scenario = json.load(f)
+    for k, v in {**DEFAULT_ENV, **scenario.get("env", {})}.items():
+        os.environ.setdefault(k, str(v))
+    app = load_app()
+    import storage
+    from resilience import GuardedTable
+    table = LocalTable()
+    send = app.handler
+    if args.url:
+        send, args.storage = HttpTarget(args.url), "http"
+    elif args.storage == "localtable":
+        app.REPO = storage.DynamoRepository(GuardedTable(table))  # breaker and stale reads, as deployed
+    elif args.storage == "memory":
+        app.REPO = storage.MemoryRepository()
+    else:
+        app.REPO = storage.SqliteRepository(args.sqlite_path)
+
+    rnd = random.Random(args.seed if args.seed is not None else scenario.get("seed", 1))
+    work = Workload(app, scenario, rnd)
+    mix = scenario["mix"]
+    unknown = set(mix) - set(work.builders)
+    if unknown:
+        raise SystemExit(f"unknown routes in mix: {', '.join(sorted(unknown))}\nknown: {', '.join(work.builders)}")
+    routes, weights = list(mix), list(mix.values())
+
+    setup = scenario.get("setup", {})
+    users = [User(f"load-{i:04d}") for i in range(int(scenario.get("users", 10)))]
+    t0 = time.perf_counter()
+    if "generator" in setup:
+        # gen_workload.py population instead of uniform seeding; its range starts this week by default
+        if args.url:
+            raise SystemExit("setup.generator loads through the storage layer; it cannot seed a server over --url")
+        import gen_workload
+        monday = (work.now - timedelta(days=work.now.weekday())).date().isoformat()
+        profile = gen_workload.Profile(**{"users": len(users), "prefix": "load", "start": monday,
+                                          **setup["generator"]})
+        users = []
+        for g in gen_workload.generate(profile):
+            gen_workload.load_user(app.REPO, g)
+            u = User(g.user_pk.split("#", 1)[1])
+            u.events = [e["eventId"] for e in g.events]
+            u.tasks = [t["taskId"] for t in g.tasks]
+            users.append(u)
+    else:
+        for u in users:
+            if args.url:
+                work.seed_over_api(u, send, int(setup.get("eventsPerUser", 0)), int(setup.get("tasksPerUser", 0)))
+            else:
+                work.seed(u, int(setup.get("eventsPerUser", 0)), int(setup.get("tasksPerUser", 0)))
+    seed_secs = time.perf_counter() - t0
+    print(f"seeded {len(users)} users on {args.url or args.storage} in {seed_secs:.1f}s; rss {peak_rss_mb():.0f} MiB")
+
+    n = args.requests or int(scenario.get("requests", 1000))
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    ddb_calls: Dict[str, int] = Counter()
+    capacity: Dict[str, Counter] = defaultdict(Counter)
+    ops_before = Counter(table.calls)
+    stale: Dict[str, int] = Counter()
+    if args.faults:
+        table.faults = Faults.parse(args.faults)  # armed now: outage times count from the first request
+    remaining = [n]
+    lock = threading.Lock()  # request building and bookkeeping share `rnd` and the users' state
+
+    def run():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                label = rnd.choices(routes, weights)[0]
+                user = rnd.choice(users)
+                event = work.builders[label](user)
+                calls_before = sum(table.calls.values())
+            t = time.perf_counter()
+            response = send(event, None)
+            elapsed = (time.perf_counter() - t) * 1000
+            with lock:
+                latencies[label].append(elapsed)
+                ddb_calls[label] += sum(table.calls.values()) - calls_before
+                if not args.url:
+                    capacity[label].update(app.METRICS.capacity_fields())  # the request just handled
+                statuses[label][response.get("statusCode")] += 1
+                stale[label] += "Warning" in (response.get("headers") or {})
+                work.observe(user, event, response)
+
+    started = time.perf_counter()
+    if args.url and args.concurrency > 1:
+        threads = [threading.Thread(target=run) for _ in range(args.concurrency)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+    else:
+        run()
+    wall = time.perf_counter() - started
+
+    rows = []
+    print(f"\n{'route':>22} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'ddb/req':>8} {'rcu/req':>8} {'wcu/req':>8}  statuses")
+    for label in routes:
+        lat = sorted(latencies.get(label, []))
+        if not lat:
+            continue
+        row = {
+            "route": label, "requests": len(lat),
+            "p50_ms": round(percentile(lat, 50), 3), "p95_ms": round(percentile(lat, 95), 3),
+            "p99_ms": round(percentile(lat, 99), 3), "max_ms": round(lat[-1], 3),
+            "ddb_calls_per_request": round(ddb_calls[label] / len(lat), 2),
+            "rcu_per_request": round(capacity[label]["rcu"] / len(lat), 2),
+            "wcu_per_request": round(capacity[label]["wcu"] / len(lat), 2),
+            "statuses": {str(k): v for k, v in sorted(statuses[label].items())},
+            "stale": stale[label],
+        }
+        rows.append(row)
+        sts = " ".join(f"{k}:{v}" for k, v in row["statuses"].items()) + (f" stale:{row['stale']}" if row["stale"] else "")
+        print(f"{label:>22} {len(lat):>6} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+              f"{row['max_ms']:>8} {row['ddb_calls_per_request']:>8} {row['rcu_per_request']:>8} "
+              f"{row['wcu_per_request']:>8}  {sts}")
+
+    ops = {k: v - ops_before.get(k, 0) for k, v in table.calls.items() if v - ops_before.get(k, 0)}
+    summary = {
+        "requests": n, "wall_s": round(wall, 3), "rps": round(n / wall, 1),
+        "storage": args.storage, "ddb_ops": ops, "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    where = f"{args.concurrency} connection(s) to {args.url}" if args.url else "one container"
+    print(f"\n{n} requests in {wall:.2f}s ({summary['rps']} req/s, {where})")
+    if args.storage == "localtable":
+        print("DynamoDB operations: " + ", ".join(f"{k}={v}" for k, v in sorted(ops.items())))
+    if table.faults is not None:
+        summary["faults"] = dict(table.faults.injected)
+        print("injected faults: " + (", ".join(f"{k}={v}" for k, v in sorted(table.faults.injected.items())) or "none")
+              + f"; stale responses: {sum(stale.values())}")
+    print(f"peak RSS: {summary['peak_rss_mb']} MiB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scenario": os.path.basename(args.scenario), "summary": summary, "routes": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,623 @@
+"""In-memory stand-in for the boto3 DynamoDB Table resource.
+
+Implements the Table methods the handler uses (get/put/update/delete_item with
+condition expressions, query on the table and GSI1, scan with segments,
+Limit/ExclusiveStartKey paging, projections, batch_writer and, as the client
+call GuardedTable forwards it to, transact_write_items) closely enough to run
+`app.handler` end to end on a laptop:
+
+    table = LocalTable()
+    app.REPO = storage.DynamoRepository(table)
+    ...
+    table.calls  # Counter of DynamoDB operations served
+
+Consumed capacity is estimated the way DynamoDB bills it (4 KB read units,
+halved unless ConsistentRead; 1 KB write units, plus one write per index an
+item is projected into) and fed to `observability.record_consumed_capacity`,
+so per-request RCU/WCU show up locally just as they do from the real table.
+
+`LocalTable(faults=Faults.parse("throttle=0.05,timeout=0.01,outage=5-10"))`
+injects throttling, 5xx, timeouts, latency or a full outage, to exercise the
+handler's retries and circuit breaker (`resilience.GuardedTable`) offline.
+"""
+import copy
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+
+_TOKEN_RE = re.compile(r"\s*(<=|>=|<>|[=<>(),+\-]|[#:]?[A-Za-z_][A-Za-z0-9_.]*|\S)")
+
+
+def _client_error(code: str, op: str, msg: str = "") -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": msg or code}}, op)
+
+
+class Faults:
+    """Failures to inject before serving a call, as DynamoDB would surface them
+    once the client's own retries are used up.
+
+    throttle, error and timeout are per-call probabilities
+    (ProvisionedThroughputExceededException, InternalServerError, a read
+    timeout); latency_ms delays every call; outage=(start, end) fails every
+    call with a connection error from `start` to `end` seconds after `arm()`.
+    """
+
+    def __init__(self, throttle: float = 0.0, error: float = 0.0, timeout: float = 0.0,
+                 latency_ms: float = 0.0, outage: Optional[tuple] = None, seed: int = 0):
+        self.throttle, self.error, self.timeout = throttle, error, timeout
+        self.latency_ms = latency_ms
+        self.outage = outage
+        self.rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.injected: Counter = Counter()
+        self.arm()
+
+    @classmethod
+    def parse(cls, spec: str) -> "Faults":
+        """From "throttle=0.05,error=0.01,timeout=0.01,latency=20,outage=5-10,seed=3"."""
+        kw: Dict[str, Any] = {}
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            name, _, value = part.partition("=")
+            if name == "outage":
+                start, _, end = value.partition("-")
+                kw["outage"] = (float(start), float(end))
+            elif name == "seed":
+                kw["seed"] = int(value)
+            elif name in ("throttle", "error", "timeout", "latency"):
+                kw["latency_ms" if name == "latency" else name] = float(value)
+            else:
+                raise ValueError(f"unknown fault {name!r} (throttle, error, timeout, latency, outage, seed)")
+        return cls(**kw)
+
+    def arm(self):
+        """Start the outage clock now."""
+        self.t0 = time.monotonic()
+
+    def inject(self, op: str):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            if self.outage and self.outage[0] <= time.monotonic() - self.t0 < self.outage[1]:
+                kind = "outage"
+            else:
+                roll, kind = self.rnd.random(), None
+                for name, p in (("throttle", self.throttle), ("error", self.error), ("timeout", self.timeout)):
+                    if roll < p:
+                        kind = name
+                        break
+                    roll -= p
+            if kind is None:
+                return
+            self.injected[kind] += 1
+        if kind == "outage":
+            raise EndpointConnectionError(endpoint_url="https://dynamodb.local")
+        if kind == "throttle":
+            raise _client_error("ProvisionedThroughputExceededException", op,
+                                "The level of configured provisioned throughput for the table was exceeded")
+        if kind == "error":
+            raise _client_error("InternalServerError", op, "Internal server error")
+        raise ReadTimeoutError(endpoint_url="https://dynamodb.local")
+
+
+def _record_capacity(op: str, consumed) -> None:
+    from _bootstrap import load_app
+    load_app()  # the handler's observability module, on the path once the app is importable
+    import observability
+    if observability.DDB_CAPACITY_ACCOUNTING:
+        observability.record_consumed_capacity(op, consumed)
+
+
+class _Expr:
+    """Tiny recursive-descent evaluator for the expression subset the app uses."""
+
+    def __init__(self, text: str, names: Dict[str, str], values: Dict[str, Any]):
+        self.toks = [t for t in _TOKEN_RE.findall(text or "") if t.strip()]
+        self.i = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, k: int = 0) -> Optional[str]:
+        j = self.i + k
+        return self.toks[j] if j < len(self.toks) else None
+
+    def take(self, expect: Optional[str] = None) -> str:
+        tok = self.peek()
+        if tok is None or (expect is not None and tok.upper() != expect):
+            raise ValueError(f"expected {expect!r} got {tok!r} in {' '.join(self.toks)}")
+        self.i += 1
+        return tok
+
+    def name(self, tok: str) -> str:
+        return self.names.get(tok, tok)
+
+    # ---- conditions
+    def cond(self, item):
+        left = self.conj(item)
+        while (self.peek() or "").upper() == "OR":
+            self.take()
+            right = self.conj(item)
+            left = left or right
+        return left
+
+    def conj(self, item):
+        left = self.unary(item)
+        while (self.peek() or "").upper() == "AND":
+            self.take()
+            right = self.unary(item)
+            left = left and right
+        return left
+
+    def unary(self, item):
+        if (self.peek() or "").upper() == "NOT":
+            self.take()
+            return not self.unary(item)
+        if self.peek() == "(":
+            self.take("(")
+            v = self.cond(item)
+            self.take(")")
+            return v
+        tok = self.peek()
+        low = (tok or "").lower()
+        if low in ("attribute_exists", "attribute_not_exists", "begins_with", "contains") and self.peek(1) == "(":
+            self.take()
+            self.take("(")
+            path = self.name(self.take())
+            arg = None
+            if self.peek() == ",":
+                self.take(",")
+                arg = self.operand(item)
+            self.take(")")
+            present = path in item
+            if low == "attribute_exists":
+                return present
+            if low == "attribute_not_exists":
+                return not present
+            val = item.get(path)
+            if low == "begins_with":
+                return isinstance(val, str) and val.startswith(arg)
+            return val is not None and arg in val
+        left = self.operand(item)
+        op = self.take().upper()
+        if op == "BETWEEN":
+            lo = self.operand(item)
+            self.take("AND")
+            hi = self.operand(item)
+            return left is not None and lo <= left <= hi
+        right = self.operand(item)
+        if op == "=":
+            return left == right
+        if op == "<>":
+            return left != right
+        if left is None or right is None:
+            return False
+        return {"<": left < right, "<=": left <= right, ">": left > right, ">=": left >= right}[op]
+
+    def operand(self, item):
+        tok = self.take()
+        if tok.startswith(":"):
+            return self.values[tok]
+        if tok.lower() == "if_not_exists":
+            self.take("(")
+            path = self.name(self.take())
+            self.take(",")
+            default = self.operand(item)
+            self.take(")")
+            return item.get(path, default)
+        val = item.get(self.name(tok))
+        if self.peek() in ("+", "-"):
+            op = self.take()
+            other = self.operand(item)
+            return val + other if op == "+" else val - other
+        return val
+
+    # ---- updates
+    def apply_update(self, item):
+        while self.peek() is not None:
+            clause = self.take().upper()
+            while True:
+                if clause == "SET":
+                    path = self.name(self.take())
+                    self.take("=")
+                    val = self.operand(item)
+                    if self.peek() in ("+", "-"):
+                        op = self.take()
+                        other = self.operand(item)
+                        val = val + other if op == "+" else val - other
+                    item[path] = val
+                elif clause == "ADD":
+                    path = self.name(self.take())
+                    val = self.operand(item)
+                    if isinstance(val, set):
+                        item[path] = set(item.get(path) or set()) | val
+                    else:
+                        item[path] = item.get(path, Decimal(0)) + val
+                elif clause == "REMOVE":
+                    item.pop(self.name(self.take()), None)
+                else:
+                    raise ValueError(f"unsupported update clause {clause}")
+                if self.peek() == ",":
+                    self.take(",")
+                    continue
+                break
+
+
+def _build(expr, names, values, is_key=False):
+    if isinstance(expr, ConditionBase):
+        built = ConditionExpressionBuilder().build_expression(expr, is_key_condition=is_key)
+        names = {**(names or {}), **built.attribute_name_placeholders}
+        values = {**(values or {}), **built.attribute_value_placeholders}
+        return built.condition_expression, names, values
+    return expr, names or {}, values or {}
+
+
+def _project(item, projection, names):
+    if not projection:
+        return item
+    keep = [names.get(p.strip(), p.strip()) for p in projection.split(",")]
+    return {k: item[k] for k in keep if k in item}
+
+
+def _to_ddb(value):
+    """Mimic boto3's serializer: ints become Decimal, floats are rejected."""
+    if isinstance(value, bool) or value is None or isinstance(value, (str, bytes, Decimal)):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    if isinstance(value, dict):
+        return {k: _to_ddb(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_ddb(v) for v in value]
+    if isinstance(value, set):
+        return {_to_ddb(v) for v in value}
+    raise TypeError(f"Unsupported type {type(value)!r}")
+
+
+def _partition_value(text, names, values, pk_attr):
+    """The value a key condition pins the partition key to (`<pk> = :v`)."""
+    toks = [t for t in _TOKEN_RE.findall(text or "") if t.strip()]
+    for i in range(len(toks) - 2):
+        if names.get(toks[i], toks[i]) == pk_attr and toks[i + 1] == "=":
+            return values[toks[i + 2]]
+    raise ValueError(f"key condition must test {pk_attr} for equality: {text}")
+
+
+def _value_size(v) -> int:
+    if isinstance(v, str):
+        return len(v.encode("utf-8"))
+    if isinstance(v, bytes):
+        return len(v)
+    if isinstance(v, Decimal):
+        return (len(str(v).lstrip("-").replace(".", "")) + 1) // 2 + 1
+    if isinstance(v, dict):
+        return 3 + sum(len(k.encode("utf-8")) + _value_size(x) + 1 for k, x in v.items())
+    if isinstance(v, (list, set)):
+        return 3 + sum(_value_size(x) + 1 for x in v)
+    return 1  # bool, null
+
+
+def item_size(item: Optional[Dict[str, Any]]) -> int:
+    """Approximate DynamoDB item size in bytes: attribute names plus values."""
+    if not item:
+        return 0
+    return sum(len(k.encode("utf-8")) + _value_size(v) for k, v in item.items())
+
+
+class LocalTable:
+    """Implements the Table methods the handler calls, plus per-operation call counts."""
+
+    # Both names exist on the deployed table (see SchedulerStack), so writes pay for both
+    INDEXES = {"GSI1": ("gsi1pk", "gsi1sk"), "gsi1": ("gsi1pk", "gsi1sk")}
+
+    def __init__(self, name: str = "local-scheduler", faults: Optional[Faults] = None):
+        self.name = name
+        self.table_name = name
+        self.faults = faults
+        self.items: Dict[tuple, Dict[str, Any]] = {}
+        self.calls: Counter = Counter()
+        self._lock = threading.RLock()
+        # Items by partition, for the table and each distinct index key, so a
+        # query touches one partition like DynamoDB does instead of every item
+        self._parts: Dict[tuple, Dict[tuple, Dict[str, Any]]] = {}
+
+    # ---- storage
+    def _inject(self, op):
+        if self.faults is not None:
+            self.faults.inject(op)
+
+    def _key(self, key):
+        return (key["pk"], key["sk"])
+
+    def _partitions(self, item):
+        yield ("pk", item["pk"])
+        for pk_attr, sk_attr in set(self.INDEXES.values()):
+            if pk_attr in item and sk_attr in item:
+                yield (pk_attr, item[pk_attr])
+
+    def _store(self, key, item):
+        self._drop(key)
+        self.items[key] = item
+        for part in self._partitions(item):
+            self._parts.setdefault(part, {})[key] = item
+
+    def _drop(self, key):
+        old = self.items.pop(key, None)
+        if old is not None:
+            for part in self._partitions(old):
+                rows = self._parts.get(part)
+                if rows is not None:
+                    rows.pop(key, None)
+                    if not rows:
+                        del self._parts[part]
+        return old
+
+    # ---- consumed capacity
+    def _read_units(self, op, size, kw, index=None, min_units=1):
+        units = max(min_units, math.ceil(size / 4096)) * (1.0 if kw.get("ConsistentRead") else 0.5)
+        cc: Dict[str, Any] = {"TableName": self.name, "CapacityUnits": units, "ReadCapacityUnits": units}
+        if index:
+            cc["Table"] = {"CapacityUnits": 0.0}
+            cc["GlobalSecondaryIndexes"] = {index: {"CapacityUnits": units, "ReadCapacityUnits": units}}
+        else:
+            cc["Table"] = {"CapacityUnits": units}
+        return self._consumed(op, cc, kw)
+
+    def _write_units(self, op, old, new, kw):
+        return self._consumed(op, self._write_cc(old, new), kw)
+
+    def _write_cc(self, old, new):
+        table = max(1, math.ceil(max(item_size(old), item_size(new)) / 1024))
+        indexes = {}
+        for name, (pk_attr, sk_attr) in self.INDEXES.items():
+            in_old = old is not None and pk_attr in old and sk_attr in old
+            in_new = new is not None and pk_attr in new and sk_attr in new
+            moved = in_old and in_new and (old[pk_attr], old[sk_attr]) != (new[pk_attr], new[sk_attr])
+            units = (math.ceil(item_size(new) / 1024) if in_new else 0) + \
+                (math.ceil(item_size(old) / 1024) if in_old and (moved or not in_new) else 0)
+            if units:
+                indexes[name] = {"CapacityUnits": float(units), "WriteCapacityUnits": float(units)}
+        total = table + sum(i["CapacityUnits"] for i in indexes.values())
+        cc: Dict[str, Any] = {"TableName": self.name, "CapacityUnits": float(total),
+                              "WriteCapacityUnits": float(total), "Table": {"CapacityUnits": float(table)}}
+        if indexes:
+            cc["GlobalSecondaryIndexes"] = indexes
+        return cc
+
+    def _consumed(self, op, cc, kw):
+        _record_capacity(op, cc)
+        return {"ConsumedCapacity": cc} if kw.get("ReturnConsumedCapacity") in ("TOTAL", "INDEXES") else {}
+
+    # ---- single-item operations
+
+    def _check(self, op, existing, kw):
+        expr = kw.get("ConditionExpression")
+        if expr is None:
+            return
+        text, names, values = _build(expr, kw.get("ExpressionAttributeNames"), kw.get("ExpressionAttributeValues"))
+        if not _Expr(text, names, values).cond(existing or {}):
+            raise _client_error("ConditionalCheckFailedException", op, "The conditional request failed")
+
+    def put_item(self, Item, **kw):
+        self._inject("PutItem")
+        with self._lock:
+            self.calls["PutItem"] += 1
+            item = _to_ddb(Item)
+            key = self._key(item)
+            old = self.items.get(key)
+            self._check("PutItem", old, kw)
+            self._store(key, copy.deepcopy(item))
+            return self._write_units("PutItem", old, item, kw)
+
+    def get_item(self, Key, **kw):
+        self._inject("GetItem")
+        with self._lock:
+            self.calls["GetItem"] += 1
+            item = self.items.get(self._key(Key))
+            out = self._read_units("GetItem", item_size(item), kw)
+            if item is not None:
+                out["Item"] = _project(copy.deepcopy(item), kw.get("ProjectionExpression"),
+                                       kw.get("ExpressionAttributeNames") or {})
+            return out
+
+    def delete_item(self, Key, **kw):
+        self._inject("DeleteItem")
+        with self._lock:
+            self.calls["DeleteItem"] += 1
+            key = self._key(Key)
+            old = self.items.get(key)
+            self._check("DeleteItem", old, kw)
+            self._drop(key)
+            out = self._write_units("DeleteItem", old, None, kw)
+            if kw.get("ReturnValues") == "ALL_OLD" and old is not None:
+                out["Attributes"] = copy.deepcopy(old)
+            return out
+
+    def update_item(self, Key, UpdateExpression, **kw):
+        self._inject("UpdateItem")
+        with self._lock:
+            self.calls["UpdateItem"] += 1
+            key = self._key(Key)
+            old = self.items.get(key)
+            self._check("UpdateItem", old, kw)
+            item = copy.deepcopy(old) if old is not None else dict(_to_ddb(Key))
+            values = _to_ddb(kw.get("ExpressionAttributeValues") or {})
+            _Expr(UpdateExpression, kw.get("ExpressionAttributeNames"), values).apply_update(item)
+            self._store(key, item)
+            out = self._write_units("UpdateItem", old, item, kw)
+            rv = kw.get("ReturnValues", "NONE")
+            if rv in ("ALL_NEW", "UPDATED_NEW"):
+                out["Attributes"] = copy.deepcopy(item)
+            elif rv in ("ALL_OLD", "UPDATED_OLD") and old is not None:
+                out["Attributes"] = copy.deepcopy(old)
+            return out
+
+    # ---- multi-item operations
+    def _page(self, rows, op, kw):
+        names = kw.get("ExpressionAttributeNames") or {}
+        values = _to_ddb(kw.get("ExpressionAttributeValues") or {})
+        filt = kw.get("FilterExpression")
+        if filt is not None:
+            ftext, names, values = _build(filt, names, values)
+        start = kw.get("ExclusiveStartKey")
+        if start is not None:
+            skey = (start["pk"], start["sk"])
+            for i, row in enumerate(rows):
+                if (row["pk"], row["sk"]) == skey:
+                    rows = rows[i + 1:]
+                    break
+        limit = kw.get("Limit")
+        page = rows[:limit] if limit else rows
+        # Billed on what was read, before any filter or projection
+        out = self._read_units(op, sum(item_size(r) for r in page), kw, kw.get("IndexName"))
+        out["ScannedCount"] = len(page)
+        if limit and len(rows) > limit:
+            last = page[-1]
+            out["LastEvaluatedKey"] = {k: last[k] for k in ("pk", "sk", "gsi1pk", "gsi1sk") if k in last}
+        if filt is not None:
+            page = [r for r in page if _Expr(ftext, names, values).cond(r)]
+        out["Count"] = len(page)
+        if kw.get("Select") != "COUNT":
+            out["Items"] = [_project(copy.deepcopy(r), kw.get("ProjectionExpression"), names) for r in page]
+        return out
+
+    def query(self, KeyConditionExpression, **kw):
+        self._inject("Query")
+        with self._lock:
+            self.calls["Query"] += 1
+            text, names, values = _build(KeyConditionExpression, kw.get("ExpressionAttributeNames"),
+                                         _to_ddb(kw.get("ExpressionAttributeValues")), is_key=True)
+            kw = {**kw, "ExpressionAttributeNames": names, "ExpressionAttributeValues": values}
+            pk_attr, sk_attr = self.INDEXES.get(kw.get("IndexName"), ("pk", "sk"))
+            part = self._parts.get((pk_attr, _partition_value(text, names, values, pk_attr)), {})
+            rows = [r for r in part.values() if sk_attr in r and _Expr(text, names, values).cond(r)]
+            rows.sort(key=lambda r: (r[sk_attr], r["sk"]), reverse=not kw.get("ScanIndexForward", True))
+            return self._page(rows, "Query", kw)
+
+    def scan(self, **kw):
+        self._inject("Scan")
+        with self._lock:
+            self.calls["Scan"] += 1
+            rows = sorted(self.items.values(), key=lambda r: (r["pk"], r["sk"]))
+            total = kw.get("TotalSegments")
+            if total:
+                seg = kw.get("Segment", 0)
+                rows = [r for r in rows if zlib.crc32(r["pk"].encode("utf-8")) % total == seg]
+            return self._page(rows, "Scan", kw)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self)
+
+    def transact_write_items(self, TransactItems, **kw):
+        """All or nothing: every condition is checked before anything is written.
+        Billed like DynamoDB, at twice the units of the same writes done one by one."""
+        self._inject("TransactWriteItems")
+        with self._lock:
+            self.calls["TransactWriteItems"] += 1
+            staged, reasons = [], []
+            for entry in TransactItems:
+                (kind, spec), = entry.items()
+                key = self._key(spec["Item"] if kind == "Put" else spec["Key"])
+                if spec.get("TableName", self.name) != self.name or key in (s[0] for s in staged):
+                    raise _client_error("ValidationException", "TransactWriteItems",
+                                        "Transaction request cannot include multiple operations on one item")
+                old = self.items.get(key)
+                try:
+                    self._check("TransactWriteItems", old, spec)
+                    reasons.append({"Code": "None"})
+                except ClientError:
+                    reasons.append({"Code": "ConditionalCheckFailed"})
+                if kind == "Put":
+                    new = _to_ddb(spec["Item"])
+                elif kind == "Update":
+                    new = copy.deepcopy(old) if old is not None else dict(_to_ddb(spec["Key"]))
+                    values = _to_ddb(spec.get("ExpressionAttributeValues") or {})
+                    _Expr(spec["UpdateExpression"], spec.get("ExpressionAttributeNames"), values).apply_update(new)
+                elif kind == "Delete":
+                    new = None
+                else:  # ConditionCheck
+                    continue
+                staged.append((key, old, new))
+            if any(r["Code"] != "None" for r in reasons):
+                err = _client_error("TransactionCanceledException", "TransactWriteItems", "Transaction cancelled")
+                err.response["CancellationReasons"] = reasons
+                raise err
+            table_units, index_units = 0.0, {}
+            for key, old, new in staged:
+                cc = self._write_cc(old, new)
+                table_units += 2 * cc["Table"]["CapacityUnits"]
+                for name, part in (cc.get("GlobalSecondaryIndexes") or {}).items():
+                    index_units[name] = index_units.get(name, 0.0) + 2 * part["CapacityUnits"]
+                if new is not None:
+                    self._store(key, copy.deepcopy(new))
+                else:
+                    self._drop(key)
+            total = table_units + sum(index_units.values())
+            cc = {"TableName": self.name, "CapacityUnits": total, "WriteCapacityUnits": total,
+                  "Table": {"CapacityUnits": table_units}}
+            if index_units:
+                cc["GlobalSecondaryIndexes"] = {n: {"CapacityUnits": u} for n, u in index_units.items()}
+            return self._consumed("TransactWriteItems", [cc], kw)
+
+
+class _BatchWriter:
+    """Buffers writes and applies them 25 at a time, one BatchWriteItem each, like boto3's."""
+
+    def __init__(self, table: LocalTable):
+        self.table = table
+        self.pending: List[tuple] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
+
+    def put_item(self, Item):
+        self._add(("put", _to_ddb(Item)))
+
+    def delete_item(self, Key):
+        self._add(("delete", Key))
+
+    def _add(self, op):
+        self.pending.append(op)
+        if len(self.pending) >= 25:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        t = self.table
+        t._inject("BatchWriteItem")
+        with t._lock:
+            t.calls["BatchWriteItem"] += 1
+            table_units, index_units = 0.0, {}
+            for kind, arg in self.pending:
+                key = t._key(arg)
+                old = t.items.get(key)
+                new = arg if kind == "put" else None
+                cc = t._write_cc(old, new)
+                table_units += cc["Table"]["CapacityUnits"]
+                for name, part in (cc.get("GlobalSecondaryIndexes") or {}).items():
+                    index_units[name] = index_units.get(name, 0.0) + part["CapacityUnits"]
+                if new is not None:
+                    t._store(key, copy.deepcopy(new))
+                else:
+                    t._drop(key)
+            total = table_units + sum(index_units.values())
+            cc = {"TableName": t.name, "CapacityUnits": total, "WriteCapacityUnits": total,
+                  "Table": {"CapacityUnits": table_units}}
+            if index_units:
+                cc["GlobalSecondaryIndexes"] = {n: {"CapacityUnits": u} for n, u in index_units.items()}
+            _record_capacity("BatchWriteItem", [cc])
+        self.pending = []
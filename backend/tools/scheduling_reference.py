@@ -0,0 +1,101 @@
+"""Frozen reference implementation of the gap finder's core.
+
+Verbatim copies of merge_intervals, subtract_intervals, step_candidates_in_interval,
+the candidate scoring and rank_candidates as they were before any of them were
+optimized. Do not change these to follow the handler: they are the oracle
+`diff_scheduling.py` checks the handler's versions against. If the intended
+behaviour ever changes, change it here on purpose, in its own commit.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+Interval = Tuple[datetime, datetime]
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """Merge overlapping/adjacent intervals."""
+    if not intervals:
+        return []
+    ints = sorted(intervals, key=lambda x: x[0])
+    merged = [ints[0]]
+    for s, e in ints[1:]:
+        last_s, last_e = merged[-1]
+        if s <= last_e:
+            merged[-1] = (last_s, max(last_e, e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+def subtract_intervals(base: List[Interval], blocks: List[Interval]) -> List[Interval]:
+    """Subtract blocks from base, returning remaining free intervals (all UTC)."""
+    if not base:
+        return []
+    blocks = merge_intervals(blocks)
+    free = []
+    for s, e in base:
+        cur_start = s
+        for bs, be in blocks:
+            if be <= cur_start or bs >= e:
+                continue
+            # overlap
+            if bs > cur_start:
+                free.append((cur_start, bs))
+            cur_start = max(cur_start, be)
+            if cur_start >= e:
+                break
+        if cur_start < e:
+            free.append((cur_start, e))
+    return [iv for iv in free if iv[1] > iv[0]]
+
+
+def step_candidates_in_interval(s: datetime, e: datetime, duration: timedelta, step: timedelta) -> List[Interval]:
+    """Propose [start, start+duration] candidates at a fixed step, fully inside [s,e)."""
+    out = []
+    cursor = s
+    while cursor + duration <= e:
+        out.append((cursor, cursor + duration))
+        cursor += step
+        # Cap proposals per long interval (avoid thousands)
+        if len(out) >= 12:
+            break
+    return out
+
+
+def rank_candidates(candidates: List[Interval], free_intervals: List[Interval],
+                    now: Optional[datetime] = None) -> List[Tuple[Interval, float, List[str]]]:
+    """+ earlier is better; - 0.05 per tiny (<15m) gap left against the host free interval."""
+    now = now or datetime.now(timezone.utc)
+    tiny = timedelta(minutes=15)
+    scored = []
+    for cand in candidates:
+        cs, ce = cand
+        # find host free interval
+        host = None
+        for fs, fe in free_intervals:
+            if cs >= fs and ce <= fe:
+                host = (fs, fe)
+                break
+        reasons = []
+        base = 1.0 - (cs - now).total_seconds() / (60*60*24*30)  # small decay over ~month
+        if host:
+            fs, fe = host
+            left_gap = cs - fs
+            right_gap = fe - ce
+            if timedelta(0) < left_gap < tiny:
+                base -= 0.05
+                reasons.append("avoided tiny left gap penalty")
+            if timedelta(0) < right_gap < tiny:
+                base -= 0.05
+                reasons.append("avoided tiny right gap penalty")
+        scored.append((cand, base, reasons))
+    # sort by score desc, then earlier first
+    scored.sort(key=lambda x: (-x[1], x[0][0]))
+    return scored
+
+
+def suggest(free_intervals: List[Interval], duration: timedelta, step: timedelta, k: int,
+            now: datetime) -> List[Tuple[Interval, float, List[str]]]:
+    """Top k the original way: every step candidate of every free interval, fully ranked."""
+    candidates = [c for fs, fe in free_intervals for c in step_candidates_in_interval(fs, fe, duration, step)]
+    return rank_candidates(candidates, free_intervals, now)[:k]
@@ -1,12 +1,12 @@
 import React, { useEffect, useState } from "react";
 import CalendarGrid from "./components/CalendarGrid";
-import MonthGrid from "./components/MonthGrid";
+import MonthGrid, { monthGridRange } from "./components/MonthGrid";
 import TasksPanel from "./components/TasksPanel";
 import NlpInput from "./components/NlpInput";
 import EventPopover from "./components/EventPopover";
 import NewEventModal from "./components/NewEventModal";
-import { getEvents, updateEvent, deleteEvent, createEvent } from "./api";
-import type { EventItem } from "./types";
+import { getEvents, getMonthSummary, updateEvent, deleteEvent, createEvent } from "./api";
+import type { DayStat, EventItem } from "./types";
 import { startOfWeek, addDays, toISO, clampToNow } from "./utils";
 import { ToastProvider, Toaster, useToasts } from "./hooks/useToasts";
 import { useEventColors } from "./hooks/useEventColors";
@@ -18,6 +18,9 @@ function AppInner() {
   const [view, setView] = useState<View>("week");
   const [weekStart, setWeekStart] = useState<Date>(startOfWeek(new Date()));
   const [events, setEvents] = useState<EventItem[]>([]);
+  const [dayStats, setDayStats] = useState<DayStat[]>([]);
+  // Calendar the server dates day stats in; the grid range is computed in it too
+  const [statsTz, setStatsTz] = useState<string | undefined>(undefined);
   const [loading, setLoading] = useState(false);
   const [selected, setSelected] = useState<EventItem | null>(null);
   const [newRange, setNewRange] = useState<{ s: string; e: string } | null>(null);
@@ -26,11 +29,24 @@ function AppInner() {
 
   async function refreshEvents() {
     setLoading(true);
+    if (view === "month") {
+      // Month view only needs per-day counts: one small query instead of every event
+      try {
+        const [fromDay, toDay] = monthGridRange(weekStart, statsTz);
+        const summary = await getMonthSummary(fromDay, toDay);
+        setDayStats(summary.days);
+        setStatsTz(summary.timezone); // refetches if the grid range was computed in another zone
+      } catch (e: any) {
+        console.error("Failed to load month summary:", e?.message || e);
+        setDayStats([]);
+      } finally {
+        setLoading(false);
+      }
+      return;
+    }
     try {
       let from = new Date(weekStart);
-      let to = new Date(weekStart);
-      if (view === "week") to = addDays(from, 7);
-      else to = addDays(from, 35);
+      const to = addDays(from, 7);
       from = clampToNow(from);
       const evs = await getEvents(toISO(from), toISO(to));
       if (Array.isArray(evs)) {
@@ -51,7 +67,7 @@ function AppInner() {
 
   useEffect(() => {
     refreshEvents();
-  }, [weekStart, view]);
+  }, [weekStart, view, statsTz]);
 
   function nav(delta: number) {
     if (view === "week") setWeekStart(addDays(weekStart, delta * 7));
@@ -89,7 +105,7 @@ function AppInner() {
             </div>
 
             {view === "month" ? (
-              <MonthGrid monthStart={weekStart} events={events} />
+              <MonthGrid monthStart={weekStart} days={dayStats} timeZone={statsTz} />
             ) : (
               <CalendarGrid
                 weekStart={weekStart}
@@ -1,4 +1,5 @@
 import { getIdToken } from './authClient';
+import type { MonthSummary, Suggestion } from './types';
 
 const API_BASE = 'https://ne91eba4pe.execute-api.il-central-1.amazonaws.com/prod';
 
@@ -7,14 +8,24 @@ async function authedFetch(path: string, init: RequestInit = {}) {
   const token = await getIdToken();
   if (!token) throw new Error('Not authenticated');
 
-  const res = await fetch(`${API_BASE}${path}`, {
-    ...init,
-    headers: {
-      'Content-Type': 'application/json',
-      Authorization: `Bearer ${token}`,
-      ...(init.headers || {}),
-    },
-  });
+  const doFetch = () =>
+    fetch(`${API_BASE}${path}`, {
+      ...init,
+      headers: {
+        'Content-Type': 'application/json',
+        Authorization: `Bearer ${token}`,
+        ...(init.headers || {}),
+      },
+    });
+
+  let res: Response;
+  try {
+    res = await doFetch();
+  } catch (err) {
+    // Network failure: only requests carrying an Idempotency-Key are safe to resend
+    if (!(init.headers && 'Idempotency-Key' in (init.headers as Record<string, string>))) throw err;
+    res = await doFetch();
+  }
 
   if (!res.ok) {
     const txt = await res.text();
@@ -28,9 +39,11 @@ async function authedFetch(path: string, init: RequestInit = {}) {
 }
 
 /** -------- Events -------- */
-export async function getEvents(fromISO: string, toISO: string) {
+// `fields` limits the attributes fetched and returned, e.g. ['startISO', 'endISO'] (eventId is always included)
+export async function getEvents(fromISO: string, toISO: string, fields?: string[]) {
   if (!fromISO || !toISO) return [];
-  const qs = `from=${encodeURIComponent(fromISO)}&to=${encodeURIComponent(toISO)}`;
+  let qs = `from=${encodeURIComponent(fromISO)}&to=${encodeURIComponent(toISO)}`;
+  if (fields && fields.length) qs += `&fields=${encodeURIComponent(fields.join(','))}`;
   const data = await authedFetch(`/events?${qs}`);
 
   // Normalize to an array no matter the backend shape
@@ -40,6 +53,23 @@ export async function getEvents(fromISO: string, toISO: string) {
   return [];
 }
 
+// Busy intervals only, as [startMin, endMin) offsets from `fromISO` (much smaller than full events)
+export async function getFreeBusy(fromISO: string, toISO: string): Promise<[number, number][]> {
+  const qs = `from=${encodeURIComponent(fromISO)}&to=${encodeURIComponent(toISO)}`;
+  const data = await authedFetch(`/freebusy?${qs}`);
+  return data && Array.isArray(data.busy) ? data.busy : [];
+}
+
+/** Per-day event counts and busy minutes for fromDay..toDay (YYYY-MM-DD, inclusive). */
+export async function getMonthSummary(fromDay: string, toDay: string): Promise<MonthSummary> {
+  const qs = `from=${encodeURIComponent(fromDay)}&to=${encodeURIComponent(toDay)}`;
+  const data = await authedFetch(`/summary/month?${qs}`);
+  return {
+    timezone: (data && data.timezone) || 'UTC',
+    days: data && Array.isArray(data.days) ? data.days : [],
+  };
+}
+
 export async function createEvent(payload: {
   title: string;
   startISO: string;
@@ -47,7 +77,11 @@ export async function createEvent(payload: {
   source?: string;
   immutable?: boolean;
 }) {
-  return authedFetch('/events', { method: 'POST', body: JSON.stringify(payload) });
+  return authedFetch('/events', {
+    method: 'POST',
+    headers: { 'Idempotency-Key': crypto.randomUUID() },
+    body: JSON.stringify(payload),
+  });
 }
 
 export async function updateEvent(
@@ -115,6 +149,7 @@ export async function createTask(
 
   return authedFetch('/tasks', {
     method: 'POST',
+    headers: { 'Idempotency-Key': crypto.randomUUID() },
     body: JSON.stringify(body),
   });
 }
@@ -139,6 +174,17 @@ export async function suggest(params: {
   return data.suggestions || []; // Return just the array
 }
 
+/** One page of suggestions; pass `nextCursor` back to get the next-best slots. */
+export async function suggestPage(
+  params: { durationMin: number; fromISO: string; toISO: string; limit?: number } | { cursor: string; limit?: number }
+): Promise<{ suggestions: Suggestion[]; nextCursor?: string }> {
+  const data = await authedFetch('/suggest', {
+    method: 'POST',
+    body: JSON.stringify(params),
+  });
+  return { suggestions: data.suggestions || [], nextCursor: data.nextCursor };
+}
+
 export async function getAvailability() {
   return authedFetch('/availability', { method: 'GET' });
 }
@@ -156,6 +202,39 @@ export async function setAvailability(payload: {
   return authedFetch('/availability', { method: 'PUT', body: JSON.stringify(payload) });
 }
 
+/** -------- Delta sync -------- */
+export type Change = {
+  seq: number;
+  entity: 'EVENT' | 'TASK' | 'AVAIL';
+  id: string;
+  op: 'put' | 'delete';
+  data?: any;
+};
+
+// Without `since` the server returns the current cursor only; take it before loading a snapshot.
+// A 410 response means the cursor is too old: reload everything and start over.
+export async function getChanges(since?: string): Promise<{ changes: Change[]; cursor: string; hasMore: boolean }> {
+  const qs = since != null ? `?since=${encodeURIComponent(since)}` : '';
+  return authedFetch(`/changes${qs}`);
+}
+
+/** -------- Batch (one round trip for several calls) -------- */
+export type BatchOp = {
+  method: 'GET' | 'POST' | 'PUT' | 'DELETE';
+  path: string; // may include a query string, e.g. /events?from=..&to=..
+  body?: unknown;
+};
+export type BatchResult = { status: number; body: any; etag?: string };
+
+// Runs in order on the server; adjacent reads are executed concurrently.
+export async function batch(ops: BatchOp[]): Promise<BatchResult[]> {
+  const data = await authedFetch('/batch', {
+    method: 'POST',
+    body: JSON.stringify({ requests: ops }),
+  });
+  return (data && Array.isArray(data.responses)) ? data.responses : [];
+}
+
 /** -------- Public health (no auth) -------- */
 export async function health() {
   const res = await fetch(`${API_BASE}/health`);
@@ -1,47 +1,77 @@
 import React from "react";
-import type { EventItem } from "../types";
+import type { DayStat } from "../types";
 
 type Props = {
   monthStart: Date;
-  events: EventItem[];
+  days: DayStat[];
+  /** IANA zone the server dates the day stats in (`timezone` of /summary/month). */
+  timeZone?: string;
 };
 
-function startOfMonthGrid(d: Date): Date {
-  const first = new Date(d.getFullYear(), d.getMonth(), 1);
-  const day = first.getDay(); // 0=Sun
-  const gridStart = new Date(first);
-  gridStart.setDate(first.getDate() - day);
-  gridStart.setHours(0,0,0,0);
-  return gridStart;
+const BROWSER_TZ = Intl.DateTimeFormat().resolvedOptions().timeZone;
+
+/** Calendar date of instant `d` in `timeZone`, as a UTC-midnight Date (safe for day arithmetic). */
+function calendarDay(d: Date, timeZone: string = BROWSER_TZ): Date {
+  const parts = new Intl.DateTimeFormat("en-US", {
+    timeZone, year: "numeric", month: "numeric", day: "numeric",
+  }).formatToParts(d);
+  const get = (type: string) => Number(parts.find(p => p.type === type)?.value);
+  return new Date(Date.UTC(get("year"), get("month") - 1, get("day")));
+}
+
+/** First cell (a Sunday) of the 6-week grid around the month `d` falls in, in `timeZone`. */
+function startOfMonthGrid(d: Date, timeZone?: string): Date {
+  const day = calendarDay(d, timeZone);
+  const first = new Date(Date.UTC(day.getUTCFullYear(), day.getUTCMonth(), 1));
+  return addCalendarDays(first, -first.getUTCDay()); // 0=Sun
+}
+
+function addCalendarDays(day: Date, n: number): Date {
+  return new Date(Date.UTC(day.getUTCFullYear(), day.getUTCMonth(), day.getUTCDate() + n));
+}
+
+/** YYYY-MM-DD of a calendar day built by `calendarDay`/`addCalendarDays`. */
+export function dayKey(d: Date): string {
+  return d.toISOString().slice(0, 10);
+}
+
+/** First and last day (YYYY-MM-DD) shown by the 6-week grid for `monthStart` in `timeZone`. */
+export function monthGridRange(monthStart: Date, timeZone?: string): [string, string] {
+  const gridStart = startOfMonthGrid(monthStart, timeZone);
+  return [dayKey(gridStart), dayKey(addCalendarDays(gridStart, 41))];
 }
 
-function sameDay(a: Date, b: Date) {
-  return a.getFullYear() === b.getFullYear() && a.getMonth() === b.getMonth() && a.getDate() === b.getDate();
+function busyLabel(min: number): string {
+  return min >= 60 ? `${Math.round(min / 6) / 10}h` : `${min}m`;
 }
 
-export default function MonthGrid({ monthStart, events }: Props) {
-  const gridStart = startOfMonthGrid(monthStart);
-  const cells = Array.from({ length: 42 }, (_, i) => new Date(gridStart.getTime() + i*86400000));
+export default function MonthGrid({ monthStart, days, timeZone }: Props) {
+  const month = calendarDay(monthStart, timeZone).getUTCMonth();
+  const gridStart = startOfMonthGrid(monthStart, timeZone);
+  const cells = Array.from({ length: 42 }, (_, i) => addCalendarDays(gridStart, i));
+  const byDay = new Map(days.map(d => [d.date, d]));
 
   return (
     <div className="month">
+      {timeZone && timeZone !== BROWSER_TZ && (
+        <div className="month-tz">Days in {timeZone}</div>
+      )}
       <div className="month-head">
         {["Sun","Mon","Tue","Wed","Thu","Fri","Sat"].map(d => <div key={d} className="mhd">{d}</div>)}
       </div>
       <div className="month-body">
         {cells.map((day, i) => {
-          const dayEvents = events.filter(ev => sameDay(new Date(ev.startISO), day)).slice(0,3);
-          const isOtherMonth = day.getMonth() !== monthStart.getMonth();
+          const stat = byDay.get(dayKey(day));
+          const isOtherMonth = day.getUTCMonth() !== month;
           return (
             <div key={i} className={"mcell" + (isOtherMonth ? " other" : "")}>
-              <div className="mdn">{day.getDate()}</div>
-              <ul className="mlist">
-                {dayEvents.map(ev => (
-                  <li key={ev.eventId} className="mitem">
-                    {new Date(ev.startISO).toLocaleTimeString([], {hour:"2-digit", minute:"2-digit"})} {ev.title}
-                  </li>
-                ))}
-              </ul>
+              <div className="mdn">{day.getUTCDate()}</div>
+              {stat && stat.events > 0 && (
+                <ul className="mlist">
+                  <li className="mitem">{stat.events} event{stat.events === 1 ? "" : "s"}</li>
+                  <li className="mitem">{busyLabel(stat.busyMin)} busy</li>
+                </ul>
+              )}
             </div>
           );
         })}
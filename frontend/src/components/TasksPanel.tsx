@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from "react";
 import type { TaskItem, Suggestion } from "../types";
-import { createTask, deleteTask, getTasks, suggest, createEvent } from "../api";
+import { createTask, deleteTask, getTasks, suggestPage, batch } from "../api";
 import { toISO, startOfWeek, addDays } from "../utils";
 
 type Props = { onAddedEvent: () => void };
@@ -13,6 +13,7 @@ export default function TasksPanel({ onAddedEvent }: Props) {
   // Suggest flow
   const [sugs, setSugs] = useState<Suggestion[] | null>(null);
   const [forTask, setForTask] = useState<TaskItem | null>(null);
+  const [sugCursor, setSugCursor] = useState<string | undefined>(undefined);
   const [desiredDuration, setDesiredDuration] = useState<number>(60); // user picks when suggesting
 
   async function refresh() {
@@ -41,30 +42,50 @@ export default function TasksPanel({ onAddedEvent }: Props) {
       const fromISO = toISO(wk);
       const toISOstr = toISO(addDays(wk, 7));
       // Use the user's currently chosen duration for suggestion (default 60)
-      const res = await suggest({
+      const res = await suggestPage({
         durationMin: desiredDuration,
         fromISO: fromISO,
         toISO: toISOstr
       });
-      setSugs(res);
+      setSugs(res.suggestions);
+      setSugCursor(res.nextCursor);
       setForTask(t);
     } finally { setLoading(false); }
   }
 
+  async function onMoreSuggestions() {
+    if (!sugCursor) return;
+    setLoading(true);
+    try {
+      const res = await suggestPage({ cursor: sugCursor });
+      setSugs((prev) => [...(prev || []), ...res.suggestions]);
+      setSugCursor(res.nextCursor);
+    } catch {
+      // Calendar changed since the first page (410): the cursor is useless, start over
+      setSugCursor(undefined);
+    } finally { setLoading(false); }
+  }
+
   async function onAcceptSuggestion(s: Suggestion) {
     if (!forTask) return;
     setLoading(true);
     try {
-      await createEvent({
-        title: forTask.title,
-        startISO: s.startISO,
-        endISO: s.endISO,
-        immutable: true,
-        source: "app"
-      });
+      // Create the event and reload tasks in a single round trip
+      const [created, tasksRes] = await batch([
+        {
+          method: "POST",
+          path: "/events",
+          body: { title: forTask.title, startISO: s.startISO, endISO: s.endISO, immutable: true, source: "app" },
+        },
+        { method: "GET", path: "/tasks" },
+      ]);
+      if (!created || created.status >= 400) {
+        throw new Error(created?.body?.message || "Failed to create event");
+      }
       setSugs(null);
       setForTask(null);
-      await refresh();
+      if (tasksRes?.status === 200 && Array.isArray(tasksRes.body?.tasks)) setTasks(tasksRes.body.tasks);
+      else await refresh();
       onAddedEvent();
     } finally { setLoading(false); }
   }
@@ -131,7 +152,10 @@ export default function TasksPanel({ onAddedEvent }: Props) {
                 </li>
               ))}
             </ul>
-            <button className="close" onClick={() => { setSugs(null); setForTask(null); }}>Close</button>
+            {sugCursor && (
+              <button onClick={onMoreSuggestions} disabled={loading}>Show more times</button>
+            )}
+            <button className="close" onClick={() => { setSugs(null); setSugCursor(undefined); setForTask(null); }}>Close</button>
           </div>
         </div>
       )}
@@ -1,5 +1,5 @@
 import { useEffect, useState } from "react";
-import { getEvents } from "../api";
+import { getFreeBusy } from "../api";
 
 export type Suggestion = { startISO: string; endISO: string; reason: string };
 
@@ -8,7 +8,7 @@ function toISO(d: Date) {
 }
 
 /**
- * Build free slots inside [rangeStart, rangeEnd] from existing events.
+ * Build free slots inside [rangeStart, rangeEnd] from the busy intervals of /freebusy.
  * - durationMin: the block length to propose (default 60)
  * - dayStart/dayEnd: local “working hours” window per day (defaults 06:00–23:00 to be generous)
  */
@@ -32,23 +32,13 @@ export function useSuggestions(
         setLoading(true);
         setError(null);
 
-        // 1) Fetch events for the visible range
-        const res: any = await getEvents(toISO(rangeStart), toISO(rangeEnd));
-        const list: any[] = Array.isArray(res) ? res : (res?.events ?? []);
+        // 1) Busy intervals for the visible range: merged server-side, as minutes from `from`
+        const fromISO = toISO(rangeStart);
+        const base = Date.parse(fromISO);
+        const busyAll = (await getFreeBusy(fromISO, toISO(rangeEnd)))
+          .map(([a, b]) => ({ s: base + a * 60000, e: base + b * 60000 }));
 
-        // 2) Bucket events by local day
-        const byDay = new Map<string, { s: number; e: number }[]>();
-        const dayKey = (d: Date) => d.toISOString().slice(0, 10); // YYYY-MM-DD in UTC; good enough for bucketing
-
-        for (const ev of list) {
-          const s = new Date(ev.startISO);
-          const e = new Date(ev.endISO);
-          const key = dayKey(s);
-          if (!byDay.has(key)) byDay.set(key, []);
-          byDay.get(key)!.push({ s: s.getTime(), e: e.getTime() });
-        }
-
-        // 3) For each day in [rangeStart, rangeEnd), compute free intervals
+        // 2) For each day in [rangeStart, rangeEnd), compute free intervals
         const out: Suggestion[] = [];
         const now = Date.now() + 10 * 60 * 1000; // future-only with a 10-min buffer
 
@@ -65,7 +55,8 @@ export function useSuggestions(
           // Start with one big free slot for the day
           let free: { s: number; e: number }[] = [{ s: dayStart.getTime(), e: dayEnd.getTime() }];
 
-          const busy = (byDay.get(dayKey(d)) ?? []).sort((a, b) => a.s - b.s);
+          // Sorted already; an interval may run across midnight, so match by overlap
+          const busy = busyAll.filter((b) => b.e > dayStart.getTime() && b.s < dayEnd.getTime());
 
           // Subtract each busy interval from free slots
           for (const b of busy) {
@@ -84,7 +75,7 @@ export function useSuggestions(
             free = next;
           }
 
-          // 4) Carve suggestions of 'durationMin' from the free intervals, future only
+          // 3) Carve suggestions of 'durationMin' from the free intervals, future only
           for (const f of free) {
             // start at max(now, f.s)
             let start = Math.max(now, f.s);
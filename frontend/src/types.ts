@@ -16,6 +16,17 @@ export type TaskItem = {
   createdAt: string;
 };
 
+export type DayStat = {
+  date: string; // YYYY-MM-DD
+  events: number;
+  busyMin: number;
+};
+
+export type MonthSummary = {
+  timezone: string; // IANA zone the dates are in
+  days: DayStat[];
+};
+
 export type Suggestion = {
   startISO: string;
   endISO: string;
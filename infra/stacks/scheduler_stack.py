@@ -1,6 +1,7 @@
 # infra/stacks/scheduler_stack.py
 
 from aws_cdk import (
+    ArnFormat,
     Stack,
     Duration,
     RemovalPolicy,
@@ -44,6 +45,7 @@ class SchedulerStack(Stack):
             sort_key=dynamodb.Attribute(name="sk", type=dynamodb.AttributeType.STRING),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
             point_in_time_recovery=True,
+            time_to_live_attribute="ttl",  # change-feed entries / tombstones expire
             removal_policy=RemovalPolicy.DESTROY,  # dev-friendly; switch to RETAIN for prod
         )
         # GSI used to query by time range (backend expects gsi1pk/gsi1sk)
@@ -181,6 +183,11 @@ class SchedulerStack(Stack):
                 "ALLOW_DEV_AUTH": "false",  # flip to "true" only for local/dev scenarios
                 "USER_POOL_ID": user_pool.user_pool_id,
                 "USER_POOL_CLIENT_ID": user_pool_client.user_pool_client_id,
+                "COMPRESS_MIN_BYTES": "1024",
+                "LOG_LEVEL": "INFO",
+                "LOG_SAMPLE_RATE": "1.0",
+                # Calendar of the month-view day stats; keep it the availability timezone
+                "DAYSTAT_TZ": "Asia/Jerusalem",
             },
         )
         table.grant_read_write_data(api_lambda)
@@ -197,6 +204,8 @@ class SchedulerStack(Stack):
             "Api",
             handler=api_lambda,
             proxy=True,
+            # Lets the Lambda return gzip/br bodies (isBase64Encoded) as real binary
+            binary_media_types=["*/*"],
             deploy_options=apigw.StageOptions(
                 stage_name="prod",
                 throttling_rate_limit=50,
@@ -205,7 +214,9 @@ class SchedulerStack(Stack):
             default_cors_preflight_options=apigw.CorsOptions(
                 allow_origins=[localhost, frontend_https],
                 allow_methods=apigw.Cors.ALL_METHODS,
-                allow_headers=["Authorization", "Content-Type", "X-Request-Id"],
+                allow_headers=[
+                    "Authorization", "Content-Type", "X-Request-Id", "If-None-Match", "X-Profile", "Idempotency-Key",
+                ],
             ),
             default_method_options=apigw.MethodOptions(
                 authorization_type=apigw.AuthorizationType.COGNITO,
@@ -221,6 +232,15 @@ class SchedulerStack(Stack):
             authorization_type=apigw.AuthorizationType.NONE,
         )
 
+        # With binary_media_types "*/*" every request counts as binary, so the MOCK
+        # integrations behind the CORS preflights would pass the body through untouched
+        # and never apply their {"statusCode": 200} template: convert it to text first.
+        for method in api.methods:
+            if method.http_method == "OPTIONS":
+                method.node.default_child.add_property_override(
+                    "Integration.ContentHandling", "CONVERT_TO_TEXT"
+                )
+
         # ==========================
         # EventBridge (daily tick)
         # ==========================
@@ -230,6 +250,21 @@ class SchedulerStack(Stack):
             schedule=events.Schedule.rate(Duration.days(1)),
             targets=[targets.LambdaFunction(api_lambda)],
         )
+        # The maintenance run continues in a new async invocation when one runs out of time.
+        # Granted by name pattern: the function's own ARN here would be a circular dependency.
+        api_lambda.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["lambda:InvokeFunction"],
+                resources=[
+                    self.format_arn(
+                        service="lambda",
+                        resource="function",
+                        resource_name=f"{self.stack_name}-ApiLambda*",
+                        arn_format=ArnFormat.COLON_RESOURCE_NAME,
+                    )
+                ],
+            )
+        )
 
         # =======
         # Outputs